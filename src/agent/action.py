@@ -33,6 +33,16 @@ self.mineral_query(task_name, target, amount)
     return actions
 
 
+'''
+    Returns one request of unit commands (Action.unit_command), as Action.perform() does
+'''
+def combine_requests(unit_commands):
+    action = sc_pb.RequestAction()
+    for unit_command in unit_commands:
+        action.actions.add(action_raw=raw_pb.ActionRaw(unit_command=unit_command))
+    return MessageToJson(action)
+
+
 class Action(object):
     def __init__(self, action_name, actual_code, require={}, sc_action_id=9999):
         self.__name__ = action_name
@@ -52,11 +62,11 @@ class Action(object):
         else:
             return False
 
-    def perform(self, spawn_id):
-        # Pass arguments
-        print(self)
+    # The unit command with the current arguments, a queued one is performed after the ones before it.
+    def unit_command(self, spawn_id, queue=False):
         unit_command = raw_pb.ActionRawUnitCommand(ability_id=self.sc2_id)
         unit_command.unit_tags.append(spawn_id)
+        unit_command.queue_command = queue
 
         if self.require['target'] == 'point':
             unit_command.target_world_space_pos.x = self.require['pos_x']
@@ -66,6 +76,12 @@ class Action(object):
             unit_command.target_unit_tag = self.require['unit_tag']
         else:
             pass
+        return unit_command
+
+    def perform(self, spawn_id):
+        # Pass arguments
+        print(self)
+        unit_command = self.unit_command(spawn_id)
 
         action_raw = raw_pb.ActionRaw(unit_command=unit_command)
         action = sc_pb.RequestAction()
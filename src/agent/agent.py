@@ -13,22 +13,23 @@ import sys
 import time
 import logging
 import threading
-import json
 
 sys.path.append('../')
 from units import units
-from utils.communicator import Communicator
+from utils.communicator import Communicator, RequestClient, Waker, wait_any
 
-from action import Action, get_basic_actions
+from action import Action, get_basic_actions, combine_requests
 from knowledge_base import Knowledge
-from goal import Goal, create_goal_set
-
-from utils.jsonencoder import PythonObjectEncoder, as_python_object
+from goal import Goal, Task, create_goal_set
+from allocation import TAKE, WAIT, make_allocator
 
 FORMAT = '%(asctime)s %(module)s %(levelname)s %(lineno)d %(message)s'
 logging.basicConfig(level=logging.INFO, format=FORMAT)
 logger = logging.getLogger(__name__)
 
+# Actions performed by a unit command of the core, see Agent.act_batch()
+UNIT_ACTIONS = ('move', 'gather', 'build_pylon')
+
 
 class MentalState(object):
     '''
@@ -39,23 +40,48 @@ class MentalState(object):
 
     def __init__(self):
         self.state = 'idle'
+        # Name of the goal of the task being worked on
+        self.goal = None
 
-    def change_state(self):
+    def change_state(self, goal=None):
         self.state = 'working'
+        self.goal = goal
 
 
 class Agent(threading.Thread):
-    def __init__(self):
+    def __init__(self, transport=None, allocation='ping', batch_size=4):
         threading.Thread.__init__(self)
 
+        # How to reach the broker, see utils.communicator.transports
+        self.transport = transport
+
+        # Ticks of agent.runtime (sec), run() ticks on events instead.
         self.discrete_time_step = 0.5  # sec
+        # run() wakes up on the first of a msg, a timer or a local change, and at least every max_idle.
+        self.max_idle = 5.0  # sec
+        # Delay before reasoning again after our own change, it bounds the rate of ticks.
+        self.min_step_interval = 0.01  # sec
+        # Every N sec the whole knowledge is told instead of the changes only
+        self.snapshot_period = 10.0
+        self.next_snapshot = 0
+        # Version of the knowledge at the last decision, reasoning is skipped until it moves.
+        self.decided_version = None
+        self.ticks = 0
         self.alive = False
+        # Wakes run() up from wait_event() when another thread stops us, see stop().
+        self.waker = None
+        # Set when run() ends by an error, a launcher reports it as the exit status.
+        self.failed = False
         self.state = MentalState()
 
         self.actions = get_basic_actions()
         self.knowledge = Knowledge()
         self.goals = []
         self.messages = []
+        # General tasks taken in a tick at most, their actions go to the core in one request.
+        self.batch_size = batch_size
+        # Decides who performs a General task, 'ping', 'auction' or 'rendezvous', see allocation
+        self.allocator = make_allocator(allocation, self)
 
     def _load_knowledge(self, knowledge):
         for key, value in knowledge.items():
@@ -121,12 +147,18 @@ class Agent(threading.Thread):
     '''
 
     def init_comm_agents(self):
-        # self.comm_agents = Communicator(self.spawn_id)
-        self.comm_agents = Communicator()
+        self.comm_agents = Communicator(sender=self.spawn_id, transport=self.transport)
+        # Requests of actions go to the core through the reliable request channel.
+        self.comm_core = RequestClient(sender=self.spawn_id, transport=self.transport)
+
+        # Tell the core that we are ready when our subscription reaches the broker.
+        self.comm_agents.handshake()
+        self.comm_core.request({'ready': True})
 
     def deinit_comm_agents(self):
         # It may need to send 'good bye' to others
         self.comm_agents.close()
+        self.comm_core.close()
 
     '''
         Destroy myself
@@ -134,28 +166,60 @@ class Agent(threading.Thread):
     '''
 
     def destroy(self):
-        # Need to broadcast "I am destroying"
-        msg = "{} destroy".format(self.spawn_id)
-        self.comm_agents.send(msg)
-        # Close communications
-        self.deinit_comm_env()
-        self.deinit_comm_agents()
-        self.alive = False
-
+        # run() says good bye and closes its own sockets, zmq sockets are not thread safe.
+        self.stop()
         self.join()
 
+    # Returns at once, join() waits until run() says good bye.
+    def stop(self):
+        self.alive = False
+        waker = self.waker
+        if waker is not None:
+            waker.wake()
+
     '''
         Sense information from its surroundings and other agents
     '''
 
-    def perceive(self):
+    def perceive(self, timeout=0):
         # Perceive from the environment (i.e., SC2)
 
         # Perceive from other agents
-        message = self.comm_agents.read()
-        if message.startswith('broadcasting'):
-            message = message[13:]
-            self.knowledge.update(json.loads(message, object_hook=as_python_object))
+        received = self.comm_agents.read(timeout)
+        if received is None:
+            return
+        topic, sender, message = received
+        if topic == 'broadcasting' and sender != self.comm_agents.sender:
+            self.knowledge.update(message)
+            if self.allocator.heard(sender, message):
+                self.next_snapshot = 0
+
+    """
+        Drain every queued msg at once and returns the backlog depth.
+        Msgs are the changes of the sender's knowledge, so the msgs of each sender
+        are coalesced in order (the newest statement wins) and merged into the knowledge once.
+    """
+
+    def perceive_all(self, timeout=0):
+        # Acks of our requests, the ones not acked in time are sent again.
+        # A task taken is done when the core acknowledges its action, see allocation.Leases.
+        self.allocator.leases.acked(self.comm_core.poll_acks())
+
+        messages = self.comm_agents.read_all(timeout)
+
+        newest = {}
+        for topic, sender, message in messages:
+            # Our own broadcasts come back through the broker, skip them.
+            if topic == 'broadcasting' and sender != self.comm_agents.sender:
+                newest.setdefault(sender, {}).update(message)
+                if self.allocator.heard(sender, message):
+                    # A newcomer learns about us and the tasks done so far.
+                    self.next_snapshot = 0
+
+        for statements in newest.values():
+            self.knowledge.update(statements)
+
+        return len(messages)
 
     """
         Change msg(str) to Knowledge
@@ -194,21 +258,22 @@ class Agent(threading.Thread):
     '''
 
     def act(self, action, task):
-        self.state.change_state()
+        self.state.change_state(task.parent.name if task.parent is not None else None)
 
         # Update task state
         self.knowledge[task.__name__].update({'is': 'Active'})
 
         logger.info('%s %s is performing %s' % (self.name, self.spawn_id, action))
+        request_id = None
         if action.__name__ == 'move':
             req = action.perform(self.spawn_id)
-            self.comm_agents.send(req, who='core')
+            request_id = self.comm_core.request({'action': req})
         elif action.__name__ == 'gather':
             req = action.perform(self.spawn_id)
-            self.comm_agents.send(req, who='core')
+            request_id = self.comm_core.request({'action': req})
         elif action.__name__ == 'build_pylon':
             req = action.perform(self.spawn_id)
-            self.comm_agents.send(req, who='core')
+            request_id = self.comm_core.request({'action': req})
             # do gather after build_pylon
             # time.sleep(self.discrete_time_step)
             # for act in self.actions:
@@ -225,8 +290,35 @@ class Agent(threading.Thread):
         else:
             pass
             #print('act function --> else ERROR!!!!!!')
+
+        # The task is ours until the core acknowledges the action.
+        if request_id is not None:
+            self.allocator.leases.take(task.__name__, request_id, time.time())
         return True
 
+    """
+        Performs General tasks at once, their unit commands go to the core in one request
+        and the unit performs them one after another. The tasks are leased on the request.
+        A command on a unit (e.g., gather) does not end, it is queued last.
+    """
+
+    def act_batch(self, selected):
+        task = selected[0][1]
+        self.state.change_state(task.parent.name if task.parent is not None else None)
+
+        selected = sorted(selected, key=lambda selected_task: selected_task[1].arguments.get('target') == 'unit')
+        unit_commands = []
+        for action, task in selected:
+            self.knowledge[task.__name__].update({'is': 'Active'})
+            # Actions are shared by the tasks, each command with the arguments of its task
+            action.set_arguments(task.arguments)
+            unit_commands.append(action.unit_command(self.spawn_id, queue=len(unit_commands) > 0))
+
+        logger.info('%s %s is performing %s' % (self.name, self.spawn_id, [task.__name__ for action, task in selected]))
+        request_id = self.comm_core.request({'action': combine_requests(unit_commands)})
+        for action, task in selected:
+            self.allocator.leases.take(task.__name__, request_id, time.time())
+
     def mineral_query(self, task_name, target, amount):
         # find knowledgebase
 
@@ -295,127 +387,129 @@ class Agent(threading.Thread):
         return None
 
     """
-        Check the goal tree recursively and update KB if it is achieved.
+        Update KB with the goals achieved since the last check.
+        Only the goals on the paths from changed tasks to the root are looked at, see Goal.refresh_achieved.
     """
 
     def check_goal_achieved(self, goal):
         if goal is not None:
-            if goal.can_be_achieved():
-                #print('뭐 좀 찍어볼까?????')
-                self.knowledge[goal.name].update({'is': 'achieved'})
-                #print(goal.name)
-                #print(self.knowledge[goal.name]['is'])
-            for subgoal in goal.subgoals:
-                if subgoal.can_be_achieved():
-                    #print('뭐 좀 찍어볼까?????')
-                    self.knowledge[subgoal.name].update({'is': 'achieved'})
-                    #print(subgoal.name)
-                    #print(self.knowledge[subgoal.name]['is'])
-                    self.check_goal_achieved(subgoal)
+            for achieved in goal.refresh_achieved():
+                self.knowledge[achieved.name].update({'is': 'achieved'})
         return None
 
+    # Two General tasks conflict when the unit cannot do both, e.g., two buildings at the same point,
+    # or two commands on units: the unit gathers until it is told otherwise, so gathers queued
+    # in a request are one gather.
+    @staticmethod
+    def _conflicts(task, selected):
+        if task.arguments.get('target') == 'unit':
+            return any(other.arguments.get('target') == 'unit' for action, other in selected)
+        if task.arguments.get('target') != 'point':
+            return False
+        point = (task.arguments.get('pos_x'), task.arguments.get('pos_y'))
+        return any(other.arguments.get('target') == 'point' and
+                   (other.arguments.get('pos_x'), other.arguments.get('pos_y')) == point
+                   for action, other in selected)
+
     '''
-        Returns available actions based on the desires in the current situation
+        Returns available actions based on the desires in the current situation,
+        the first of next_actions()
     '''
 
     def next_action(self, current_goal, current_knowledge, mentalstate):
+        list_actions = self.next_actions(current_goal, current_knowledge, mentalstate)
+        # Select actions from the list of actions in terms of the current
+        if len(list_actions) == 0:
+            return None, None
+
+        return_action = list_actions[0]
+        # Return the most beneficial action from the selected actions
+        return return_action
+
+    '''
+        Returns [(action, task)] to perform in this tick over every actionable leaf goal,
+        up to batch_size General tasks that do not conflict and the Query tasks to check
+    '''
+
+    def next_actions(self, current_goal, current_knowledge, mentalstate):
         list_actions = []
+        taken = []
         #print("####NEXT_ACTION: CURRENT GOAL's length: %s" % (len(current_goal)))
         if len(current_goal) == 0:
             # TODO: is an action always triggered by a goal?
-            return None, None
+            return list_actions
 
         # TODO: all the goals may need to be examined
         for goal in current_goal:
-            # Method name is dirty
-            leaf_goal, tasks = goal.get_available_goal_and_tasks()
-
-
-            # When the Query task is Done, the agent's mentalstate is Idle
-            for task in tasks:
-                if task.type == 'Query' and self.knowledge[task.__name__]['is'] == 'Done':
-                    self.state.__init__()
-
-
-            if len(tasks) != 0:
-                if leaf_goal.goal_state != 'achieved':
-                    leaf_goal.goal_state = 'assigned'
-                    self.knowledge[leaf_goal.name].update({'is': 'assigned'})
-            for task in tasks:
-
-                if mentalstate == 'idle':
-                    # ping
-                    if task.type == 'General':
-                        if task.state == 'Ready':
-                            task.state = 'Ping'
-                            pinglist = set()
-                            pinglist.add(self.spawn_id)
-                            self.knowledge[task.__name__].update({'is': 'Ping'})
-                            self.knowledge[task.__name__].update({'ping': pinglist})
-
-                            '''
-                            #TODO - SangUk will do!
-                            self.knowledge[task.__name__].update({'is' : ('Ping', self.spawn_id)})
-                            '''
-                            break
-
-                        elif task.state == 'Ping':
-                            pinglist = self.knowledge[task.__name__]['ping']
-
-                            amImin = True
-                            for ping in pinglist:
-                                if int(self.spawn_id) > int(ping):
-                                    amImin = False
-                                    break
-
-                            if amImin:
-                                if int(self.spawn_id) not in pinglist:
-                                    pinglist.add(self.spawn_id)
-                                self.knowledge[task.__name__].update({'ping': pinglist})
-
-                                action = self._has_action_for_task(task)
-                                if action is not None:
-                                    list_actions.append((action, task))
+            # Every actionable leaf, agents work on independent leaves at the same time.
+            for leaf_goal, tasks in goal.get_available_goals_and_tasks():
+                if len(taken) >= self.batch_size:
+                    break
+                # Queries are checked by the agents working on the leaf.
+                ours = self.state.goal is None or self.state.goal == leaf_goal.name
+                # Working on the leaf, the next tasks of it are taken when the core has acked the last ones.
+                free = mentalstate == 'idle' or (ours and not self.allocator.leases.held)
+
+                # When the Query task is Done, the agent's mentalstate is Idle
+                for task in tasks:
+                    if task.type == 'Query' and self.knowledge[task.__name__]['is'] == 'Done' and ours:
+                        self.state.__init__()
+
+
+                if len(tasks) != 0:
+                    if leaf_goal.goal_state != 'achieved':
+                        leaf_goal.goal_state = 'assigned'
+                        self.knowledge[leaf_goal.name].update({'is': 'assigned'})
+                # Nothing left to perform, the Queries are checked by anyone.
+                performed = all(task.state == 'Done' for task in tasks if task.type == 'General')
+                for task in tasks:
+
+                    if task.type == 'Query' and performed and not (mentalstate == 'working' and ours):
+                        if task.state == 'Ready' or task.state == 'Active':
+                            action = self._has_action_for_task(task)
+                            if action is not None:
+                                list_actions.append((action, task))
+
+                    elif task.type == 'General' and free:
+                        if task.state == 'Active':
+                            # Taken by another agent, it is given back if its lease expires.
+                            continue
+                        if self._conflicts(task, taken):
+                            # In the next tick
+                            continue
+
+                        # Who performs the task, see allocation
+                        claim = self.allocator.claim(task)
+                        if claim == TAKE:
+                            action = self._has_action_for_task(task)
+                            if action is not None:
+                                list_actions.append((action, task))
+                                taken.append((action, task))
+                                if len(taken) >= self.batch_size:
                                     break
-                            else:
-                                continue
-                                #return None, None
-
-                        elif task.state == 'Active':
-                            return None, None
-
-                elif mentalstate == 'working':
-                    if task.type == 'Query' and (task.state == 'Ready' or task.state == 'Active'):
-                        # Check whether query task is done
-                        action = self._has_action_for_task(task)
-                        if action is not None:
-                            list_actions.append((action, task))
-
-        # Select actions from the list of actions in terms of the current
-        if len(list_actions) == 0:
-            return None, None
-
-        return_action = list_actions[0]
-        # Return the most beneficial action from the selected actions
-        return return_action
+                        elif claim == WAIT:
+                            break
 
-    def update_goal_tree(self, knowledge, goal):
+                    elif mentalstate == 'working' and ours:
+                        if task.type == 'Query' and (task.state == 'Ready' or task.state == 'Active'):
+                            # Check whether query task is done
+                            action = self._has_action_for_task(task)
+                            if action is not None:
+                                list_actions.append((action, task))
 
-        if goal.name in knowledge:
-            if goal.goal_state != 'achieved':
-                goal.goal_state = knowledge[goal.name]['is']
+        return list_actions
 
-        # check subgoals
-        for subgoal in goal.subgoals:
-            self.update_goal_tree(knowledge, subgoal)
+    """
+        Update the goal tree with the subjects changed in the knowledge since the last update,
+        the nodes of other names are not visited.
+    """
 
-        # check task
-        for task in goal.tasks:
-            if task.__name__ in knowledge:
-                #print("!!", self.spawn_id, task.__name__, task.state, "-->", knowledge[task.__name__]['is'])
-                if knowledge[task.__name__]['is'] == 'Done':
-                    knowledge[task.__name__]['ping'] = []
-                task.state = knowledge[task.__name__]['is']
+    def update_goal_tree(self, knowledge, goal, changed):
+        for node in goal.apply_knowledge_delta(knowledge, changed):
+            if isinstance(node, Task):
+                #print("!!", self.spawn_id, node.__name__, node.state)
+                if node.state == 'Done':
+                    self.allocator.finished(node.__name__)
 
         return True
 
@@ -424,115 +518,193 @@ class Agent(threading.Thread):
     '''
 
     def run(self):
+        self.waker = Waker()
         # Initialize communications
         self.init_comm_agents()
         self.init_comm_env()
 
-        while self.alive:
-            # For debugging
-            logger.info('%s %d is ticking' % (self.name, self.spawn_id))
-            #print()
-
-            #for k in self.knowledge:
-            #    print(k)
-
-            # Check if something to answer
-            # query = self.check_being_asked():
-            # if query:
-            #     self.answer(query)
-
-            # Perceive environment
-            self.perceive()
-            self.perceive()
-            self.perceive()
-            self.perceive()
-            self.perceive()
-
-            # check task state and change the agent's mentalstate
-
-
-            # check knowledge and update the goal tree
-            """
-            tasks = []
-            for g in self.goals:
-                tasks = g.get_available_tasks()
-
-            for k in self.knowledge:
-                if k.type == 'type1':
-                    for goal in self.goals:
-                        if k.n == goal.name:
-                            goal.goal_state = k.na
-                    for task in tasks:
-                        if k.n == task.__name__:
-                            task.state = k.na
-            """
-
-            # check knowledge and update the goal tree
-            for goal in self.goals:
-                self.update_goal_tree(self.knowledge, goal)
-
-            """
-            #check every goal whether now achieved.
-            for goal in self.goals:
-                if goal.can_be_achieved():
-                    print('뭐 좀 찍어볼까????')
-                    self.knowledge[goal.name].update({'is' : 'achieved'})
-                    print(goal.name)
-                    print(self.knowledge[goal.name]['is'])
-                for subgoal in goal.subgoals:  #update subgoal's state in KB
-                    if subgoal.can_be_achieved(): #check the goal state
-                        print('뭐 좀 찍어볼까?????')
-                        self.knowledge[subgoal.name].update({'is' : 'achieved'})
-                        print(subgoal.name)
-                        print(self.knowledge[subgoal.name]['is'])
-            """
-            # check every goal whether now achieved.
-            for goal in self.goals:
-                self.check_goal_achieved(goal)
-
-            # # check every goal whether now active.
-            # for goal in self.goals:
-            #     self.check_goal_active(goal)
-
-            # Reason next action
-            selected_action, selected_task = self.next_action(self.goals, self.knowledge, self.state.state)
-            #print(self.spawn_id, "다음은!!! ", selected_action, selected_task)
-            # Perform the action
-            if selected_action is not None:
-                if not self.act(selected_action, selected_task):
-                    # Query task come here!
-                    pass
-                else:
-                    # General task come here!
-                    selected_task.state = 'Done'
-                    # if selected_task.__name__.startswith('built'):
-                    #     for act in self.actions:
-                    #         if act.__name__ == 'gather':
-                    #             req = act.perform(self.spawn_id)
-                    #             self.comm_agents.send(req, who='core')
-                    self.knowledge[selected_task.__name__]['ping'] = []
-                    self.knowledge[selected_task.__name__].update({'is': 'Done'})
-                    # Have to change agent's state to idle after finishing the task
-                    # self.state.__init__()
+        try:
+            while self.alive:
+                self.step()
+                self.wait_event()
+        except Exception:
+            logger.exception('%s %s stopped by an error' % (self.name, self.spawn_id))
+            self.failed = True
+        finally:
+            self.finish()
+
+    def finish(self):
+        # Need to broadcast "I am destroying"
+        self.tell({'%s' % self.spawn_id: {'is': 'destroyed'}})
+        # Close communications
+        self.deinit_comm_env()
+        self.deinit_comm_agents()
+        self.alive = False
+        if self.waker is not None:
+            self.waker.close()
 
-            else:
-                #print('다 됐다!!!!!!!!!!!!!!!!!!!')
-                if self.goals[0].goal_state == 'achieved':
-                    #print('여기 들어옴?? ???????')
-                    """
-                    for act in self.actions:
-                        if act.__name__ == 'move':
-                            req=act.perform(self.spawn_id)
-                            self.comm_agents.send(req,who='core')
-                    """
-                    # self.destroy()
-                    # break
-                pass
+    """
+        Sleep until the first of
+            - a msg from others or an ack from the core
+            - a timer: the next snapshot, the next retry of a request or the decision of a claim
+            - min_step_interval after the last step changed our own knowledge
+    """
+
+    def wait_event(self):
+        if self.knowledge.version != self.decided_version:
+            timeout = self.min_step_interval
+        else:
+            timers = [self.next_snapshot, time.time() + self.max_idle]
+            for timer in (self.comm_core.next_retry(), self.allocator.next_deadline(),
+                          self.allocator.leases.next_timer()):
+                if timer is not None:
+                    timers.append(timer)
+            timeout = max(min(timers) - time.time(), 0)
+        if self.waker in wait_any([self.comm_agents, self.comm_core, self.waker], timeout):
+            self.waker.clear()
+
+    """
+        One tick of the agent: perceive, update the goal tree, decide, act and tell.
+        The thread of run() and the coroutines of agent.runtime call it in the same way.
+        Nothing to decide when the knowledge has not changed since the last decision,
+        but a claim waiting for its time (see allocation).
+    """
+
+    def step(self):
+        # Perceive environment, msgs queued while reasoning are the backlog.
+        backlog = self.perceive_all()
+
+        if self.knowledge.version != self.decided_version or self.allocator.due() or self.allocator.leases.due():
+            # Changes made by the reasoning wake us up again, see wait_event().
+            self.decided_version = self.knowledge.version
 
-            # TODO for Tony : Please Broadcast knowledge...
-            self.tell(json.dumps(self.knowledge, cls=PythonObjectEncoder))
+            # For debugging, ticks follow events, so it is too often for INFO under load.
+            logger.debug('%s %d is ticking, backlog %d, dropped %d' %
+                        (self.name, self.spawn_id, backlog, self.comm_agents.stats['dropped']))
+            self.reason()
 
-            time.sleep(self.discrete_time_step)
+        # Heartbeats of the tasks we hold
+        self.allocator.leases.renew(self.comm_core.pending, time.time())
+
+        # Broadcast only the changed knowledge, the whole of it once in a while for late joiners.
+        if time.time() >= self.next_snapshot:
+            statements = self.knowledge.snapshot()
+            self.next_snapshot = time.time() + self.snapshot_period
+        else:
+            statements = self.knowledge.delta()
+        if statements:
+            self.tell(statements)
+        self.ticks += 1
+
+    def reason(self):
+        #print()
+
+        #for k in self.knowledge:
+        #    print(k)
+
+        # Check if something to answer
+        # query = self.check_being_asked():
+        # if query:
+        #     self.answer(query)
+
+        # check task state and change the agent's mentalstate
+
+
+        # check knowledge and update the goal tree
+        """
+        tasks = []
+        for g in self.goals:
+            tasks = g.get_available_tasks()
+
+        for k in self.knowledge:
+            if k.type == 'type1':
+                for goal in self.goals:
+                    if k.n == goal.name:
+                        goal.goal_state = k.na
+                for task in tasks:
+                    if k.n == task.__name__:
+                        task.state = k.na
+        """
+
+        # Tasks whose leases are not renewed are given back.
+        self.allocator.leases.watch(self.knowledge.changed)
+        self.allocator.leases.expire(time.time())
+
+        # check knowledge and update the goal tree, only the changed subjects.
+        changed = self.knowledge.take_changed()
+        for goal in self.goals:
+            self.update_goal_tree(self.knowledge, goal, changed)
+
+        """
+        #check every goal whether now achieved.
+        for goal in self.goals:
+            if goal.can_be_achieved():
+                print('뭐 좀 찍어볼까????')
+                self.knowledge[goal.name].update({'is' : 'achieved'})
+                print(goal.name)
+                print(self.knowledge[goal.name]['is'])
+            for subgoal in goal.subgoals:  #update subgoal's state in KB
+                if subgoal.can_be_achieved(): #check the goal state
+                    print('뭐 좀 찍어볼까?????')
+                    self.knowledge[subgoal.name].update({'is' : 'achieved'})
+                    print(subgoal.name)
+                    print(self.knowledge[subgoal.name]['is'])
+        """
+        # check every goal whether now achieved.
+        for goal in self.goals:
+            self.check_goal_achieved(goal)
+
+        # # check every goal whether now active.
+        # for goal in self.goals:
+        #     self.check_goal_active(goal)
+
+        # Our work is over when its goal is achieved, even if the Query task was done by others before we saw it.
+        if self.state.goal is not None and self.knowledge.get(self.state.goal, {}).get('is') == 'achieved':
+            self.state.__init__()
+
+        # Reason next actions, the unit commands of several General tasks go in one request.
+        selected = self.next_actions(self.goals, self.knowledge, self.state.state)
+        batch = [(action, task) for action, task in selected
+                 if task.type == 'General' and action.__name__ in UNIT_ACTIONS]
+        if len(batch) > 1:
+            self.act_batch(batch)
+        else:
+            batch = []
+        batched = set(task.__name__ for action, task in batch)
+        #print(self.spawn_id, "다음은!!! ", selected_action, selected_task)
+        # Perform the action
+        for selected_action, selected_task in selected:
+            if selected_task.__name__ in batched:
+                continue
+            if not self.act(selected_action, selected_task):
+                # Query task come here!
+                pass
+            elif not self.allocator.leases.holds(selected_task.__name__):
+                # General task come here! Those of requests are done on acks.
+                selected_task.state = 'Done'
+                # if selected_task.__name__.startswith('built'):
+                #     for act in self.actions:
+                #         if act.__name__ == 'gather':
+                #             req = act.perform(self.spawn_id)
+                #             self.comm_agents.send(req, who='core')
+                self.allocator.finished(selected_task.__name__)
+                self.knowledge[selected_task.__name__].update({'is': 'Done'})
+                # Have to change agent's state to idle after finishing the task
+                # self.state.__init__()
+
+        if not selected:
+            #print('다 됐다!!!!!!!!!!!!!!!!!!!')
+            if self.goals[0].goal_state == 'achieved':
+                #print('여기 들어옴?? ???????')
+                """
+                for act in self.actions:
+                    if act.__name__ == 'move':
+                        req=act.perform(self.spawn_id)
+                        self.comm_agents.send(req,who='core')
+                """
+                # self.destroy()
+                # break
+            pass
 
 
 '''
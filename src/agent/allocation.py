@@ -0,0 +1,608 @@
+"""
+    Task allocation
+    This decides which agent performs a General task, every agent runs the same allocator
+    on its own knowledge. claim(task) tells the agent what to do with a task of its leaf goal,
+        - TAKE: perform the task now
+        - WAIT: a claim is in progress, look at no other task in this tick
+        - SKIP: the task is not ours, look at the next one
+
+    Allocators (Agent(allocation=...)),
+        - 'ping' (default): the former protocol, an agent pings Ready tasks, the ping sets of the agents
+          are merged through broadcasts and the agent of the lowest spawn id takes the task.
+          A claim takes a few rounds of broadcasts until the sets converge.
+          It claims fastest, bench_allocation with 4 agents: 2 ms a claim against 50 ms of
+          'auction', whose bid_window and settle_time dominate, and 114 ms of 'rendezvous'.
+        - 'auction': a contract-net in one round, see AuctionAllocator.
+        - 'rendezvous': no claim at all, every agent finds the owner of a task by hashing,
+          see RendezvousAllocator.
+    Claims and tasks taken are leases, see Leases.
+"""
+
+import math
+import time
+import hashlib
+import logging
+
+FORMAT = '%(asctime)s %(module)s %(levelname)s %(lineno)d %(message)s'
+logging.basicConfig(level=logging.INFO, format=FORMAT)
+logger = logging.getLogger(__name__)
+
+TAKE = 'take'
+WAIT = 'wait'
+SKIP = 'skip'
+
+# States of a task under a lease
+LEASED = ('Ping', 'Bid', 'Active')
+
+
+# General tasks of the goal of the task, in order
+def leaf_tasks(task):
+    if task.parent is None:
+        return [task]
+    return [other for other in task.parent.tasks if other.type == 'General']
+
+
+class Leases(object):
+    """
+        Claims of tasks are time-bounded leases
+            - 'lease' of a task is [holder, expiry], the holder is None while the task is claimed
+              (Ping, Bid) and the agent who took it while it is Active.
+            - The holder renews its lease while its request to the core is pending, a request may
+              carry the actions of several tasks (see Agent.act_batch). The task is Done
+              when the core acknowledges the request, and Ready again when the core refuses it or
+              the request is given up.
+            - A lease not renewed 'grace' sec after its expiry, e.g., the holder is stuck or dead,
+              is expired by any agent. The task is Ready again in the next 'epoch' of the task,
+              statements of former epochs do not count any more (see Knowledge.update).
+        stats: leases we took and renewed, leases of others we expired, tasks we took after an expiry
+               (reclaimed) and tasks we gave back (released)
+    """
+    def __init__(self, allocator, lease_time=2.0, grace=0.5):
+        self.allocator = allocator
+        self.lease_time = lease_time
+        self.grace = grace
+        # Leases of others, task name -> expiry
+        self.expiries = {}
+        # Our tasks waiting for acks, request id -> task names
+        self.held = {}
+        self.stats = {'taken': 0, 'renewed': 0, 'expired': 0, 'reclaimed': 0, 'released': 0}
+
+    @property
+    def knowledge(self):
+        return self.allocator.agent.knowledge
+
+    @property
+    def me(self):
+        return str(self.allocator.agent.spawn_id)
+
+    # A claim of the task starts or goes on, it is leased to nobody until it is taken.
+    def claim(self, task_name, now):
+        lease = self.knowledge[task_name].get('lease')
+        if not lease or lease[0] is None:
+            self.knowledge[task_name]['lease'] = [None, now + self.lease_time]
+
+    # We take the task, its action is the request of request_id.
+    def take(self, task_name, request_id, now):
+        self.knowledge[task_name]['lease'] = [self.me, now + self.lease_time]
+        self.held.setdefault(request_id, []).append(task_name)
+        self.stats['taken'] += 1
+        if self.knowledge[task_name].get('epoch'):
+            self.stats['reclaimed'] += 1
+
+    def holds(self, task_name):
+        return any(task_name in task_names for task_names in self.held.values())
+
+    # Acks of our requests, [(request id, status)]
+    def acked(self, acks):
+        for request_id, status in acks:
+            for task_name in self.held.pop(request_id, ()):
+                if status:
+                    self.knowledge[task_name].update({'is': 'Done'})
+                else:
+                    self.release(task_name)
+
+    def release(self, task_name):
+        logger.info('%s gives %s back' % (self.me, task_name))
+        self.stats['released'] += 1
+        self._reset(task_name)
+
+    # Ready again in the next epoch, without the claims of the former one
+    def _reset(self, task_name):
+        epoch = self.knowledge[task_name].get('epoch', 0) + 1
+        self.knowledge[task_name] = {'is': 'Ready', 'epoch': epoch}
+        self.allocator.finished(task_name)
+
+    # Renews our leases, those of the requests given up are released.
+    def renew(self, pending, now):
+        for request_id, task_names in list(self.held.items()):
+            if request_id not in pending:
+                del self.held[request_id]
+                for task_name in task_names:
+                    self.release(task_name)
+                continue
+            for task_name in task_names:
+                lease = self.knowledge[task_name].get('lease')
+                if lease and lease[1] - now < self.lease_time / 2:
+                    self.knowledge[task_name]['lease'] = [lease[0], now + self.lease_time]
+                    self.stats['renewed'] += 1
+
+    # Looks at the leases of the subjects changed.
+    def watch(self, subjects):
+        for subject in subjects:
+            statement = self.knowledge.get(subject)
+            lease = statement.get('lease') if hasattr(statement, 'get') else None
+            if lease and lease[0] != self.me and statement.get('is') in LEASED:
+                self.expiries[subject] = lease[1]
+            else:
+                self.expiries.pop(subject, None)
+
+    # Expires the leases not renewed in time, returns the task names.
+    def expire(self, now):
+        expired = [task_name for task_name, expiry in self.expiries.items() if expiry + self.grace <= now]
+        for task_name in expired:
+            del self.expiries[task_name]
+            self.expire_claim(task_name, self.knowledge[task_name]['lease'][0])
+        return expired
+
+    # The task is given back without its holder, None while it is claimed.
+    def expire_claim(self, task_name, holder):
+        logger.info('%s expires the lease of %s held by %s' % (self.me, task_name, holder))
+        self._reset(task_name)
+        self.stats['expired'] += 1
+        if holder is not None:
+            self.allocator.holder_expired(str(holder))
+
+    def due(self):
+        now = time.time()
+        return any(expiry + self.grace <= now for expiry in self.expiries.values())
+
+    # Time of the next expiry or renewal, None if no lease
+    def next_timer(self):
+        timers = [expiry + self.grace for expiry in self.expiries.values()]
+        for task_names in self.held.values():
+            for task_name in task_names:
+                lease = self.knowledge[task_name].get('lease')
+                if lease:
+                    timers.append(lease[1] - self.lease_time / 2)
+        return min(timers) if timers else None
+
+
+class Allocator(object):
+    name = ''
+
+    def __init__(self, agent):
+        self.agent = agent
+        self.leases = Leases(self)
+        # Claims made and their latency (sec), from the first look at the task to TAKE
+        self.stats = {'claims': 0, 'claim_time': 0.0}
+        self._first_seen = {}
+
+    @property
+    def knowledge(self):
+        return self.agent.knowledge
+
+    # Tasks the agent takes in a tick, see Agent.batch_size
+    @property
+    def capacity(self):
+        return getattr(self.agent, 'batch_size', 1)
+
+    def claim(self, task):
+        now = time.time()
+        self._first_seen.setdefault(task.__name__, now)
+        decision = self._claim(task, now)
+        if decision == TAKE:
+            self.stats['claims'] += 1
+            self.stats['claim_time'] += now - self._first_seen.pop(task.__name__)
+        return decision
+
+    def _claim(self, task, now):
+        raise NotImplementedError
+
+    # The task is done, its allocation is cleared.
+    def finished(self, task_name):
+        self._first_seen.pop(task_name, None)
+
+    # Time (sec since epoch) when a claim in progress can be decided, None if nothing to wait for
+    def next_deadline(self):
+        return None
+
+    # Whether a claim can be decided now, the agent reasons again even if its knowledge is the same.
+    def due(self):
+        return False
+
+    # A msg from another agent, returns True when the sender is new to us.
+    def heard(self, sender, message):
+        return False
+
+    # An agent did not renew its lease, it may be stuck or dead.
+    def holder_expired(self, holder):
+        pass
+
+
+class PingAllocator(Allocator):
+    name = 'ping'
+
+    def _claim(self, task, now):
+        spawn_id = self.agent.spawn_id
+        if task.state == 'Ready':
+            # The tasks we can take in a tick are pinged at once.
+            leaf = leaf_tasks(task)
+            ready = [other for other in leaf[leaf.index(task):] if other.state == 'Ready']
+            for other in ready[:self.capacity]:
+                other.state = 'Ping'
+                pinglist = set()
+                pinglist.add(spawn_id)
+                self.knowledge[other.__name__].update({'is': 'Ping'})
+                self.knowledge[other.__name__].update({'ping': pinglist})
+                self.leases.claim(other.__name__, now)
+            return WAIT
+
+        if task.state == 'Ping':
+            pinglist = self.knowledge[task.__name__]['ping']
+            for ping in pinglist:
+                if int(spawn_id) > int(ping):
+                    return SKIP
+            if int(spawn_id) not in pinglist:
+                pinglist.add(spawn_id)
+            self.knowledge[task.__name__].update({'ping': pinglist})
+            return TAKE
+        return SKIP
+
+    def finished(self, task_name):
+        Allocator.finished(self, task_name)
+        if self.knowledge[task_name].get('ping'):
+            self.knowledge[task_name]['ping'] = []
+
+
+class AuctionAllocator(Allocator):
+    """
+        A contract-net in one round of broadcasts
+            - An idle agent bids on every open General task of its leaf goal at once,
+              'bids' of a task get {spawn id: [cost, time, round, capacity]} and the task is 'Bid',
+              capacity is the tasks the agent takes in a tick (Agent.batch_size).
+              Bids of the agents are merged like ping sets, a bid of a later round replaces
+              the former one.
+            - The auction of a task closes bid_window after its first bid, later bids do not count.
+            - settle_time after the close, when the bids in flight have arrived, every bidder
+              finds the same winners and the winner takes the task. Tasks are awarded in the
+              order of the leaf goal, each to the lowest (cost, spawn id) among the bids made
+              at once with room left, so the agents share the tasks of a leaf in one round.
+              The cost of a bid grows by load_weight for every task awarded to it before.
+            - A task left without a winner, e.g., its bidders won other tasks of the leaf,
+              goes to auction again in the next round, opened by any agent looking at it.
+        The cost is the distance from the agent to the target of the task, plus load_weight
+        for every task the agent holds, override cost() for others.
+        Bids stay in the knowledge after the task is done, the award of the next tasks depends on them.
+    """
+    name = 'auction'
+
+    def __init__(self, agent, bid_window=0.05, settle_time=0.05, load_weight=10.0):
+        Allocator.__init__(self, agent)
+        self.bid_window = bid_window
+        self.settle_time = settle_time
+        self.load_weight = load_weight
+        # Tasks taken and not done yet
+        self.held = set()
+        # Task bid on -> when it can be decided
+        self._pending = {}
+
+    def _claim(self, task, now):
+        if task.state not in ('Ready', 'Bid'):
+            return SKIP
+        name = task.__name__
+        spawn_id = int(self.agent.spawn_id)
+        leaf = leaf_tasks(task)
+        round_, bids = self._round(name)
+        close = self._close(bids, now)
+
+        if spawn_id not in bids:
+            if now <= close:
+                self._bid(leaf[leaf.index(task):], now)
+            elif now < close + self.settle_time:
+                # Decided without us, the award of the next tasks depends on it.
+                self._pending[name] = close + self.settle_time
+                return WAIT
+            elif self.awards(leaf).get(name) is not None:
+                return SKIP
+            else:
+                # Nobody won it, we open the next round.
+                self._bid(leaf[leaf.index(task):], now, {name: round_ + 1})
+            round_, bids = self._round(name)
+            close = self._close(bids, now)
+
+        decide_at = close + self.settle_time
+        if now < decide_at:
+            self._pending[name] = decide_at
+            return WAIT
+        self._pending.pop(name, None)
+
+        award = self.awards(leaf).get(name)
+        if award is None:
+            # Every bidder had no room left, we open the next round.
+            self._bid(leaf[leaf.index(task):], now, {name: round_ + 1})
+            self._pending[name] = now + self.bid_window + self.settle_time
+            return WAIT
+        if award != spawn_id:
+            return SKIP
+        self.held.add(name)
+        return TAKE
+
+    # (round, {spawn id: bid}) of the latest round of a task
+    def _round(self, task_name):
+        bids = self.knowledge[task_name].get('bids') or {}
+        if not bids:
+            return 0, {}
+        round_ = max(bid[2] for bid in bids.values())
+        return round_, dict((int(bidder), bid) for bidder, bid in bids.items() if bid[2] == round_)
+
+    def _close(self, bids, now):
+        if not bids:
+            return now + self.bid_window
+        return min(bid[1] for bid in bids.values()) + self.bid_window
+
+    # Bid on the open auctions of the tasks at once, rounds gives the round of a task to open.
+    def _bid(self, tasks, now, rounds=None):
+        rounds = rounds or {}
+        spawn_id = int(self.agent.spawn_id)
+        for task in tasks:
+            name = task.__name__
+            if task.state not in ('Ready', 'Bid'):
+                continue
+            round_, bids = self._round(name)
+            if name in rounds:
+                round_, bids = rounds[name], {}
+            elif spawn_id in bids or now > self._close(bids, now):
+                continue
+            value = dict(self.knowledge[name].get('bids') or {})
+            # Keys are strings, as they come from others in JSON.
+            value[str(spawn_id)] = [self.cost(task), now, round_, self.capacity]
+            task.state = 'Bid'
+            self.knowledge[name].update({'is': 'Bid', 'bids': value})
+            self.leases.claim(name, now)
+
+    # {task name: winner or None} of the closed auctions of the tasks, the same in every agent
+    def awards(self, tasks):
+        awards = {}
+        # Tasks awarded to the bids, as (spawn id, time) bids made at once count together.
+        awarded = {}
+        for task in tasks:
+            round_, bids = self._round(task.__name__)
+            if not bids:
+                continue
+            close = self._close(bids, None)
+            valid = []
+            for bidder, bid in bids.items():
+                load = awarded.get((bidder, bid[1]), 0)
+                # Bids of former versions have no capacity.
+                capacity = bid[3] if len(bid) > 3 else 1
+                if bid[1] <= close and load < capacity:
+                    valid.append((bid[0] + self.load_weight * load, bidder, bid[1]))
+            if not valid:
+                awards[task.__name__] = None
+                continue
+            cost, bidder, at = min(valid)
+            awards[task.__name__] = bidder
+            awarded[(bidder, at)] = awarded.get((bidder, at), 0) + 1
+        return awards
+
+    def finished(self, task_name):
+        Allocator.finished(self, task_name)
+        self.held.discard(task_name)
+        self._pending.pop(task_name, None)
+
+    def next_deadline(self):
+        return min(self._pending.values()) if self._pending else None
+
+    def due(self):
+        now = time.time()
+        passed = [name for name, decide_at in self._pending.items() if decide_at <= now]
+        for name in passed:
+            del self._pending[name]
+        return bool(passed)
+
+    def cost(self, task):
+        cost = self.load_weight * len(self.held)
+        here = self._position(self.knowledge.get('probes'), self.agent.spawn_id)
+        there = self._target(task.arguments)
+        if here is not None and there is not None:
+            cost += math.hypot(here[0] - there[0], here[1] - there[1])
+        return cost
+
+    def _target(self, arguments):
+        if arguments.get('target') == 'point':
+            return arguments.get('pos_x'), arguments.get('pos_y')
+        if arguments.get('target') == 'unit':
+            return self._position(self.knowledge.get('minerals'), arguments.get('unit_tag'))
+        return None
+
+    # Position of a unit in the 'are' of a statement, a list of (tag, (x, y, z)) told by the core
+    @staticmethod
+    def _position(statement, tag):
+        if not statement or tag is None:
+            return None
+        for unit_tag, position in statement.get('are', ()):
+            if unit_tag == tag:
+                return position
+        return None
+
+
+class Membership(object):
+    """
+        Live agents as seen by an agent, from the msgs of the others.
+        An agent is live from its first msg until it says it is destroyed (see Agent.finish)
+        or it is silent for 'timeout' sec. Agents tell their whole knowledge every
+        snapshot period, so even an idle agent is heard.
+    """
+    def __init__(self, timeout):
+        self.timeout = timeout
+        # spawn id -> when it was heard last
+        self.last_seen = {}
+        self.dead = set()
+        # Bumped on every join and death
+        self.version = 0
+
+    # Returns True when the sender joins.
+    def heard(self, sender, message, now):
+        if not sender.isdigit():
+            # The core or a runtime, not an agent
+            return False
+        spawn_id = int(sender)
+        if (message.get(sender) or {}).get('is') == 'destroyed':
+            self.dead.add(spawn_id)
+            if self.last_seen.pop(spawn_id, None) is not None:
+                self.version += 1
+            return False
+        if spawn_id in self.dead:
+            return False
+        joined = spawn_id not in self.last_seen
+        self.last_seen[spawn_id] = now
+        if joined:
+            self.version += 1
+        return joined
+
+    # Forgets the agents silent for too long, returns True if any.
+    def expire(self, now):
+        silent = [spawn_id for spawn_id, seen in self.last_seen.items() if seen + self.timeout <= now]
+        for spawn_id in silent:
+            del self.last_seen[spawn_id]
+            logger.info('%d is silent for %.1f sec, it is gone' % (spawn_id, self.timeout))
+        if silent:
+            self.version += 1
+        return bool(silent)
+
+    # An agent is gone until it is heard again.
+    def forget(self, spawn_id):
+        if self.last_seen.pop(spawn_id, None) is not None:
+            self.version += 1
+
+    def next_expiry(self):
+        return min(self.last_seen.values()) + self.timeout if self.last_seen else None
+
+    def live(self, me):
+        return sorted(set(self.last_seen) | {int(me)})
+
+
+class RendezvousAllocator(Allocator):
+    """
+        Ownership by rendezvous hashing, no claim is broadcast
+            - The owner of a task is the live agent of the highest weight(task, agent),
+              every agent finds the same one from its own Membership.
+              Each task is ranked on its own, Done tasks of the leaf are not owned.
+            - Bounded load: an agent owns at most ceil(tasks / agents) of the tasks not Done of
+              a leaf. In the order of task names, a task whose first choice is full goes to the
+              next agent of its own ranking, tasks are not handed round.
+            - When an agent joins or dies, only the tasks of its own weight change owners,
+              and the few moved by the bound.
+            - A task whose lease expired has new weights, e.g., its owner is stuck but still heard.
+        An agent claims nothing in its first 'warmup' sec, it hears the agents started with it.
+        An owner takes its task without a word, so the others give it the time of a lease
+        (see Leases) and then expire its claim.
+        Views of the membership may differ while an agent joins, a task may be taken twice then.
+    """
+    name = 'rendezvous'
+
+    def __init__(self, agent, timeout=None, warmup=None):
+        Allocator.__init__(self, agent)
+        self.members = Membership(timeout if timeout is not None else 2.5 * agent.snapshot_period)
+        self.warmup = warmup if warmup is not None else agent.discrete_time_step
+        # When the warmup is over, None until the first claim
+        self._warm_at = None
+        self._warmed = False
+        # Membership version of the last decision
+        self._decided_members = 0
+        # Tasks of others not taken yet, task name -> (epoch, owner, since)
+        self._waiting = {}
+
+    def heard(self, sender, message):
+        return self.members.heard(sender, message, time.time())
+
+    # A stuck agent is still heard while the tasks it owns wait, it is not an owner until it talks again.
+    def holder_expired(self, holder):
+        self.members.forget(int(holder))
+
+    def _claim(self, task, now):
+        if self._warm_at is None:
+            self._warm_at = now + self.warmup
+        if now < self._warm_at:
+            return WAIT
+        name = task.__name__
+        if task.state != 'Ready':
+            self._waiting.pop(name, None)
+            return SKIP
+        owner = self.owners(leaf_tasks(task)).get(name)
+        if owner == int(self.agent.spawn_id):
+            self._waiting.pop(name, None)
+            return TAKE
+
+        epoch = self.knowledge[name].get('epoch', 0)
+        waiting = self._waiting.get(name)
+        if waiting is None or waiting[:2] != (epoch, owner):
+            waiting = self._waiting[name] = (epoch, owner, now)
+        if now >= waiting[2] + self._patience():
+            # Stuck or gone, its next epoch has new owners.
+            del self._waiting[name]
+            self.leases.expire_claim(name, owner)
+        return SKIP
+
+    def _patience(self):
+        return self.leases.lease_time + self.leases.grace
+
+    def finished(self, task_name):
+        Allocator.finished(self, task_name)
+        self._waiting.pop(task_name, None)
+
+    # A task expired goes to another owner in its next epoch.
+    @staticmethod
+    def weight(task_name, spawn_id, epoch=0):
+        # A hash of the same value in every process, unlike hash()
+        if epoch:
+            task_name = '%s#%d' % (task_name, epoch)
+        key = ('%s/%d' % (task_name, spawn_id)).encode('utf-8')
+        return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), 'big')
+
+    # Owners of the tasks not Done, task name -> spawn id
+    def owners(self, tasks):
+        members = self.members.live(self.agent.spawn_id)
+        tasks = sorted((task for task in tasks if task.state != 'Done'), key=lambda task: task.__name__)
+        bound = int(math.ceil(len(tasks) / len(members)))
+        load = dict.fromkeys(members, 0)
+        owners = {}
+        for task in tasks:
+            name = task.__name__
+            epoch = self.knowledge[name].get('epoch', 0)
+            ranking = sorted(members, key=lambda spawn_id: self.weight(name, spawn_id, epoch), reverse=True)
+            owner = next(spawn_id for spawn_id in ranking if load[spawn_id] < bound)
+            load[owner] += 1
+            owners[name] = owner
+        return owners
+
+    def next_deadline(self):
+        timers = [self.members.next_expiry()]
+        if not self._warmed:
+            timers.append(self._warm_at)
+        if self._waiting:
+            timers.append(min(waiting[2] for waiting in self._waiting.values()) + self._patience())
+        timers = [timer for timer in timers if timer is not None]
+        return min(timers) if timers else None
+
+    # Owners change when the membership does.
+    def due(self):
+        now = time.time()
+        self.members.expire(now)
+        changed = self.members.version != self._decided_members
+        self._decided_members = self.members.version
+        if not self._warmed and self._warm_at is not None and now >= self._warm_at:
+            self._warmed = True
+            return True
+        if any(now >= waiting[2] + self._patience() for waiting in self._waiting.values()):
+            return True
+        return changed
+
+
+ALLOCATORS = dict((allocator.name, allocator) for allocator in (PingAllocator, AuctionAllocator, RendezvousAllocator))
+
+
+def make_allocator(name, agent):
+    if name not in ALLOCATORS:
+        raise ValueError('Unknown allocation %r, one of %s' % (name, sorted(ALLOCATORS)))
+    return ALLOCATORS[name](agent)
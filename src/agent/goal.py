@@ -30,18 +30,56 @@ ACTIVE       | end conditions are met   | ACHIEVED
 -----------------------------------------------------
 STATE        | Description              | NEXT_STATE
 =====================================================
-READY        | General task    --->     | PING
+READY        | General task    --->     | PING or BID
              | Query task      --->     | ACTIVE
 -----------------------------------------------------
 Ping         | The agent who has higher | ACTIVE
              | priority takes the task  |
 -----------------------------------------------------
+Bid          | The agent of the lowest  | ACTIVE
+             | bid takes the task       |
+-----------------------------------------------------
 ACTIVE       | Task Succeeded           | DONE
              | ????                     | FAILED
+-----------------------------------------------------
+PING, BID    | Lease expired or the     | READY
+or ACTIVE    | core refused the action  | (next epoch)
 -----------------------------------------------------
 
+    Achievement
+        A goal is achieved when all of its tasks are Done and all of its subgoals are achieved.
+        Each goal counts its tasks not Done and subgoals not achieved, a change of task.state
+        updates the counts along the path to the root only, O(depth) per change.
+        The root keeps the goals whose achievement has changed, refresh_achieved() takes them.
+
+    Frontier
+        The root keeps its actionable leaf goals, the goals the walk down the open subgoals
+        (not achieved, failed or active) can end at. Subgoals are independent of each other,
+        a goal whose precedents (names of goals, 'precedent' of the description) are not all
+        achieved is blocked, the walk does not go into it and its parent waits for it.
+        get_available_goals_and_tasks() gives every leaf of the frontier in preorder, so agents
+        work on independent leaves at the same time, get_available_goal_and_tasks() the first.
+        A goal opening or closing, or its precedents achieved, updates the frontier under it only,
+        a closed subtree is archived out of the frontier, so the cost does not grow as the plan
+        progresses.
+
+    Knowledge
+        The root indexes goals and tasks by name, apply_knowledge_delta() updates the states
+        of the nodes named by the changed subjects only, instead of walking the tree.
+
+    GoalTemplate
+        A description compiled once into an immutable tree, shared by every agent of the goal.
+        instantiate() gives an agent its own GoalView of the root in O(1), the states of its
+        goals and tasks are kept in a sparse overlay (Plan), only for the nodes changed by the agent.
+        GoalView and TaskView are Goal and Task, so the agent uses them in the same way.
+        from_nodes() compiles a stream of nodes (see iter_nodes()), e.g. of a generated tree.
 
 """
+import copy
+import heapq
+import itertools
+from types import MappingProxyType
+
 GOAL_STATE_NOT_ASSIGNED = 'not_assigned'
 GOAL_STATE_ASSIGNED = 'assigned'
 GOAL_STATE_ACTIVE = 'active'
@@ -74,6 +112,8 @@ def create_goal_set(description_dict):
         g.set_triggers(description_dict['trigger'])
     if 'satisfies' in description_dict:
         g.set_satisfies(description_dict['satisfies'])
+    if 'precedent' in description_dict:
+        g.set_precedents(description_dict['precedent'])
     if 'require' in description_dict:
         dependents = description_dict['require']
         for dependent in dependents:
@@ -90,6 +130,47 @@ def create_goal_set(description_dict):
     return g
 
 
+# A goal still to work on, the walk for actionable goals goes down open goals only.
+def _is_open(goal_state):
+    return goal_state not in (GOAL_STATE_ACHIEVED, GOAL_STATE_FAILED, GOAL_STATE_ACTIVE)
+
+
+class _Frontier(object):
+    """
+        Actionable leaf goals of a root, the open goals with no open subgoals
+        whose goals above are all open. first() is the one the walk from the root finds.
+    """
+    def __init__(self):
+        self.goals = set()
+        # (preorder, sequence, goal), removed goals are dropped when they come to the top.
+        self._heap = []
+        self._sequence = itertools.count()
+
+    def __len__(self):
+        return len(self.goals)
+
+    def __contains__(self, goal):
+        return goal in self.goals
+
+    def add(self, goal):
+        if goal not in self.goals:
+            self.goals.add(goal)
+            heapq.heappush(self._heap, (goal._order, next(self._sequence), goal))
+
+    def remove(self, goal):
+        self.goals.discard(goal)
+
+    def first(self):
+        heap = self._heap
+        while heap and heap[0][2] not in self.goals:
+            heapq.heappop(heap)
+        return heap[0][2] if heap else None
+
+    # Every goal in preorder
+    def leaves(self):
+        return sorted(self.goals, key=lambda goal: goal._order)
+
+
 class Goal(object):
     def __init__(self, goal_name=''):
         self.name = goal_name
@@ -97,10 +178,27 @@ class Goal(object):
         self.subgoals = []
         self.triggers = []
         self.satisfies = []
-        self.goal_state = GOAL_STATE_NOT_ASSIGNED
+        # Names of the goals achieved before this goal is worked on
+        self.precedents = []
+        self._goal_state = GOAL_STATE_NOT_ASSIGNED
         self.working_worker = []
         self.required_worker = 1
 
+        self.parent = None
+        # Tasks not Done and subgoals not achieved, the goal is achieved at 0.
+        self._pending = 0
+        # Of the root, goals whose achievement has changed since refresh_achieved(), None before the first.
+        self._changed = None
+        # Of the root, name -> goals and tasks of the name, built on demand.
+        self._index = None
+        # Of the root, name -> goals with the name in their precedents, built on demand.
+        self._followers = None
+        # Subgoals still open, see _is_open()
+        self._open_subgoals = 0
+        # Of the root, the actionable leaf goals, built on demand.
+        self._frontier = None
+        # Position in preorder, numbered with the frontier
+        self._order = 0
 
     def __repr__(self):
         return '%s with %s tasks and %s dependents' % (self.name, self.tasks, self.subgoals)
@@ -115,6 +213,114 @@ class Goal(object):
             return self.tasks
     """
 
+    @property
+    def goal_state(self):
+        return self._goal_state
+
+    @goal_state.setter
+    def goal_state(self, state):
+        was_open = _is_open(self._goal_state)
+        was_achieved = self._goal_state == GOAL_STATE_ACHIEVED
+        self._goal_state = state
+        if was_open != _is_open(state):
+            self._open_changed(not was_open)
+        if was_achieved != (state == GOAL_STATE_ACHIEVED):
+            self._precedent_changed()
+
+    '''
+        Frontier
+    '''
+
+    # The goal is opened (is_open=True) or closed, updates the parent and the frontier of the root.
+    def _open_changed(self, is_open):
+        parent = self.parent
+        if parent is None:
+            return
+        parent._open_subgoals += 1 if is_open else -1
+
+        frontier = self._root()._frontier
+        if frontier is None or not parent._reachable():
+            return
+        if is_open:
+            frontier.remove(parent)
+            if not self._blocked():
+                for goal in self._open_leaves():
+                    frontier.add(goal)
+        else:
+            # The subtree is archived, it is not looked at until it opens again.
+            for goal in self._open_leaves():
+                frontier.remove(goal)
+            if parent._open_subgoals == 0:
+                frontier.add(parent)
+
+    # The goal is achieved (or is no more), the goals following it may be unblocked (or blocked).
+    def _precedent_changed(self):
+        root = self._root()
+        frontier = root._frontier
+        if frontier is None:
+            return
+        for goal in root.followers().get(self.name, ()):
+            if goal.parent is None or not _is_open(goal.goal_state) or not goal.parent._reachable():
+                continue
+            if goal._blocked():
+                for leaf in goal._open_leaves():
+                    frontier.remove(leaf)
+            else:
+                for leaf in goal._open_leaves():
+                    frontier.add(leaf)
+
+    # A precedent of the goal is not achieved yet.
+    def _blocked(self):
+        if not self.precedents:
+            return False
+        index = self._root().index()
+        for name in self.precedents:
+            for node in index.get(name, ()):
+                if isinstance(node, Goal) and node.goal_state != GOAL_STATE_ACHIEVED:
+                    return True
+        return False
+
+    # The goal is looked at by the walk from the root, every goal above it but the root is open
+    # and not blocked.
+    def _reachable(self):
+        goal = self
+        while goal.parent is not None:
+            if not _is_open(goal.goal_state) or goal._blocked():
+                return False
+            goal = goal.parent
+        return True
+
+    # Goals with no open subgoals under the open subgoals of this goal not blocked, in preorder.
+    def _open_leaves(self):
+        stack = [self]
+        while stack:
+            goal = stack.pop()
+            if goal._open_subgoals == 0:
+                yield goal
+                continue
+            for subgoal in reversed(goal.subgoals):
+                if _is_open(subgoal.goal_state) and not subgoal._blocked():
+                    stack.append(subgoal)
+
+    def _number_goals(self):
+        stack = [self]
+        order = 0
+        while stack:
+            goal = stack.pop()
+            goal._order = order
+            order += 1
+            stack.extend(reversed(goal.subgoals))
+
+    # Called on the root
+    def frontier(self):
+        if self._frontier is None:
+            self._number_goals()
+            self._frontier = _Frontier()
+            for goal in self._open_leaves():
+                self._frontier.add(goal)
+        return self._frontier
+
+    # The former walk, from this goal down the first open subgoals.
     def _get_leaf_goal_and_tasks(self):
         if len(self.subgoals) == 0:
             return self, self.tasks
@@ -149,32 +355,122 @@ class Goal(object):
 
     # receive the agent's knowledge to check end condition
     def can_be_achieved(self):
-
-        #check subgoals
-        for subgoal in self.subgoals:
-            if not subgoal.can_be_achieved():
-                #print('>>', self.name, 'CAN NOT be achieved yet >>', self.goal_state)
-                return False
-
-        #check task
-        for task in self.tasks:
-            if task.state != 'Done':
-                #print('>>', self.name, 'CAN NOT be achieved yet >>', self.goal_state)
-                return False
+        if self._pending != 0:
+            #print('>>', self.name, 'CAN NOT be achieved yet >>', self.goal_state)
+            return False
 
         self.goal_state = 'achieved'
         #print('>>', self.name, 'CAN be achieved now >>', self.goal_state)
         return True
 
+    def is_achieved(self):
+        return self._pending == 0
+
+    # A task or a subgoal became (delta=-1) or is no more (delta=1) Done/achieved.
+    def _count(self, delta):
+        root = None
+        goal = self
+        while goal is not None:
+            was_achieved = goal._pending == 0
+            goal._pending += delta
+            if was_achieved == (goal._pending == 0):
+                break
+            if root is None:
+                root = goal._root()
+            root._note_changed(goal)
+            delta = -1 if goal._pending == 0 else 1
+            goal = goal.parent
+
+    def _root(self):
+        goal = self
+        while goal.parent is not None:
+            goal = goal.parent
+        return goal
+
+    def _note_changed(self, goal):
+        if self._changed is not None:
+            self._changed[goal] = None
+
+    def _walk(self):
+        yield self
+        for subgoal in self.subgoals:
+            yield from subgoal._walk()
+
+    def index(self):
+        if self._index is None:
+            self._index = {}
+            for goal in self._walk():
+                self._index.setdefault(goal.name, []).append(goal)
+                for task in goal.tasks:
+                    self._index.setdefault(task.__name__, []).append(task)
+        return self._index
+
+    # Called on the root
+    def followers(self):
+        if self._followers is None:
+            self._followers = {}
+            for goal in self._walk():
+                for name in goal.precedents:
+                    self._followers.setdefault(name, []).append(goal)
+        return self._followers
+
+    # Called on the root, sets the states of the goals and tasks named by 'changed' from the knowledge.
+    # Returns the nodes updated.
+    def apply_knowledge_delta(self, knowledge, changed):
+        index = self.index()
+        updated = []
+        for name in changed:
+            nodes = index.get(name)
+            if nodes is None or name not in knowledge:
+                continue
+            state = knowledge[name]['is']
+            for node in nodes:
+                if isinstance(node, Goal):
+                    if node.goal_state != GOAL_STATE_ACHIEVED:
+                        node.goal_state = state
+                else:
+                    node.state = state
+                updated.append(node)
+        return updated
+
+    # Called on the root, returns the goals achieved since the last call and marks them achieved.
+    def refresh_achieved(self):
+        if self._changed is None:
+            # The first call looks at every goal.
+            changed = list(self._walk())
+        else:
+            changed = list(self._changed)
+        self._changed = {}
+
+        achieved = []
+        for goal in changed:
+            if goal._pending == 0 and goal.goal_state != GOAL_STATE_ACHIEVED:
+                goal.goal_state = GOAL_STATE_ACHIEVED
+                achieved.append(goal)
+        return achieved
+
 
     def set_goal_name(self, goal_name):
         self.name = goal_name
 
     def set_required_task(self, task):
+        self._root()._index = None
+        self._root()._frontier = None
+        task.parent = self
         self.tasks.append(task)
+        if task.state != 'Done':
+            self._count(1)
 
     def set_required_goal(self, goal):
+        self._root()._index = None
+        self._root()._followers = None
+        self._root()._frontier = None
+        goal.parent = self
         self.subgoals.append(goal)
+        if not goal.is_achieved():
+            self._count(1)
+        if _is_open(goal.goal_state):
+            self._open_subgoals += 1
 
     def set_triggers(self, triggers):
         self.triggers = triggers
@@ -182,6 +478,11 @@ class Goal(object):
     def set_satisfies(self, satisfies):
         self.satisfies = satisfies
 
+    def set_precedents(self, precedents):
+        self.precedents = precedents
+        self._root()._followers = None
+        self._root()._frontier = None
+
     def get_tasks(self):
         return self.tasks
     """
@@ -191,11 +492,22 @@ class Goal(object):
     """
 
     def get_available_goal_and_tasks(self):
-        leaf_goal, tasks = self._get_leaf_goal_and_tasks()
-        return leaf_goal, tasks
+        if self.parent is not None:
+            return self._get_leaf_goal_and_tasks()
+        leaf_goal = self.frontier().first()
+        if leaf_goal is None:
+            # Every open goal is blocked.
+            return None, []
+        return leaf_goal, leaf_goal.tasks
+
+    # [(leaf goal, tasks)] of every actionable leaf, in preorder
+    def get_available_goals_and_tasks(self):
+        if self.parent is not None:
+            return [self._get_leaf_goal_and_tasks()]
+        return [(leaf_goal, leaf_goal.tasks) for leaf_goal in self.frontier().leaves()]
 
     def get_available_tasks(self):
-        leaf_goal, tasks = self._get_leaf_goal_and_tasks()
+        leaf_goal, tasks = self.get_available_goal_and_tasks()
         return tasks
 
     def get_goal(self):
@@ -207,13 +519,368 @@ class Goal(object):
 class Task(object):
     def __init__(self, task_name='', arguments={}, type=''):
         self.__name__ = task_name
-        self.arguments = arguments
+        # A copy, the description may be shared by every agent.
+        self.arguments = dict(arguments)
         self.arguments['task_name'] = task_name
-        self.state = 'Ready'
+        self.parent = None
+        self._state = 'Ready'
         self.type = type
 
     def __repr__(self):
         return '[Task \'%s\' with \'%s\']' % (self.__name__, self.arguments)
 
+    # Tells the goal when the task becomes Done or is no more Done.
+    @property
+    def state(self):
+        return self._state
+
+    @state.setter
+    def state(self, state):
+        was_done = self._state == 'Done'
+        self._state = state
+        if self.parent is not None and was_done != (state == 'Done'):
+            self.parent._count(1 if was_done else -1)
+
     def set_arguments(self, arguments):
         self.arguments = arguments
+
+
+'''
+    Nodes of a goal tree in preorder, a stream that is compiled without a goal description
+        (NODE_GOAL, name, parent goal id or None, triggers, satisfies[, precedents])
+        (NODE_TASK, name, arguments, type), a task of the last goal
+    Goals are numbered in the order of the stream, the tasks of a goal follow it.
+'''
+NODE_GOAL = 0
+NODE_TASK = 1
+
+
+def iter_nodes(description_dict):
+    count = 0
+    stack = [(description_dict, None)]
+    while stack:
+        description, parent = stack.pop()
+        assert 'goal' in description
+        index = count
+        count += 1
+        yield NODE_GOAL, description['goal'], parent, description.get('trigger', ()), \
+            description.get('satisfies', ()), description.get('precedent', ())
+
+        subgoals = []
+        for dependent in description.get('require', ()):
+            if isinstance(dependent, list):  # Task
+                yield NODE_TASK, dependent[0], dependent[1], dependent[2]
+            elif isinstance(dependent, dict):  # Goal
+                subgoals.append(dependent)
+        for subgoal in reversed(subgoals):
+            stack.append((subgoal, index))
+
+
+class GoalTemplate(object):
+    def __init__(self, description_dict):
+        self._compile(iter_nodes(description_dict))
+
+    # Compiled from a stream of nodes (see iter_nodes()) without a goal description
+    @classmethod
+    def from_nodes(cls, nodes):
+        template = cls.__new__(cls)
+        template._compile(nodes)
+        return template
+
+    def _compile(self, nodes):
+        goal_names, goal_parent, goal_subgoals, goal_tasks = [], [], [], []
+        goal_triggers, goal_satisfies, goal_precedents = [], [], []
+        task_names, task_goal, task_arguments, task_types = [], [], [], []
+
+        # Preorder, each goal is numbered before its subgoals.
+        for node in nodes:
+            if node[0] == NODE_GOAL:
+                _, name, parent, triggers, satisfies = node[:5]
+                precedents = node[5] if len(node) > 5 else ()
+                index = len(goal_names)
+                goal_names.append(name)
+                goal_parent.append(parent)
+                goal_subgoals.append([])
+                goal_tasks.append([])
+                goal_triggers.append(tuple(triggers))
+                goal_satisfies.append(tuple(satisfies))
+                goal_precedents.append(tuple(precedents))
+                if parent is not None:
+                    goal_subgoals[parent].append(index)
+            else:
+                _, name, arguments, task_type = node
+                arguments = dict(arguments)
+                arguments['task_name'] = name
+                goal_tasks[index].append(len(task_names))
+                task_names.append(name)
+                task_goal.append(index)
+                task_arguments.append(MappingProxyType(arguments))
+                task_types.append(task_type)
+
+        self.goal_names = tuple(goal_names)
+        self.goal_parent = tuple(goal_parent)
+        self.goal_subgoals = tuple(tuple(subgoals) for subgoals in goal_subgoals)
+        self.goal_tasks = tuple(tuple(tasks) for tasks in goal_tasks)
+        self.goal_triggers = tuple(goal_triggers)
+        self.goal_satisfies = tuple(goal_satisfies)
+        self.goal_precedents = tuple(goal_precedents)
+        self.task_names = tuple(task_names)
+        self.task_goal = tuple(task_goal)
+        self.task_arguments = tuple(task_arguments)
+        self.task_types = tuple(task_types)
+
+        # Every task starts Ready, so a goal waits for all of its tasks and subgoals
+        # but the ones with nothing to do, which are achieved from the start.
+        pending = [0] * len(goal_names)
+        for index in reversed(range(len(goal_names))):
+            pending[index] = len(self.goal_tasks[index]) + \
+                sum(1 for subgoal in self.goal_subgoals[index] if pending[subgoal] != 0)
+        self.pending = tuple(pending)
+        self.achieved_at_start = tuple(index for index, count in enumerate(pending) if count == 0)
+
+        # name -> ((True, goal id) or (False, task id), ...)
+        index = {}
+        for goal, name in enumerate(self.goal_names):
+            index.setdefault(name, []).append((True, goal))
+        for task, name in enumerate(self.task_names):
+            index.setdefault(name, []).append((False, task))
+        self.index = MappingProxyType(dict((name, tuple(nodes)) for name, nodes in index.items()))
+
+        # name -> goal ids with the name in their precedents
+        followers = {}
+        for goal, precedents in enumerate(self.goal_precedents):
+            for name in precedents:
+                followers.setdefault(name, []).append(goal)
+        self.followers = MappingProxyType(dict((name, tuple(goals)) for name, goals in followers.items()))
+
+    def __len__(self):
+        return len(self.goal_names) + len(self.task_names)
+
+    # Read-only mappings cannot be pickled, they are stored as dicts.
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state['task_arguments'] = tuple(dict(arguments) for arguments in self.task_arguments)
+        state['index'] = dict(self.index)
+        state['followers'] = dict(self.followers)
+        return state
+
+    def __setstate__(self, state):
+        state['task_arguments'] = tuple(MappingProxyType(arguments) for arguments in state['task_arguments'])
+        state['index'] = MappingProxyType(state['index'])
+        state['followers'] = MappingProxyType(state['followers'])
+        self.__dict__.update(state)
+
+    # A template sharing this tree, with the arguments of some tasks replaced, {task id: arguments}
+    def replace_arguments(self, replaced):
+        template = copy.copy(self)
+        task_arguments = list(self.task_arguments)
+        for task, arguments in replaced.items():
+            arguments = dict(arguments)
+            arguments['task_name'] = self.task_names[task]
+            task_arguments[task] = MappingProxyType(arguments)
+        template.task_arguments = tuple(task_arguments)
+        return template
+
+    # The root goal of a new agent
+    def instantiate(self):
+        return Plan(self).root
+
+
+class Plan(object):
+    """
+        States of an agent on a GoalTemplate, by node id.
+        Nodes not in the dicts have the states of the template.
+    """
+    def __init__(self, template):
+        self.template = template
+        self.goal_states = {}
+        self.task_states = {}
+        # Arguments set by the agent, see TaskView.set_arguments()
+        self.task_arguments = {}
+        self.pending = {}
+        self.open_subgoals = {}
+        self.frontier = None
+        self.root = GoalView(self, 0)
+        # Goals whose achievement has changed, see Goal.refresh_achieved()
+        self.changed = dict.fromkeys(GoalView(self, goal) for goal in template.achieved_at_start)
+
+
+class _ViewIndex(object):
+    # name -> [views], like Goal.index()
+    def __init__(self, plan):
+        self.plan = plan
+
+    def get(self, name, default=None):
+        nodes = self.plan.template.index.get(name)
+        if nodes is None:
+            return default
+        return [GoalView(self.plan, node) if is_goal else TaskView(self.plan, node) for is_goal, node in nodes]
+
+
+class _ViewFollowers(object):
+    # name -> [goal views], like Goal.followers()
+    def __init__(self, plan):
+        self.plan = plan
+
+    def get(self, name, default=None):
+        goals = self.plan.template.followers.get(name)
+        if goals is None:
+            return default
+        return [GoalView(self.plan, goal) for goal in goals]
+
+
+class GoalView(Goal):
+    """
+        A goal of a GoalTemplate as seen by an agent.
+        Views are made on demand, two views of the same node are equal.
+    """
+    def __init__(self, plan, goal_id):
+        self._plan = plan
+        self.id = goal_id
+
+    def __eq__(self, other):
+        return isinstance(other, GoalView) and other._plan is self._plan and other.id == self.id
+
+    def __hash__(self):
+        return hash((id(self._plan), self.id))
+
+    @property
+    def name(self):
+        return self._plan.template.goal_names[self.id]
+
+    @property
+    def tasks(self):
+        return [TaskView(self._plan, task) for task in self._plan.template.goal_tasks[self.id]]
+
+    @property
+    def subgoals(self):
+        return [GoalView(self._plan, goal) for goal in self._plan.template.goal_subgoals[self.id]]
+
+    @property
+    def triggers(self):
+        return self._plan.template.goal_triggers[self.id]
+
+    @property
+    def satisfies(self):
+        return self._plan.template.goal_satisfies[self.id]
+
+    @property
+    def precedents(self):
+        return self._plan.template.goal_precedents[self.id]
+
+    @property
+    def parent(self):
+        parent = self._plan.template.goal_parent[self.id]
+        return None if parent is None else GoalView(self._plan, parent)
+
+    @property
+    def _goal_state(self):
+        return self._plan.goal_states.get(self.id, GOAL_STATE_NOT_ASSIGNED)
+
+    @_goal_state.setter
+    def _goal_state(self, state):
+        self._plan.goal_states[self.id] = state
+
+    # Every goal starts open.
+    @property
+    def _open_subgoals(self):
+        return self._plan.open_subgoals.get(self.id, len(self._plan.template.goal_subgoals[self.id]))
+
+    @_open_subgoals.setter
+    def _open_subgoals(self, count):
+        self._plan.open_subgoals[self.id] = count
+
+    @property
+    def _frontier(self):
+        return self._plan.frontier
+
+    @_frontier.setter
+    def _frontier(self, frontier):
+        self._plan.frontier = frontier
+
+    # Goals of a template are numbered in preorder.
+    @property
+    def _order(self):
+        return self.id
+
+    def _number_goals(self):
+        pass
+
+    @property
+    def _pending(self):
+        return self._plan.pending.get(self.id, self._plan.template.pending[self.id])
+
+    @_pending.setter
+    def _pending(self, pending):
+        self._plan.pending[self.id] = pending
+
+    @property
+    def _changed(self):
+        return self._plan.changed
+
+    @_changed.setter
+    def _changed(self, changed):
+        self._plan.changed = changed
+
+    def _root(self):
+        return self._plan.root
+
+    def index(self):
+        return _ViewIndex(self._plan)
+
+    def followers(self):
+        return _ViewFollowers(self._plan)
+
+    # The tree of a template is immutable.
+    def set_required_task(self, task):
+        raise TypeError('goals of a template cannot be changed')
+
+    def set_required_goal(self, goal):
+        raise TypeError('goals of a template cannot be changed')
+
+    def set_precedents(self, precedents):
+        raise TypeError('goals of a template cannot be changed')
+
+
+class TaskView(Task):
+    """
+        A task of a GoalTemplate as seen by an agent.
+        set_arguments() replaces its arguments for this agent only, the template is not changed.
+    """
+    def __init__(self, plan, task_id):
+        self._plan = plan
+        self.id = task_id
+
+    def __eq__(self, other):
+        return isinstance(other, TaskView) and other._plan is self._plan and other.id == self.id
+
+    def __hash__(self):
+        return hash((id(self._plan), self.id))
+
+    @property
+    def __name__(self):
+        return self._plan.template.task_names[self.id]
+
+    @property
+    def arguments(self):
+        arguments = self._plan.task_arguments.get(self.id)
+        return self._plan.template.task_arguments[self.id] if arguments is None else arguments
+
+    @property
+    def type(self):
+        return self._plan.template.task_types[self.id]
+
+    @property
+    def parent(self):
+        return GoalView(self._plan, self._plan.template.task_goal[self.id])
+
+    @property
+    def _state(self):
+        return self._plan.task_states.get(self.id, 'Ready')
+
+    @_state.setter
+    def _state(self, state):
+        self._plan.task_states[self.id] = state
+
+    def set_arguments(self, arguments):
+        self._plan.task_arguments[self.id] = arguments
@@ -0,0 +1,219 @@
+"""
+    GoalArray class
+    This is a compiled form of a goal tree held in NumPy arrays instead of Goal/Task objects,
+        - Goals are numbered in preorder, so the subgoals of a goal are the range [i, goal_end[i]).
+        - Tasks are numbered in the order of their goals, so the tasks under a goal are the range
+          [task_start[i], task_start[goal_end[i]]).
+        - States are int8 codes of the state names, see state_code().
+    Queries over a subtree and updates of many tasks are vectorised,
+        - achieved(): achievement of every goal at once, from a cumulative sum of tasks not Done
+        - all_done(goal): whether every task under a goal is Done
+        - first_unachieved_leaf(): the first goal in preorder with no subgoals and not achieved
+        - set_task_states(names, state), apply_knowledge_delta(knowledge, changed)
+    A tree of 100k tasks takes a few MB, most of it is the names.
+    It can be compiled from a Goal (from_goal), a goal description (from_description)
+    or a stream of nodes (from_nodes).
+"""
+
+import numpy as np
+
+from goal import GOAL_STATE_NOT_ASSIGNED, GOAL_STATE_ACTIVE, GOAL_STATE_ACHIEVED, GOAL_STATE_FAILED
+from goal import NODE_GOAL, iter_nodes
+
+# States known in advance, others get codes as they appear.
+STATES = ['Ready', 'Ping', 'Active', 'Done', 'Failed',
+          GOAL_STATE_NOT_ASSIGNED, 'assigned', GOAL_STATE_ACTIVE, GOAL_STATE_ACHIEVED, GOAL_STATE_FAILED]
+
+
+class GoalArray(object):
+    def __init__(self, goal_names, goal_parent, goal_end, task_names, task_goal, task_arguments, task_types):
+        self.states = list(STATES)
+        self.codes = dict((state, code) for code, state in enumerate(self.states))
+
+        self.goal_names = goal_names
+        self.goal_parent = np.asarray(goal_parent, dtype=np.int32)
+        self.goal_end = np.asarray(goal_end, dtype=np.int32)
+        self.goal_state = np.full(len(goal_names), self.codes[GOAL_STATE_NOT_ASSIGNED], dtype=np.int8)
+
+        self.task_names = task_names
+        self.task_goal = np.asarray(task_goal, dtype=np.int32)
+        self.task_arguments = task_arguments
+        self.task_types = task_types
+        self.task_state = np.full(len(task_names), self.codes['Ready'], dtype=np.int8)
+
+        # task_start[i]: the first task of goal i, task_start[len(goals)]: the number of tasks
+        self.task_start = np.searchsorted(self.task_goal, np.arange(len(goal_names) + 1)).astype(np.int32)
+        # A goal is a leaf when the next goal in preorder is not its child.
+        self.is_leaf = self.goal_end == np.arange(1, len(goal_names) + 1)
+
+        # name -> index, built by the first update by names
+        self._goal_index = None
+        self._task_index = None
+
+    @classmethod
+    def from_goal(cls, root):
+        goal_names, goal_parent, goal_end = [], [], []
+        task_names, task_goal, task_arguments, task_types = [], [], [], []
+        states = []
+
+        # Preorder with an explicit stack, 'end' is filled when a goal is left.
+        stack = [(root, -1, False)]
+        while stack:
+            goal, parent, leaving = stack.pop()
+            if leaving:
+                goal_end[goal] = len(goal_names)
+                continue
+            index = len(goal_names)
+            goal_names.append(goal.name)
+            goal_parent.append(parent)
+            goal_end.append(None)
+            states.append((goal.goal_state, [task.state for task in goal.tasks]))
+            for task in goal.tasks:
+                task_names.append(task.__name__)
+                task_goal.append(index)
+                task_arguments.append(task.arguments)
+                task_types.append(task.type)
+            stack.append((index, None, True))
+            for subgoal in reversed(goal.subgoals):
+                stack.append((subgoal, index, False))
+
+        compiled = cls(goal_names, goal_parent, goal_end, task_names, task_goal, task_arguments, task_types)
+        task = 0
+        for index, (goal_state, task_states) in enumerate(states):
+            compiled.goal_state[index] = compiled.state_code(goal_state)
+            for state in task_states:
+                compiled.task_state[task] = compiled.state_code(state)
+                task += 1
+        return compiled
+
+    # Same format with create_goal_set(), without creating Goal and Task objects.
+    @classmethod
+    def from_description(cls, description):
+        return cls.from_nodes(iter_nodes(description))
+
+    # From a stream of nodes in preorder, see goal.iter_nodes()
+    @classmethod
+    def from_nodes(cls, nodes):
+        goal_names, goal_parent = [], []
+        task_names, task_goal, task_arguments, task_types = [], [], [], []
+
+        for node in nodes:
+            if node[0] == NODE_GOAL:
+                goal_names.append(node[1])
+                goal_parent.append(-1 if node[2] is None else node[2])
+            else:
+                task_names.append(node[1])
+                task_goal.append(len(goal_names) - 1)
+                task_arguments.append(node[2])
+                task_types.append(node[3])
+
+        # A goal ends after its last descendant, children come after their parents.
+        goal_end = list(range(1, len(goal_names) + 1))
+        for index in reversed(range(1, len(goal_names))):
+            parent = goal_parent[index]
+            if goal_end[index] > goal_end[parent]:
+                goal_end[parent] = goal_end[index]
+
+        return cls(goal_names, goal_parent, goal_end, task_names, task_goal, task_arguments, task_types)
+
+    def goal_index(self):
+        if self._goal_index is None:
+            self._goal_index = dict((name, i) for i, name in reversed(list(enumerate(self.goal_names))))
+        return self._goal_index
+
+    # name -> index of the task, or a list of indices for names of several tasks
+    def task_index(self):
+        if self._task_index is None:
+            index = {}
+            for i, name in enumerate(self.task_names):
+                found = index.setdefault(name, i)
+                if found != i:
+                    index[name] = (found if isinstance(found, list) else [found]) + [i]
+            self._task_index = index
+        return self._task_index
+
+    def state_code(self, state):
+        code = self.codes.get(state)
+        if code is None:
+            assert len(self.states) < 128, 'too many states for int8'
+            code = self.codes[state] = len(self.states)
+            self.states.append(state)
+        return code
+
+    def state_name(self, code):
+        return self.states[code]
+
+    '''
+        Queries
+    '''
+
+    # The number of tasks not Done under each goal
+    def pending(self):
+        not_done = np.concatenate(([0], np.cumsum(self.task_state != self.codes['Done'], dtype=np.int64)))
+        return not_done[self.task_start[self.goal_end]] - not_done[self.task_start[:-1]]
+
+    # Achievement of every goal, all tasks under it are Done.
+    def achieved(self):
+        return self.pending() == 0
+
+    def all_done(self, goal=0):
+        start, end = self.task_start[goal], self.task_start[self.goal_end[goal]]
+        return bool(np.all(self.task_state[start:end] == self.codes['Done']))
+
+    # Index of the first leaf goal not achieved, None when every leaf is achieved.
+    def first_unachieved_leaf(self):
+        candidates = np.flatnonzero(self.is_leaf & ~self.achieved())
+        if len(candidates) == 0:
+            return None
+        return int(candidates[0])
+
+    def subgoals(self, goal=0):
+        return np.flatnonzero(self.goal_parent == goal)
+
+    def tasks(self, goal):
+        return np.arange(self.task_start[goal], self.task_start[goal + 1])
+
+    '''
+        Updates
+    '''
+
+    def set_task_states(self, names, state):
+        index = self.task_index()
+        indices = []
+        for name in names:
+            found = index.get(name)
+            if isinstance(found, list):
+                indices.extend(found)
+            elif found is not None:
+                indices.append(found)
+        self.task_state[indices] = self.state_code(state)
+
+    def set_goal_states(self, names, state):
+        index = self.goal_index()
+        indices = [index[name] for name in names if name in index]
+        self.goal_state[indices] = self.state_code(state)
+
+    # Like Goal.apply_knowledge_delta(), the achieved goals stay achieved.
+    def apply_knowledge_delta(self, knowledge, changed):
+        achieved = self.codes[GOAL_STATE_ACHIEVED]
+        task_index = self.task_index()
+        goal_index = self.goal_index()
+        for name in changed:
+            if name not in knowledge:
+                continue
+            if name in task_index:
+                self.task_state[task_index[name]] = self.state_code(knowledge[name]['is'])
+            goal = goal_index.get(name)
+            if goal is not None and self.goal_state[goal] != achieved:
+                self.goal_state[goal] = self.state_code(knowledge[name]['is'])
+
+    # Marks the goals achieved now, returns their names.
+    def refresh_achieved(self):
+        code = self.codes[GOAL_STATE_ACHIEVED]
+        newly = np.flatnonzero(self.achieved() & (self.goal_state != code))
+        self.goal_state[newly] = code
+        return [self.goal_names[i] for i in newly]
+
+    def nbytes(self):
+        return sum(array.nbytes for array in (self.goal_parent, self.goal_end, self.goal_state, self.task_goal,
+                                              self.task_state, self.task_start, self.is_leaf))
@@ -0,0 +1,194 @@
+"""
+    PylonPlan class
+    This generates goal trees of the pylon plan (resource/goals/gg_pylon.json) from parameters,
+    to see how agents and goals scale with more work than a game plan,
+        - branches: goals 'I have G b' under the root, their pylons are built side by side
+        - depth: pylons chained in a branch, 'I have pylon k' requires 'I have pylon k+1'
+        - pylons: pylons of every branch, depth is derived from it when given
+        - gathers: gather tasks of a pylon before its minerals are checked
+        - threshold: minerals checked before a pylon, a number or a function of the pylon number
+        - sequential: branches are worked on one after another, each has the one before it as
+          its precedent, instead of at the same time as far as the pylons counted allow
+    The gathers of a pylon always come after the pylon built before it in its branch,
+    a build spends the minerals the gathers before it checked.
+    PylonPlan() is the plan of gg_pylon.json, PylonPlan(pylons=2000, branches=200) is 100 times of it.
+    Large trees are streamed without a goal description,
+        - nodes(): goals and tasks in preorder, for GoalTemplate.from_nodes() and GoalArray.from_nodes()
+        - initial_knowledge(): (subject, statement) of every node
+        - write_json(f): the goal file for load_goal(), in O(depth) memory
+    description() builds the goal description, for small trees.
+"""
+
+import json
+
+from goal import NODE_GOAL, NODE_TASK
+
+# Positions of the pylons in a branch of the game plan, from the first pylon
+RING = ((0, 0), (-2, 0), (-4, -2), (-4, -4), (-4, -6), (-2, -8), (0, -8), (2, -6), (2, -4), (0, -4))
+ORIGIN = (30, 40)
+BRANCH_SPACING = 9
+
+
+class PylonPlan(object):
+    def __init__(self, branches=2, depth=10, gathers=4, threshold=100, pylons=None,
+                 mineral='$minerals[0]', name='I have GG Pylon', sequential=False):
+        assert branches > 0 and gathers >= 0
+        if pylons is not None:
+            depth = -(-pylons // branches)
+        else:
+            pylons = branches * depth
+        assert 0 < pylons <= branches * depth
+
+        self.name = name
+        self.gathers = gathers
+        self.threshold = threshold
+        self.sequential = sequential
+        # Unit tag of the gather tasks, a placeholder of load_goal() by default
+        self.mineral = mineral
+        # (first pylon, number of pylons) of each branch, the last one may be shorter
+        self.branches = []
+        for branch in range(branches):
+            first = branch * depth
+            if first < pylons:
+                self.branches.append((first, min(depth, pylons - first)))
+
+    def __len__(self):
+        return sum(count for first, count in self.branches)
+
+    def amount(self, pylon):
+        return self.threshold(pylon) if callable(self.threshold) else self.threshold
+
+    def position(self, branch, j):
+        lap, i = divmod(j, len(RING))
+        return ORIGIN[0] + RING[i][0] + BRANCH_SPACING * branch, ORIGIN[1] + RING[i][1] - 10 * lap
+
+    '''
+        Nodes of a pylon, pylon numbers start at 1.
+    '''
+
+    def gather_goal(self, pylon):
+        amount = self.amount(pylon)
+        tasks = [['gather %d' % (self.gathers * (pylon - 1) + i + 1), {'target': 'unit', 'unit_tag': self.mineral},
+                  'General'] for i in range(self.gathers)]
+        tasks.append(['check mineral %d' % pylon, {'target': 'minerals', 'amount': amount}, 'Query'])
+        return 'gather %d minerals %d' % (amount, pylon), tasks
+
+    # Tasks of 'I have pylon k', the j-th pylon of a branch of 'count' pylons from 'first'
+    def pylon_tasks(self, branch, first, count, j):
+        pylon = first + j + 1
+        x, y = self.position(branch, j)
+        return [['build_pylon %d' % pylon, {'target': 'point', 'pos_x': x, 'pos_y': y}, 'General'],
+                ['built pylon %d' % pylon, {'target': 'pylons', 'built': first + count - j}, 'Query']]
+
+    # Goal of a level of a branch, 0 is the branch, k is its k-th pylon.
+    def level_name(self, branch, first, level):
+        if level == 0:
+            return 'I have G %d' % (branch + 1)
+        return 'I have pylon %d' % (first + level)
+
+    # The j-th pylon of a branch whose gathers and tasks are required by a level, None if no pylon.
+    # As in the game plan, the first pylon's are required by the branch, not by the first pylon.
+    @staticmethod
+    def owned(level):
+        if level == 0:
+            return 0
+        if level == 1:
+            return None
+        return level - 1
+
+    # Precedents of the goal of a level and of its gathers.
+    # Pylons built are counted over the branches, the first pylon of a branch is built after the branch
+    # before it, the whole branch when sequential. The gathers come after the level below, which builds
+    # the pylon before, otherwise every check passes on the same minerals and builds fail in the game.
+    def precedents(self, branch, first, count, level):
+        goal, gathers = [], []
+        if branch > 0 and level == (0 if self.sequential else count):
+            goal = [self.level_name(branch - 1, None, 0)]
+        if level < count:
+            gathers = [self.level_name(branch, first, level + 1)]
+        return goal, gathers
+
+    def _root(self):
+        return {'goal': self.name, 'trigger': [], 'satisfy': [['type2', 'i', 'have', ['100 minerals']]],
+                'precedent': [], 'require': []}
+
+    '''
+        Streams
+    '''
+
+    def nodes(self):
+        yield NODE_GOAL, self.name, None, (), ()
+        index = 1
+        for branch, (first, count) in enumerate(self.branches):
+            # Down the chain, each level requires the next one first
+            levels = []
+            for level in range(count + 1):
+                precedents = self.precedents(branch, first, count, level)[0]
+                yield NODE_GOAL, self.level_name(branch, first, level), levels[-1] if levels else 0, (), (), precedents
+                j = self.owned(level)
+                if j is not None:
+                    for task in self.pylon_tasks(branch, first, count, j):
+                        yield (NODE_TASK,) + tuple(task)
+                levels.append(index)
+                index += 1
+            # and up, the gathers of a level come after the levels below it.
+            for level in reversed(range(count + 1)):
+                j = self.owned(level)
+                if j is None:
+                    continue
+                name, tasks = self.gather_goal(first + j + 1)
+                yield NODE_GOAL, name, levels[level], (), (), self.precedents(branch, first, count, level)[1]
+                for task in tasks:
+                    yield (NODE_TASK,) + tuple(task)
+                index += 1
+
+    def initial_knowledge(self):
+        for node in self.nodes():
+            yield node[1], {'is': 'Not Assigned' if node[0] == NODE_GOAL else 'Ready'}
+
+    def _owned_require(self, branch, first, count, level):
+        j = self.owned(level)
+        if j is None:
+            return []
+        name, tasks = self.gather_goal(first + j + 1)
+        gathers = {'goal': name, 'require': tasks}
+        precedents = self.precedents(branch, first, count, level)[1]
+        if precedents:
+            gathers['precedent'] = precedents
+        return [gathers] + self.pylon_tasks(branch, first, count, j)
+
+    def description(self):
+        root = self._root()
+        for branch, (first, count) in enumerate(self.branches):
+            # From the last pylon, as a level requires the next one.
+            below = None
+            for level in reversed(range(count + 1)):
+                require = [] if below is None else [below]
+                require.extend(self._owned_require(branch, first, count, level))
+                below = {'goal': self.level_name(branch, first, level), 'require': require}
+                precedents = self.precedents(branch, first, count, level)[0]
+                if precedents:
+                    below['precedent'] = precedents
+            root['require'].append(below)
+        return root
+
+    # Same tree with description(), a node a line.
+    def write_json(self, f):
+        root = self._root()
+        del root['require']
+        f.write(json.dumps(root)[:-1] + ', "require": [\n')
+        for branch, (first, count) in enumerate(self.branches):
+            if branch:
+                f.write(',\n')
+            for level in range(count + 1):
+                precedents = self.precedents(branch, first, count, level)[0]
+                f.write('{"goal": %s, %s"require": [\n' % (json.dumps(self.level_name(branch, first, level)),
+                                                           '"precedent": %s, ' % json.dumps(precedents) if precedents else ''))
+            for level in reversed(range(count + 1)):
+                items = self._owned_require(branch, first, count, level)
+                for i, item in enumerate(items):
+                    if i or level < count:
+                        f.write(',\n')
+                    f.write(json.dumps(item))
+                f.write('\n]}')
+        f.write('\n]}\n')
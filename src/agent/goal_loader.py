@@ -0,0 +1,273 @@
+"""
+    Goal files
+    A goal tree is written in a JSON or YAML file, in the format of goal descriptions
+    (see create_goal_set()), e.g. resource/goals/gg_pylon.json,
+        - A task is [name, arguments, type], the type is 'General' or 'Query'.
+        - Values known only in a game are placeholders, "$minerals[0]" is replaced by
+          params['minerals'][0] and "$base" by params['base'] when the file is loaded.
+        - The initial knowledge is derived from the tree, goals are 'Not Assigned' and
+          tasks are 'Ready'. "knowledge" of the root goal adds or overrides statements.
+        - Placeholders are in the arguments of tasks only.
+        - "precedent" of a goal names the goals of the tree achieved before it is worked on,
+          goals are worked on at the same time otherwise.
+    load_goal() validates the file and compiles it into a GoalTemplate.
+    The compiled result is cached in a pickle under __goalcache__ next to the file, named by
+    the hash of the file and of the code compiling it (goal.py and this module), so a plan is
+    parsed and compiled again only when the file or the layout of GoalTemplate changes.
+"""
+
+import gc
+import os
+import re
+import json
+import pickle
+import hashlib
+import inspect
+import logging
+import tempfile
+
+from goal import GoalTemplate
+
+FORMAT = '%(asctime)s %(module)s %(levelname)s %(lineno)d %(message)s'
+logging.basicConfig(level=logging.INFO, format=FORMAT)
+logger = logging.getLogger(__name__)
+
+# Bumped when the cached form changes, older caches are not used.
+CACHE_VERSION = 2
+CACHE_DIR = '__goalcache__'
+# Hash of the code compiling goals, see _code_digest()
+_CODE_DIGEST = None
+
+TASK_TYPES = ('General', 'Query')
+GOAL_KEYS = ('goal', 'trigger', 'satisfy', 'satisfies', 'precedent', 'require')
+
+PLACEHOLDER = re.compile(r'^\$(\w+)(?:\[(\d+)\])?$')
+
+class LoadedGoal(object):
+    """
+        A goal loaded from a file,
+            template: GoalTemplate of the goal
+            initial_knowledge: {subject: statement}, a new dict for each load
+            description: the goal description, decoded on first use as only
+                         agents in other processes need it (see AgentLauncher)
+    """
+    def __init__(self, template, initial_knowledge, description_blob, params, path):
+        self.template = template
+        self.initial_knowledge = initial_knowledge
+        self._description_blob = description_blob
+        self._description = None
+        self._params = params
+        self._path = path
+
+    @property
+    def description(self):
+        if self._description is None:
+            self._description = _substitute(pickle.loads(self._description_blob), self._params, self._path)
+        return self._description
+
+
+def load_goal(path, params=None, cache_dir=None):
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(path)), CACHE_DIR)
+    digest = hashlib.sha1(b'%d:' % CACHE_VERSION + _code_digest() + data).hexdigest()
+    stem = os.path.splitext(os.path.basename(path))[0]
+    cache_path = os.path.join(cache_dir, '%s.%s.pickle' % (stem, digest[:16]))
+
+    compiled = _read_cache(cache_path)
+    if compiled is None:
+        compiled = compile_goal(_parse(path, data), path)
+        _write_cache(cache_dir, cache_path, stem, compiled)
+    template, statements, placeheld, description_blob = compiled
+
+    params = params or {}
+    if placeheld:
+        template = template.replace_arguments(
+            dict((task, _substitute(dict(template.task_arguments[task]), params, path)) for task in placeheld))
+    return LoadedGoal(template, initial_knowledge(template, statements), description_blob, params, path)
+
+
+# Goals are 'Not Assigned' and tasks are 'Ready', updated by the statements given in the file.
+def initial_knowledge(template, statements=None):
+    knowledge = {}
+    for name in template.goal_names:
+        knowledge[name] = {'is': 'Not Assigned'}
+    for name in template.task_names:
+        knowledge[name] = {'is': 'Ready'}
+    for subject, statement in (statements or {}).items():
+        knowledge[subject] = dict(statement)
+    return knowledge
+
+
+def _parse(path, data):
+    extension = os.path.splitext(path)[1].lower()
+    try:
+        if extension in ('.yaml', '.yml'):
+            # Imported here, only YAML files need PyYAML.
+            import yaml
+            try:
+                return yaml.safe_load(data)
+            except yaml.YAMLError as e:
+                raise ValueError(e)
+        return json.loads(data.decode('utf-8'))
+    except ValueError as e:
+        raise ValueError('%s: %s' % (path, e))
+
+
+'''
+    Validation and compilation
+'''
+
+
+# Returns (template, statements of the file, ids of tasks with placeholders, pickled description).
+def compile_goal(description, path='<goal>'):
+    if not isinstance(description, dict):
+        raise ValueError('%s: the root must be a goal, not %s' % (path, type(description).__name__))
+
+    description = dict(description)
+    extra = description.pop('knowledge', {})
+    if not isinstance(extra, dict) or not all(isinstance(statement, dict) for statement in extra.values()):
+        raise ValueError('%s: knowledge must be {subject: statement}' % path)
+    goal_names = set()
+    description = _validate_goal(description, path, 'the root', goal_names, set())
+
+    template = GoalTemplate(description)
+    for goal, precedents in enumerate(template.goal_precedents):
+        for name in precedents:
+            if not isinstance(name, str) or name not in goal_names:
+                raise ValueError('%s: precedent %r of goal %r is not a goal of the tree' %
+                                 (path, name, template.goal_names[goal]))
+    placeheld = tuple(task for task, arguments in enumerate(template.task_arguments) if _has_placeholder(arguments))
+    return template, extra, placeheld, pickle.dumps(description, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+# A copy of the goal with tasks as lists, as YAML and JSON give the same.
+def _validate_goal(goal, path, where, goal_names, task_names):
+    name = goal.get('goal')
+    if not isinstance(name, str) or not name:
+        raise ValueError('%s: %s has no goal name' % (path, where))
+    where = 'goal %r' % name
+    unknown = set(goal) - set(GOAL_KEYS)
+    if unknown:
+        raise ValueError('%s: %s has unknown keys %s' % (path, where, sorted(unknown)))
+    if name in goal_names:
+        raise ValueError('%s: %s is defined more than once' % (path, where))
+    goal_names.add(name)
+
+    validated = dict(goal)
+    for key in ('trigger', 'satisfy', 'satisfies', 'precedent'):
+        if key in goal and not isinstance(goal[key], list):
+            raise ValueError('%s: %s of %s must be a list' % (path, key, where))
+
+    require = goal.get('require', [])
+    if not isinstance(require, list):
+        raise ValueError('%s: require of %s must be a list' % (path, where))
+    validated['require'] = []
+    for i, dependent in enumerate(require):
+        if isinstance(dependent, dict):
+            where_dependent = 'require[%d] of %s' % (i, where)
+            validated['require'].append(_validate_goal(dependent, path, where_dependent, goal_names, task_names))
+            continue
+        if not isinstance(dependent, list) or len(dependent) != 3:
+            raise ValueError('%s: require[%d] of %s must be a goal or [name, arguments, type]' % (path, i, where))
+        task_name, arguments, task_type = dependent
+        if not isinstance(task_name, str) or not task_name:
+            raise ValueError('%s: require[%d] of %s has no task name' % (path, i, where))
+        if not isinstance(arguments, dict):
+            raise ValueError('%s: arguments of task %r must be a dict' % (path, task_name))
+        if task_type not in TASK_TYPES:
+            raise ValueError('%s: type of task %r must be one of %s' % (path, task_name, TASK_TYPES))
+        if task_name in task_names or task_name in goal_names:
+            # Nodes of a name share their state in knowledge, it may not be intended.
+            logger.warning('%s: %r is in the tree more than once' % (path, task_name))
+        task_names.add(task_name)
+        validated['require'].append([task_name, arguments, task_type])
+    return validated
+
+
+'''
+    Placeholders
+'''
+
+
+def _has_placeholder(value):
+    if isinstance(value, str):
+        return PLACEHOLDER.match(value) is not None
+    if isinstance(value, (list, tuple)):
+        return any(_has_placeholder(item) for item in value)
+    if hasattr(value, 'values'):
+        return any(_has_placeholder(item) for item in value.values())
+    return False
+
+
+def _substitute(value, params, path):
+    if isinstance(value, str):
+        match = PLACEHOLDER.match(value)
+        if match is None:
+            return value
+        name, index = match.groups()
+        if name not in params:
+            raise ValueError('%s: no value for the placeholder %s' % (path, value))
+        if index is None:
+            return params[name]
+        if int(index) >= len(params[name]):
+            raise ValueError('%s: %s is out of %d values' % (path, value, len(params[name])))
+        return params[name][int(index)]
+    if isinstance(value, list):
+        return [_substitute(item, params, path) for item in value]
+    if isinstance(value, dict):
+        return dict((key, _substitute(item, params, path)) for key, item in value.items())
+    return value
+
+
+'''
+    Cache
+'''
+
+
+# A cache made by another goal.py holds templates of another layout, the hash of the code is in its name.
+def _code_digest():
+    global _CODE_DIGEST
+    if _CODE_DIGEST is None:
+        digest = hashlib.sha1()
+        for module_path in (inspect.getsourcefile(GoalTemplate), __file__):
+            with open(module_path, 'rb') as f:
+                digest.update(f.read())
+        _CODE_DIGEST = digest.digest()
+    return _CODE_DIGEST
+
+
+def _read_cache(cache_path):
+    # Collections made while unpickling are all alive, the collector only slows it down.
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        with open(cache_path, 'rb') as f:
+            return pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning('Ignoring the broken cache %s: %s' % (cache_path, e))
+        return None
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _write_cache(cache_dir, cache_path, stem, compiled):
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        # Written aside and renamed, a reader never sees half a file.
+        fd, temp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(compiled, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, cache_path)
+        # Caches of former versions of the file
+        for name in os.listdir(cache_dir):
+            if re.match(re.escape(stem) + r'\.[0-9a-f]{16}\.pickle$', name) and \
+                    os.path.join(cache_dir, name) != cache_path:
+                os.remove(os.path.join(cache_dir, name))
+    except OSError as e:
+        logger.warning('Cannot write the cache %s: %s' % (cache_path, e))
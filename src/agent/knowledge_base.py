@@ -10,40 +10,185 @@
 """
     type: dict[subject][verb][value]
     Nested Dictionary
+
+    Changes are tracked to broadcast only what is changed,
+        - version: increases on every change of the knowledge
+        - versions: the version of the last change of each subject
+        - dirty: subjects changed locally since the last delta()
+        - changed: subjects changed locally or by others since the last take_changed(),
+          the agent updates only those nodes of its goal tree
+    Statements merged from other agents by update() are not dirty,
+    their owners already broadcast them. 'ping' sets and 'bids' of tasks are merged
+    with the ones known, other verbs are replaced.
+    A statement of a later 'epoch' (a task given back, see allocation.Leases) replaces
+    the one known, and one of a former epoch is ignored but that the task is Done.
+    Done is terminal in any epoch, a task known Done only takes the later epoch number.
+    In an epoch a task never goes back to a former state, nor does a goal (e.g., from achieved
+    to assigned), and the lease of the agent who took it is kept over a claim, so msgs arriving
+    late change nothing. Statements which are not dicts are ignored.
 """
 
+# Order of the states of a task in an epoch
+TASK_STATES = {'Ready': 0, 'Ping': 1, 'Bid': 1, 'Active': 2, 'Done': 3}
+# Order of the states of a goal, see agent.reason()
+GOAL_STATES = {'Not Assigned': 0, 'assigned': 1, 'active': 2, 'achieved': 3}
+# A state told by others never takes a subject back to a former state.
+STATE_ORDER = dict(TASK_STATES)
+STATE_ORDER.update(GOAL_STATES)
+
+
+# Whether a lease [holder, expiry] told by others is newer than the one known
+def _is_newer_lease(known, lease):
+    if not known or not lease:
+        return bool(lease)
+    if (known[0] is None) != (lease[0] is None):
+        return known[0] is None
+    return lease[1] > known[1]
+
+# Containers may be changed in place, so the same object is treated as changed.
+def _is_changed(old, new):
+    if old is new:
+        return isinstance(new, (set, list, dict))
+    return old != new
+
+
+class Statement(dict):
+    """
+        Nested dict of a subject (i.e., dict[verb][value])
+        It tells the knowledge when it is changed locally.
+    """
+    def __init__(self, knowledge, subject, *args, **kwargs):
+        dict.__init__(self, *args, **kwargs)
+        self._knowledge = knowledge
+        self._subject = subject
+
+    # Pickled and copied as a plain dict, the owner is not a part of the value.
+    def __reduce__(self):
+        return dict, (dict(self),)
+
+    def _set(self, verb, value):
+        if verb in self and not _is_changed(dict.__getitem__(self, verb), value):
+            return False
+        dict.__setitem__(self, verb, value)
+        return True
+
+    def __setitem__(self, verb, value):
+        if self._set(verb, value):
+            self._knowledge.touch(self._subject)
+
+    def update(self, *args, **kwargs):
+        for verb, value in dict(*args, **kwargs).items():
+            self[verb] = value
+
+
 class Knowledge(dict):
     def __init__(self, *args, **kwargs):
-        dict.__init__(self, *args, **kwargs)
+        dict.__init__(self)
+        self.version = 0
+        self.versions = {}
+        self.dirty = set()
+        self.changed = set()
+        for subject, statement in dict(*args, **kwargs).items():
+            self[subject] = statement
+
+    def __reduce__(self):
+        return Knowledge, (dict(self),)
 
     # override
 
+    def __setitem__(self, subject, statement):
+        dict.__setitem__(self, subject, Statement(self, subject, statement))
+        self.touch(subject)
+
+    def touch(self, subject, local=True):
+        self.version += 1
+        self.versions[subject] = self.version
+        self.changed.add(subject)
+        if local:
+            self.dirty.add(subject)
+
+    # Merge statements from others, returns the subjects actually changed.
     def update(self, *args, **kwargs):
-        if args:
-            if len(args) > 1:
-                raise TypeError("update expected at most 1 arguments, "
-                                "got %d" % len(args))
-            other = dict(args[0])
-            for subject in other:
-                if subject in self:
-                    # for nested dict
-                    for verb in other[subject]:
-                        if verb == 'ping':
-                            self[subject][verb] = set(self[subject][verb]) | set(other[subject][verb])
-                        else:
-                            self[subject][verb] = other[subject][verb]
-                else:
-                    self[subject] = other[subject]
-        for subject in kwargs:
+        if len(args) > 1:
+            raise TypeError("update expected at most 1 arguments, "
+                            "got %d" % len(args))
+        other = dict(args[0]) if args else {}
+        other.update(kwargs)
+
+        changed = set()
+        for subject in other:
+            if not isinstance(other[subject], dict):
+                # Not a statement, e.g., from a broken msg
+                continue
             if subject in self:
                 # for nested dict
-                for verb in kwargs[subject]:
+                statement = dict.__getitem__(self, subject)
+                epoch = statement.get('epoch', 0)
+                other_epoch = other[subject].get('epoch', 0)
+                if other_epoch < epoch:
+                    # From before the task was given back, only its end counts.
+                    if other[subject].get('is') == 'Done' and statement._set('is', 'Done'):
+                        changed.add(subject)
+                    continue
+                if other_epoch > epoch:
+                    if statement.get('is') == 'Done':
+                        # Done is terminal, a task given back after it is done is done still.
+                        if statement._set('epoch', other_epoch):
+                            changed.add(subject)
+                        continue
+                    dict.__setitem__(self, subject, Statement(self, subject, other[subject]))
+                    changed.add(subject)
+                    continue
+                for verb in other[subject]:
                     if verb == 'ping':
-                        self[subject][verb] = set(self[subject][verb]) | set(kwargs[subject][verb])
+                        # Compared as sets, [] and set() are the same empty ping list.
+                        pinged = set(statement.get(verb, ()))
+                        value = pinged | set(other[subject][verb])
+                        if value == pinged:
+                            continue
+                    elif verb == 'is' and statement.get(verb) in STATE_ORDER and \
+                            STATE_ORDER.get(other[subject][verb], 0) < STATE_ORDER[statement.get(verb)]:
+                        continue
+                    elif verb == 'lease':
+                        if not _is_newer_lease(statement.get(verb), other[subject][verb]):
+                            continue
+                        value = other[subject][verb]
+                    elif verb == 'bids':
+                        # One bid of every bidder, of its latest round, see allocation.AuctionAllocator
+                        bids = statement.get(verb) or {}
+                        new = dict((bidder, bid) for bidder, bid in other[subject][verb].items()
+                                   if bidder not in bids or bid[2] > bids[bidder][2])
+                        if not new:
+                            continue
+                        value = dict(bids)
+                        value.update(new)
                     else:
-                        self[subject][verb] = kwargs[subject][verb]
+                        value = other[subject][verb]
+                    if statement._set(verb, value):
+                        changed.add(subject)
             else:
-                self[subject] = kwargs[subject]
+                dict.__setitem__(self, subject, Statement(self, subject, other[subject]))
+                changed.add(subject)
+
+        for subject in changed:
+            self.touch(subject, local=False)
+        return changed
+
+    # Returns the subjects changed since the last call.
+    def take_changed(self):
+        changed, self.changed = self.changed, set()
+        return changed
+
+    # Returns the statements changed locally since the last delta() or snapshot().
+    def delta(self):
+        delta = {subject: self[subject] for subject in self.dirty if subject in self}
+        self.dirty = set()
+        return delta
+
+    # Returns the whole knowledge, e.g., for agents joining late.
+    def snapshot(self):
+        self.dirty = set()
+        return dict(self)
 
 """
 class Knowledge(object):
@@ -0,0 +1,258 @@
+#!/usr/bin/python3
+
+"""
+    Class AgentRuntime
+    This runs agents as coroutines of one asyncio event loop instead of threads,
+        - Every agent calls step() each discrete_time_step like the former Agent.run(),
+          but it awaits instead of blocking a thread, so one loop hosts thousands of agents.
+          step() skips the reasoning of agents whose knowledge has not changed.
+        - Agents share the sockets of the runtime, made by zmq.asyncio,
+            one SUB: each msg is received and decoded once, then put in the inbox of every agent
+            one PUB: agents publish on their own names (Communicator.send(sender=...))
+            one DEALER: requests of every agent, acks are routed back by the name of the requester,
+                        the sends of a step are awaited after it
+        - Agents see their inbox and requests through AgentComm and AgentRequests,
+          which look like Communicator and RequestClient, so Agent runs without changes.
+        - tick_stats() tells how long the ticks take and how late agents wake up,
+          see examples/bench_runtime.py.
+"""
+
+import sys
+import time
+import random
+import asyncio
+import logging
+from collections import deque
+
+import zmq
+import zmq.asyncio
+
+sys.path.append('../')
+from utils.communicator import Communicator, RequestClient, request_addrs, default_transport, \
+    _parse_frames, _pack_header, _unpack_header
+from utils.codec import decode_payload
+
+FORMAT = '%(asctime)s %(module)s %(levelname)s %(lineno)d %(message)s'
+logging.basicConfig(level=logging.INFO, format=FORMAT)
+logger = logging.getLogger(__name__)
+
+
+# The communicator of an agent in the runtime
+class AgentComm(object):
+    def __init__(self, runtime, sender):
+        self.runtime = runtime
+        self.sender = str(sender)
+        # Msgs of the shared SUB, (topic, sender, message)
+        self.inbox = deque()
+        self.backlog = 0
+        # Losses are counted once by the shared communicator.
+        self.stats = runtime.comm.stats
+        self.dropped_from = runtime.comm.dropped_from
+
+    def read_all(self, timeout=0, limit=None):
+        # Never waits, the runtime fills the inbox while agents are waiting for their ticks.
+        if limit is None or limit >= len(self.inbox):
+            messages = list(self.inbox)
+            self.inbox.clear()
+        else:
+            messages = [self.inbox.popleft() for i in range(limit)]
+        self.backlog = len(messages)
+        return messages
+
+    def send(self, message, broadcast=False, who=''):
+        self.runtime.comm.send(message, broadcast, who, sender=self.sender)
+
+    def handshake(self, timeout=10.0):
+        # The runtime did it for everyone.
+        return True
+
+    def close(self):
+        self.runtime._inboxes.pop(self.sender, None)
+
+
+# The request channel of an agent in the runtime
+class AgentRequests(RequestClient):
+    def __init__(self, runtime, sender, retry_timeout=1.0, max_retries=5):
+        self.runtime = runtime
+        self.sender = str(sender)
+        self._sender = self.sender.encode('utf-8')
+        self.codec = runtime.comm.codec
+        self.socket = runtime.dealer
+
+        self.retry_timeout = retry_timeout
+        self.max_retries = max_retries
+
+        self._next_id = random.getrandbits(48)
+        self.pending = {}
+        self.stats = {'requested': 0, 'acked': 0, 'retried': 0, 'failed': 0, 'broken': 0}
+        # (id, status) routed by the runtime
+        self._acks = deque()
+        # Sends on the asyncio DEALER return futures, the runtime awaits them after each step.
+        self._sending = deque()
+
+    def _send(self, request_id, message):
+        header = _pack_header(self.codec, request_id, self._sender)
+        self._sending.append(self.socket.send_multipart([header, self.codec.encode(message)], copy=False))
+
+    # Wait until the requests sent so far are queued by zmq, raises their errors.
+    async def flush(self):
+        while self._sending:
+            await self._sending.popleft()
+
+    def poll_acks(self, timeout=0):
+        acks = []
+        while self._acks:
+            acks.extend(self._acked(*self._acks.popleft()))
+        self._retry()
+        return acks
+
+    def close(self):
+        self.runtime._requests.pop(self.sender, None)
+
+
+class AgentRuntime(object):
+    def __init__(self, transport=None, codec=None, rcvhwm=None):
+        self.transport = transport or default_transport
+        # Shadows the shared context, so inproc reaches the broker of this process.
+        self.context = zmq.asyncio.Context.shadow(zmq.Context.instance().underlying)
+        self.comm = Communicator(sender='runtime', codec=codec, transport=self.transport,
+                                 rcvhwm=rcvhwm, context=self.context)
+
+        self.dealer = self.context.socket(zmq.DEALER)
+        self.dealer.setsockopt(zmq.LINGER, 0)
+        self.dealer.connect(request_addrs[self.transport])
+
+        self.agents = []
+        self._inboxes = {}
+        self._requests = {}
+
+        # Duration of step() and lateness of wake-ups of every tick (sec)
+        self.step_times = []
+        self.lateness = []
+
+    # Take the place of Agent.init_comm_agents, after the agent is spawned.
+    def add(self, agent):
+        sender = str(agent.spawn_id)
+        agent.comm_agents = AgentComm(self, sender)
+        agent.comm_core = AgentRequests(self, sender)
+        self._inboxes[sender] = agent.comm_agents.inbox
+        self._requests[sender] = agent.comm_core
+        self.agents.append(agent)
+
+    async def _fan_out(self):
+        subscriber = self.comm.subscriber
+        while True:
+            frames = await subscriber.recv_multipart(copy=False)
+            message = self.comm._decode(self.comm._account(_parse_frames(frames)))
+            if message is None:
+                continue
+            for inbox in self._inboxes.values():
+                inbox.append(message)
+
+    async def _route_acks(self):
+        while True:
+            header, payload = await self.dealer.recv_multipart(copy=False)
+            codec, request_id, sender = _unpack_header(header)
+            requests = self._requests.get(sender)
+            if requests is None:
+                continue
+            try:
+                requests._acks.append((request_id, decode_payload(codec, payload.buffer)))
+            except ValueError as e:
+                # Dropped, the request is sent again.
+                requests.stats['broken'] += 1
+                logger.warning('%s dropped a broken ack: %s' % (sender, e))
+
+    async def _live(self, agent):
+        loop = asyncio.get_running_loop()
+        agent.comm_core.request({'ready': True})
+        await agent.comm_core.flush()
+        # Spread the first ticks, agents would tick all at once otherwise.
+        await asyncio.sleep(agent.discrete_time_step * (hash(agent.comm_agents.sender) % 1000) / 1000)
+        try:
+            deadline = loop.time()
+            while agent.alive:
+                lateness = loop.time() - deadline
+                started = time.perf_counter()
+                agent.step()
+                self.step_times.append(time.perf_counter() - started)
+                self.lateness.append(lateness)
+                await agent.comm_core.flush()
+
+                deadline += agent.discrete_time_step
+                # Do not pile ticks up when overloaded, skip the ones already missed.
+                if deadline < loop.time():
+                    deadline = loop.time()
+                await asyncio.sleep(deadline - loop.time())
+        except Exception:
+            logger.exception('%s %s stopped by an error' % (agent.name, agent.spawn_id))
+            agent.failed = True
+        finally:
+            agent.finish()
+
+    # Run every added agent until they stop, or 'duration' seconds.
+    async def run(self, duration=None):
+        # Once for every agent, they share the subscriber.
+        await self._handshake()
+
+        tasks = [asyncio.ensure_future(self._fan_out()), asyncio.ensure_future(self._route_acks())]
+        lives = [asyncio.ensure_future(self._live(agent)) for agent in self.agents]
+        try:
+            await asyncio.wait(lives, timeout=duration)
+        finally:
+            self.stop()
+            await asyncio.gather(*lives, return_exceptions=True)
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    # Communicator.handshake() on the shared sockets, without blocking the loop.
+    async def _handshake(self, timeout=10.0):
+        loop = asyncio.get_running_loop()
+        comm = self.comm
+        topic = '_hello.%s.%x' % (comm.sender, id(self))
+        comm.subscriber.setsockopt(zmq.SUBSCRIBE, topic.encode('utf-8'))
+        try:
+            deadline = loop.time() + timeout
+            interval = 0.01
+            while loop.time() < deadline:
+                comm._publish(topic, None)
+                end = min(deadline, loop.time() + interval)
+                while end > loop.time():
+                    try:
+                        frames = await asyncio.wait_for(comm.subscriber.recv_multipart(copy=False),
+                                                        end - loop.time())
+                    except asyncio.TimeoutError:
+                        break
+                    message = comm._account(_parse_frames(frames))
+                    if message.topic == topic:
+                        return True
+                    message = comm._decode(message)
+                    if message is None:
+                        continue
+                    for inbox in self._inboxes.values():
+                        inbox.append(message)
+                interval = min(interval * 2, 0.5)
+            logger.warning('runtime could not reach the broker in %s sec' % timeout)
+            return False
+        finally:
+            comm.subscriber.setsockopt(zmq.UNSUBSCRIBE, topic.encode('utf-8'))
+            comm._seq.pop(topic, None)
+
+    def stop(self):
+        for agent in self.agents:
+            agent.stop()
+
+    def close(self):
+        self.comm.close()
+        self.dealer.close()
+
+    # Percentiles of step times and lateness of the ticks so far (sec)
+    def tick_stats(self, percentiles=(50, 90, 99)):
+        stats = {'ticks': len(self.step_times)}
+        for name, samples in (('step', self.step_times), ('late', self.lateness)):
+            samples = sorted(samples)
+            for p in percentiles:
+                stats['%s_p%d' % (name, p)] = samples[min(len(samples) - 1, len(samples) * p // 100)] \
+                    if samples else 0.0
+        return stats
@@ -9,7 +9,6 @@ from utils.communicator import Communicator
 from threading import Thread
 
 import datetime
-import time
 
 datetime_format = '%Y-%m-%d %H:%M:%S.%f'
 
@@ -28,10 +27,11 @@ class GorasLogging(Thread):
 
     def run(self):
         while self.is_alive:
-            message = self.listener.read()
-            if message == '':
-                time.sleep(0.1)
+            # Wait in the poller, wake up at least every 0.1 sec to check is_alive.
+            received = self.listener.read(timeout=0.1)
+            if received is None:
                 continue
+            message = '%s %s %s' % received
             log_message = '{}\t{}\t\r\n'.format(datetime.datetime.now().isoformat(timespec='microseconds'), message)
             # Where to store?
             self.log_file.write(log_message)
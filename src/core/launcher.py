@@ -0,0 +1,121 @@
+#!/usr/bin/python3
+
+"""
+    Class AgentLauncher
+    This runs agents in separate OS processes instead of threads of the core,
+        - Reasoning of agents in one process serialises on the GIL, agents in
+          other processes run on other cores.
+        - Agents only talk through ZeroMQ, so they need a transport between processes
+          ('tcp' or 'ipc'), the core's proxy and request server must listen on it.
+        - Agents are grouped, 'group_size' agents run as threads of one worker process.
+        - Only picklable things cross the process boundary: the spawn id, the unit id,
+          the initial knowledge as plain dicts and the goal description, the goal is
+          compiled into a GoalTemplate once in the worker and shared by its agents.
+        - shutdown() stops every worker and returns their exit status,
+          0 when every agent of the group stopped cleanly.
+"""
+
+import sys
+import logging
+import multiprocessing
+
+sys.path.append('../agent')
+
+FORMAT = '%(asctime)s %(module)s %(levelname)s %(lineno)d %(message)s'
+logging.basicConfig(level=logging.INFO, format=FORMAT)
+logger = logging.getLogger(__name__)
+
+# Exit status of a worker
+EXIT_OK = 0
+EXIT_AGENT_FAILED = 1
+
+
+# Runs in the worker process.
+def _run_group(specs, transport, stop_event, allocation):
+    # Imported here, a worker builds its agents from scratch.
+    from agent import Agent
+    from goal import GoalTemplate
+
+    agents = []
+    # Agents of a group share the templates of their goals.
+    templates = {}
+    for spawn_id, unit_id, initial_knowledge, goal_description in specs:
+        template = templates.get(id(goal_description))
+        if template is None:
+            template = templates[id(goal_description)] = GoalTemplate(goal_description)
+        agent = Agent(transport=transport, allocation=allocation)
+        agent.spawn(spawn_id, unit_id,
+                    initial_knowledge=initial_knowledge,
+                    initial_goals=[template.instantiate()])
+        agent.start()
+        agents.append(agent)
+
+    # Until the launcher asks to stop, or every agent stops by itself.
+    while not stop_event.wait(0.5):
+        if not any(agent.is_alive() for agent in agents):
+            break
+
+    # Stop them all first, each joins in the time of the slowest instead of the sum.
+    for agent in agents:
+        agent.stop()
+    for agent in agents:
+        agent.join()
+
+    failed = [agent.spawn_id for agent in agents if agent.failed]
+    if failed:
+        logger.error('Agents %s failed' % failed)
+        sys.exit(EXIT_AGENT_FAILED)
+    sys.exit(EXIT_OK)
+
+
+class AgentLauncher(object):
+    def __init__(self, transport='tcp', group_size=1, start_method='spawn', allocation='ping'):
+        assert transport in ('tcp', 'ipc'), 'agents in other processes cannot use %s' % transport
+
+        self.transport = transport
+        self.group_size = group_size
+        self.allocation = allocation
+        self.context = multiprocessing.get_context(start_method)
+        self.stop_event = self.context.Event()
+
+        # Agents waiting to fill a group
+        self._pending = []
+        self.processes = []
+
+    # Queue an agent, a worker starts when its group is full or at flush().
+    def launch(self, spawn_id, unit_id, initial_knowledge, goal_description):
+        knowledge = dict((subject, dict(statement)) for subject, statement in initial_knowledge.items())
+        self._pending.append((spawn_id, unit_id, knowledge, goal_description))
+        if len(self._pending) >= self.group_size:
+            self.flush()
+
+    # Start a worker with the queued agents.
+    def flush(self):
+        if not self._pending:
+            return
+        specs, self._pending = self._pending, []
+
+        name = 'agents-%s' % '-'.join(str(spec[0]) for spec in specs)
+        process = self.context.Process(target=_run_group, name=name,
+                                       args=(specs, self.transport, self.stop_event, self.allocation))
+        process.start()
+        self.processes.append(process)
+        logger.info('%s is started, pid %d' % (name, process.pid))
+
+    # Stop every worker, returns {name: exit status}.
+    def shutdown(self, timeout=10.0):
+        self._pending = []
+        self.stop_event.set()
+
+        status = {}
+        for process in self.processes:
+            process.join(timeout)
+            if process.is_alive():
+                logger.warning('%s does not stop, terminating' % process.name)
+                process.terminate()
+                process.join()
+            status[process.name] = process.exitcode
+            if process.exitcode != EXIT_OK:
+                logger.error('%s exited with %s' % (process.name, process.exitcode))
+        self.processes = []
+        return status
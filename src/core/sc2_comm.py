@@ -4,6 +4,7 @@
     This is a module that supports communication with Starcraft II API.
 """
 
+import time
 import logging
 import websocket
 
@@ -21,13 +22,22 @@ class sc2(object):
 
         # self.log=open("log.txt","w")
 
-    def open(self, address='127.0.0.1', port=5000):
-        try:
-            self.conn = websocket.create_connection("ws://%s:%s/sc2api" % (address, port), timeout=60)
-            self.is_connected = self.conn
-            logger.info('sc2 is connected.')
-        except Exception as ex:
-            logger.error('While connecting to sc2: %s' % (str(ex)))
+    # Retry to connect with backoff until sc2 answers or 'wait' seconds pass.
+    def open(self, address='127.0.0.1', port=5000, wait=60):
+        deadline = time.time() + wait
+        interval = 0.1
+        while True:
+            try:
+                self.conn = websocket.create_connection("ws://%s:%s/sc2api" % (address, port), timeout=60)
+                self.is_connected = self.conn
+                logger.info('sc2 is connected.')
+                return True
+            except Exception as ex:
+                if time.time() + interval > deadline:
+                    logger.error('While connecting to sc2: %s' % (str(ex)))
+                    return False
+            time.sleep(interval)
+            interval = min(interval * 2, 2.0)
 
     def close(self):
         if self.is_connected:
@@ -0,0 +1,210 @@
+#!/usr/bin/python3
+
+"""
+    Benchmark of the task allocation (agent.allocation) of a pylon plan (agent.goal_generator)
+    N agents run as threads against a small simulated core, once with each allocator, and report,
+        - time: until every pylon of the plan is built
+        - tasks/min: General tasks of the plan done per minute
+        - claim: mean time from the first look at a task to taking it, for 'rendezvous'
+          it is the warmup of the agents only
+        - actions: actions performed by the core, more than the General tasks when a task is
+          taken twice, and the requests carrying them (see Agent.batch_size)
+        - msgs: broadcasts of the agents
+        - expired: leases expired by the agent who saw it first, and tasks taken again after
+          an expiry (see allocation.Leases)
+    Each allocator runs again with one agent stuck after its first action.
+    Then each allocator runs with BATCH_AGENTS agents taking one or batch_size tasks a tick, with
+    the core ticking at each of BATCH_TICKS.
+    Last, each allocator runs PLAN_AGENTS agents on a plan of two branches, with its branches worked
+    on one after another (sequential) and at the same time as far as the pylons counted allow.
+    In both, the gathers of a pylon wait for the pylon built before it.
+    The simulated core adds GATHERED minerals for every gather and builds a pylon for 100 of them,
+    and broadcasts them every TICK like the core. Like a unit, it performs no command queued after
+    a gather. It does not need SC2.
+    An agent keeps working on its leaf goal until the minerals are checked, it takes the next tasks
+    of the leaf when the core has acked its request. A request carries one gather at most.
+    Usage: python3 bench_allocation.py [N ...]
+"""
+
+import sys
+import json
+import time
+import logging
+import threading
+
+sys.path.append('../')
+sys.path.append('../agent')
+from utils.communicator import Communicator, RequestServer, proxy
+from agent import Agent
+from goal import GoalTemplate
+from goal_generator import PylonPlan
+from allocation import ALLOCATORS
+
+TRANSPORT = 'inproc'
+TIMEOUT = 60.0  # sec
+TICK = 0.1  # sec
+GATHERED = 25
+AGENT_COUNTS = (8, 16)
+BATCH_AGENTS = 2
+BATCH_SIZES = (1, 4)
+BATCH_TICKS = (0.1, 0.5)  # sec
+PLAN_AGENTS = 4
+
+MINERALS = {1: (20, 40, 0), 2: (40, 45, 0), 3: (25, 25, 0)}
+
+
+class StuckAgent(Agent):
+    # Stalls after its first action, like a probe stuck on the map
+    def act(self, action, task):
+        performed = Agent.act(self, action, task)
+        if task.type == 'General':
+            self.stall()
+        return performed
+
+    def act_batch(self, selected):
+        Agent.act_batch(self, selected)
+        self.stall()
+
+    def stall(self):
+        while self.alive:
+            time.sleep(0.01)
+
+
+class SimCore(object):
+    def __init__(self, probes, tick=TICK, transport=TRANSPORT):
+        self.tick = tick
+        self.comm = Communicator(sender='core', transport=transport)
+        self.comm.handshake()
+        self.server = RequestServer(listen=(transport,))
+        self.probes = probes
+        self.minerals = 0
+        self.pylons = 0
+        self.actions = 0
+        self.requests = 0
+
+    # Unit commands of a request are performed in order, like a queue of the unit.
+    # A gather does not end, the commands queued after it are never performed.
+    def perform(self, action):
+        self.requests += 1
+        for raw in json.loads(action)['actions']:
+            command = raw['actionRaw']['unitCommand']
+            self.actions += 1
+            if 'targetUnitTag' in command:
+                self.minerals += GATHERED
+                break
+            elif 'targetWorldSpacePos' in command and self.minerals >= 100:
+                self.minerals -= 100
+                self.pylons += 1
+
+    def run(self, stop):
+        while not stop.is_set():
+            deadline = time.time() + self.tick
+            self.comm.send({'minerals': {'gathered': str(self.minerals), 'are': list(MINERALS.items())},
+                            'pylons': {'built': str(self.pylons)},
+                            'probes': {'are': list(self.probes.items())}}, broadcast=True)
+            while time.time() < deadline:
+                for request in self.server.recv_all(timeout=max(deadline - time.time(), 0)):
+                    if 'action' in request.message:
+                        self.perform(request.message['action'])
+                    self.server.ack(request, True)
+
+    def close(self):
+        self.comm.close()
+        self.server.close()
+
+
+def bench(allocation, num_agents, plan, first_id, stuck=False, batch_size=4, tick=TICK, timeout=TIMEOUT,
+          transport=TRANSPORT):
+    template = GoalTemplate(plan.description())
+    general = sum(1 for task_type in template.task_types if task_type == 'General')
+    probes = dict((first_id + i, (20 + 3 * i, 30 + 2 * i, 0)) for i in range(num_agents))
+
+    core = SimCore(probes, tick, transport)
+    stop = threading.Event()
+    thread = threading.Thread(target=core.run, args=(stop,), daemon=True)
+    thread.start()
+
+    agents = []
+    for spawn_id in probes:
+        if stuck and spawn_id == first_id:
+            agent = StuckAgent(transport=transport, allocation=allocation, batch_size=batch_size)
+        else:
+            agent = Agent(transport=transport, allocation=allocation, batch_size=batch_size)
+        agent.spawn(spawn_id, 84, initial_knowledge=dict(plan.initial_knowledge()),
+                    initial_goals=[template.instantiate()])
+        agents.append(agent)
+
+    start = time.time()
+    for agent in agents:
+        agent.start()
+    while core.pylons < len(plan) and time.time() - start < timeout:
+        time.sleep(0.01)
+    elapsed = time.time() - start
+
+    for agent in agents:
+        agent.stop()
+    for agent in agents:
+        agent.join()
+    stop.set()
+    thread.join()
+    core.close()
+
+    claims = sum(agent.allocator.stats['claims'] for agent in agents)
+    claim_time = sum(agent.allocator.stats['claim_time'] for agent in agents)
+    msgs = sum(agent.comm_agents.stats['sent'] for agent in agents)
+    # Every agent expires a lease on its own, count it once.
+    expired = max(agent.allocator.leases.stats['expired'] for agent in agents)
+    reclaimed = sum(agent.allocator.leases.stats['reclaimed'] for agent in agents)
+    return {'done': core.pylons >= len(plan), 'time': elapsed, 'tasks': general / elapsed * 60,
+            'claim': claim_time / claims if claims else 0.0, 'actions': core.actions, 'general': general,
+            'requests': core.requests,
+            'msgs': msgs, 'expired': expired, 'reclaimed': reclaimed}
+
+
+if __name__ == '__main__':
+    # Logs of every tick would be the bottleneck.
+    logging.getLogger().setLevel(logging.WARNING)
+
+    counts = [int(n) for n in sys.argv[1:]] or AGENT_COUNTS
+    plan = PylonPlan(branches=1, depth=10, mineral=1)
+
+    threading.Thread(target=proxy, args=((TRANSPORT,),), daemon=True).start()
+
+    print('%8s %10s %6s %8s %10s %10s %12s %8s %8s %10s' %
+          ('agents', 'alloc', 'stuck', 'time', 'tasks/min', 'claim', 'actions', 'requests', 'msgs', 'expired'))
+    first_id = 1000
+    for num_agents in counts:
+        for allocation in sorted(ALLOCATORS):
+            for stuck in (False, True):
+                stats = bench(allocation, num_agents, plan, first_id, stuck)
+                first_id += num_agents
+                print('%8d %10s %6s %7.2fs%s %10.1f %8.1fms %6d / %3d %8d %8d %5d / %2d' %
+                      (num_agents, allocation, 'yes' if stuck else 'no', stats['time'], ' ' if stats['done'] else '!',
+                       stats['tasks'], stats['claim'] * 1e3, stats['actions'], stats['general'], stats['requests'],
+                       stats['msgs'], stats['expired'], stats['reclaimed']))
+
+    # Fewer agents than the gathers of a pylon, a plan not done in time is stuck.
+    print()
+    print('%8s %10s %6s %8s %8s %10s %12s %8s' %
+          ('agents', 'alloc', 'batch', 'tick', 'time', 'tasks/min', 'actions', 'requests'))
+    for allocation in sorted(ALLOCATORS):
+        for tick in BATCH_TICKS:
+            for batch_size in BATCH_SIZES:
+                stats = bench(allocation, BATCH_AGENTS, plan, first_id, batch_size=batch_size, tick=tick,
+                              timeout=4 * len(plan) * tick + 5.0)
+                first_id += BATCH_AGENTS
+                print('%8d %10s %6d %7.1fs %7.2fs%s %10.1f %6d / %3d %8d' %
+                      (BATCH_AGENTS, allocation, batch_size, tick, stats['time'], ' ' if stats['done'] else '!',
+                       stats['tasks'], stats['actions'], stats['general'], stats['requests']))
+
+    # Independent leaves of the goal tree at once, see goal.Goal.get_available_goals_and_tasks()
+    print()
+    print('%8s %10s %10s %8s %10s %12s %8s' % ('agents', 'alloc', 'branches', 'time', 'tasks/min', 'actions', 'requests'))
+    for allocation in sorted(ALLOCATORS):
+        for sequential in (True, False):
+            branched = PylonPlan(branches=2, depth=5, mineral=1, sequential=sequential)
+            stats = bench(allocation, PLAN_AGENTS, branched, first_id)
+            first_id += PLAN_AGENTS
+            print('%8d %10s %10s %7.2fs%s %10.1f %6d / %3d %8d' %
+                  (PLAN_AGENTS, allocation, 'sequential' if sequential else 'parallel', stats['time'],
+                   ' ' if stats['done'] else '!', stats['tasks'], stats['actions'], stats['general'], stats['requests']))
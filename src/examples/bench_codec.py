@@ -0,0 +1,65 @@
+#!/usr/bin/python3
+
+"""
+    Benchmark of msg codecs
+    This compares the codecs in utils.codec with a knowledge like the one agents broadcast,
+        - size of an encoded msg
+        - time to encode and decode a msg
+    It does not need the broker nor SC2.
+"""
+
+import sys
+import time
+import random
+
+sys.path.append('../')
+from utils.codec import get_codec, encode_message, decode_message
+
+NUM_LOOP = 200
+NUM_GATHER = 80
+NUM_PYLON = 20
+NUM_AGENT = 12
+
+
+def make_knowledge():
+    # Looks like the initial knowledge of the core in the middle of a simulation.
+    knowledge = {'I have GG Pylon': {'is': 'Not Assigned'}}
+    probes = [random.getrandbits(32) for i in range(NUM_AGENT)]
+    for i in range(1, NUM_PYLON + 1):
+        knowledge['I have pylon %d' % i] = {'is': 'Not Assigned'}
+        knowledge['gather 100 minerals %d' % i] = {'is': 'Not Assigned'}
+        knowledge['build_pylon %d' % i] = {'is': 'Ready'}
+        knowledge['built pylon %d' % i] = {'is': 'Ready'}
+        knowledge['check mineral %d' % i] = {'is': 'Ready'}
+    for i in range(1, NUM_GATHER + 1):
+        knowledge['gather %d' % i] = {'is': 'Ping', 'ping': set(random.sample(probes, 3))}
+    knowledge['minerals'] = {'gathered': '350',
+                             'are': [(random.getrandbits(32), (30.5, 33.5, 11.9)) for i in range(8)]}
+    return knowledge
+
+
+def bench(codec_name, knowledge):
+    codec = get_codec(codec_name)
+
+    start = time.perf_counter()
+    for i in range(NUM_LOOP):
+        data = encode_message(knowledge, codec)
+    encode_time = (time.perf_counter() - start) / NUM_LOOP
+
+    start = time.perf_counter()
+    for i in range(NUM_LOOP):
+        decoded = decode_message(data)
+    decode_time = (time.perf_counter() - start) / NUM_LOOP
+
+    # json sends the ping sets as lists
+    assert set(decoded['gather 1']['ping']) == knowledge['gather 1']['ping']
+    return len(data), encode_time, decode_time
+
+
+if __name__ == '__main__':
+    knowledge = make_knowledge()
+    print('%d subjects, %d loops' % (len(knowledge), NUM_LOOP))
+    print('%-8s %10s %12s %12s' % ('codec', 'bytes', 'encode(us)', 'decode(us)'))
+    for codec_name in ('json', 'binary'):
+        size, encode_time, decode_time = bench(codec_name, knowledge)
+        print('%-8s %10d %12.1f %12.1f' % (codec_name, size, encode_time * 1e6, decode_time * 1e6))
@@ -0,0 +1,170 @@
+#!/usr/bin/python3
+
+"""
+    Benchmark of goal achievement checks
+    This generates goal trees of thousands of tasks and finishes their tasks one by one in random order,
+    checking achievement after each like an agent does every tick,
+        - full: the former check, can_be_achieved() walks the subtree of the root and of every subgoal
+        - incremental: Goal.refresh_achieved(), only the paths from changed tasks to the root
+    and updates the goal tree from the knowledge after each,
+        - full: the former Agent.update_goal_tree(), visits every node
+        - delta: Goal.apply_knowledge_delta() with the changed subjects only
+    and finds the next leaf goal to work on, as the plan progresses,
+        - walk: the former lookup, down the first open subgoals from the root
+        - frontier: the first goal of the frontier kept by the root
+    It does not need the broker nor SC2.
+    Usage: python3 bench_goal.py
+"""
+
+import sys
+import time
+import random
+
+sys.path.append('../')
+sys.path.append('../agent')
+from goal import create_goal_set
+from knowledge_base import Knowledge
+from goal_generator import PylonPlan
+
+# (depth of the chain of goals, subgoals of each goal besides the chain, tasks of each goal)
+SHAPES = ((10, 0, 7), (10, 3, 8), (50, 0, 20), (200, 0, 10), (20, 5, 30))
+
+
+def make_description(depth, branches, tasks, prefix='g'):
+    description = {'goal': prefix, 'trigger': [], 'satisfy': [], 'precedent': [], 'require': []}
+    for i in range(tasks):
+        description['require'].append(['%s task %d' % (prefix, i), {'target': 'unit'}, 'General'])
+    for i in range(branches):
+        description['require'].append(make_description(0, 0, tasks, '%s.%d' % (prefix, i)))
+    if depth > 1:
+        description['require'].append(make_description(depth - 1, branches, tasks, prefix + '.c'))
+    return description
+
+
+def all_tasks(goal):
+    tasks = list(goal.tasks)
+    for subgoal in goal.subgoals:
+        tasks.extend(all_tasks(subgoal))
+    return tasks
+
+
+# The former can_be_achieved(), walks the whole subtree every time.
+def walk_achieved(goal):
+    for subgoal in goal.subgoals:
+        if not walk_achieved(subgoal):
+            return False
+    for task in goal.tasks:
+        if task.state != 'Done':
+            return False
+    return True
+
+
+# The former Agent.check_goal_achieved()
+def full_check(goal, achieved):
+    if walk_achieved(goal):
+        achieved.add(goal.name)
+    for subgoal in goal.subgoals:
+        if walk_achieved(subgoal):
+            achieved.add(subgoal.name)
+            full_check(subgoal, achieved)
+
+
+def bench(shape, check):
+    root = create_goal_set(make_description(*shape))
+    tasks = all_tasks(root)
+    random.Random(0).shuffle(tasks)
+
+    achieved = set()
+    start = time.perf_counter()
+    for task in tasks:
+        task.state = 'Done'
+        if check == 'full':
+            full_check(root, achieved)
+        else:
+            achieved.update(goal.name for goal in root.refresh_achieved())
+    return len(tasks), time.perf_counter() - start, achieved
+
+
+# The former Agent.update_goal_tree()
+def full_update(knowledge, goal):
+    if goal.name in knowledge:
+        if goal.goal_state != 'achieved':
+            goal.goal_state = knowledge[goal.name]['is']
+    for subgoal in goal.subgoals:
+        full_update(knowledge, subgoal)
+    for task in goal.tasks:
+        if task.__name__ in knowledge:
+            task.state = knowledge[task.__name__]['is']
+
+
+def bench_update(shape, update):
+    root = create_goal_set(make_description(*shape))
+    tasks = all_tasks(root)
+    random.Random(0).shuffle(tasks)
+
+    knowledge = Knowledge((task.__name__, {'is': 'Ready'}) for task in tasks)
+    root.apply_knowledge_delta(knowledge, knowledge.take_changed())
+
+    start = time.perf_counter()
+    for task in tasks:
+        knowledge[task.__name__]['is'] = 'Done'
+        if update == 'full':
+            full_update(knowledge, root)
+        else:
+            root.apply_knowledge_delta(knowledge, knowledge.take_changed())
+    assert all(task.state == 'Done' for task in tasks)
+    return len(tasks), time.perf_counter() - start
+
+
+# Plans of (branches, pylons a branch)
+PLANS = ((2, 10), (20, 10), (200, 10), (2, 100))
+
+
+# Works the leaf found every time until the root is achieved, returns the lookups and their time.
+def bench_leaf(plan, lookup):
+    root = create_goal_set(plan.description())
+    root.refresh_achieved()
+    lookups = 0
+    elapsed = 0.0
+    while not root.is_achieved():
+        start = time.perf_counter()
+        if lookup == 'walk':
+            leaf_goal, tasks = root._get_leaf_goal_and_tasks()
+        else:
+            leaf_goal, tasks = root.get_available_goal_and_tasks()
+        elapsed += time.perf_counter() - start
+        lookups += 1
+        for task in tasks:
+            task.state = 'Done'
+        root.refresh_achieved()
+    return lookups, elapsed
+
+
+if __name__ == '__main__':
+    print('Achievement checks')
+    print('%-14s %7s %12s %12s %9s' % ('shape', 'tasks', 'full(ms)', 'incr(ms)', 'speedup'))
+    for shape in SHAPES:
+        num_tasks, full_time, full_achieved = bench(shape, 'full')
+        num_tasks, incr_time, incr_achieved = bench(shape, 'incremental')
+        # Both find every goal in the end.
+        assert full_achieved == incr_achieved
+        print('%-14s %7d %12.1f %12.1f %8.1fx' %
+              ('%d/%d/%d' % shape, num_tasks, full_time * 1e3, incr_time * 1e3, full_time / incr_time))
+
+    print('Goal tree updates')
+    print('%-14s %7s %12s %12s %9s' % ('shape', 'tasks', 'full(ms)', 'delta(ms)', 'speedup'))
+    for shape in SHAPES:
+        num_tasks, full_time = bench_update(shape, 'full')
+        num_tasks, delta_time = bench_update(shape, 'delta')
+        print('%-14s %7d %12.1f %12.1f %8.1fx' %
+              ('%d/%d/%d' % shape, num_tasks, full_time * 1e3, delta_time * 1e3, full_time / delta_time))
+
+    print('Leaf lookups')
+    print('%-14s %7s %12s %12s %9s' % ('plan', 'lookups', 'walk(us)', 'front(us)', 'speedup'))
+    for branches, depth in PLANS:
+        plan = PylonPlan(branches=branches, depth=depth)
+        lookups, walk_time = bench_leaf(plan, 'walk')
+        lookups, frontier_time = bench_leaf(plan, 'frontier')
+        print('%-14s %7d %12.1f %12.1f %8.1fx' %
+              ('%d/%d' % (branches, depth), lookups, walk_time / lookups * 1e6, frontier_time / lookups * 1e6,
+               walk_time / frontier_time))
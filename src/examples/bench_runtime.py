@@ -0,0 +1,81 @@
+#!/usr/bin/python3
+
+"""
+    Stress benchmark of agent.runtime
+    This runs N agents as coroutines of one event loop for a while and reports the tick latency,
+        - step: time of one Agent.step() (perceive, reason, act, tell)
+        - late: how late an agent wakes up for its tick, it grows when the loop is overloaded
+    The broker and a core acknowledging every request run in threads, it does not need SC2.
+    Usage: python3 bench_runtime.py [duration] [N ...]
+"""
+
+import sys
+import time
+import asyncio
+import logging
+import threading
+
+sys.path.append('../')
+sys.path.append('../agent')
+from utils.communicator import proxy, RequestServer
+from agent import Agent
+from runtime import AgentRuntime
+
+TRANSPORT = 'inproc'
+DURATION = 10.0  # sec
+AGENT_COUNTS = (10, 100, 500, 1000, 2000)
+
+GOAL = {'goal': 'gather 100 minerals',
+        'trigger': [],
+        'satisfy': [],
+        'precedent': [],
+        'require': [
+            ['move', {'target': 'point', 'pos_x': 10, 'pos_y': 10}, 'General'],
+            ['gather', {'target': 'unit', 'unit_tag': 0}, 'General'],
+        ]}
+KNOWLEDGE = {'gather 100 minerals': {'is': 'Not Assigned'},
+             'move': {'is': 'Ready'},
+             'gather': {'is': 'Ready'}}
+
+
+def fake_core(server, stop):
+    while not stop.is_set():
+        for request in server.recv_all(timeout=0.1):
+            server.ack(request, True)
+
+
+def bench(num_agents, duration):
+    from goal import GoalTemplate
+
+    template = GoalTemplate(GOAL)
+    runtime = AgentRuntime(transport=TRANSPORT)
+    for i in range(num_agents):
+        agent = Agent(transport=TRANSPORT)
+        agent.spawn(1000 + i, 84, initial_knowledge=KNOWLEDGE, initial_goals=[template.instantiate()])
+        runtime.add(agent)
+
+    asyncio.run(runtime.run(duration))
+    runtime.close()
+    return runtime.tick_stats()
+
+
+if __name__ == '__main__':
+    # Logs of every tick would be the bottleneck.
+    logging.getLogger().setLevel(logging.WARNING)
+
+    duration = float(sys.argv[1]) if len(sys.argv) > 1 else DURATION
+    counts = [int(n) for n in sys.argv[2:]] or AGENT_COUNTS
+
+    threading.Thread(target=proxy, args=((TRANSPORT,),), daemon=True).start()
+    server = RequestServer(listen=(TRANSPORT,))
+    stop = threading.Event()
+    threading.Thread(target=fake_core, args=(server, stop), daemon=True).start()
+
+    print('%8s %8s %10s %10s %10s %10s %10s' %
+          ('agents', 'ticks', 'step p50', 'step p99', 'late p50', 'late p90', 'late p99'))
+    for num_agents in counts:
+        stats = bench(num_agents, duration)
+        print('%8d %8d %9.2fms %9.2fms %9.2fms %9.2fms %9.2fms' %
+              (num_agents, stats['ticks'], stats['step_p50'] * 1e3, stats['step_p99'] * 1e3,
+               stats['late_p50'] * 1e3, stats['late_p90'] * 1e3, stats['late_p99'] * 1e3))
+    stop.set()
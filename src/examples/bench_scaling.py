@@ -0,0 +1,100 @@
+#!/usr/bin/python3
+
+"""
+    Scaling benchmark of the goal machinery on generated pylon plans (agent.goal_generator)
+    This makes the plan of the game 1, 10 and 100 times larger, wider (more branches) or deeper
+    (longer chains of pylons), and reports for each,
+        - file: time to write the goal file and to load it, cold and from the cache,
+          '-' for chains too deep for the json module
+        - compile: time to compile the streamed nodes into a GoalTemplate, without a description
+        - agent: memory of an agent's view and time to finish every task like an agent does,
+          through knowledge deltas and incremental achievement, per task
+    It does not need the broker nor SC2.
+    Usage: python3 bench_scaling.py [scale ...]
+"""
+
+import os
+import sys
+import time
+import random
+import shutil
+import tempfile
+import tracemalloc
+
+sys.path.append('../')
+sys.path.append('../agent')
+from goal import GoalTemplate
+from goal_loader import load_goal
+from goal_generator import PylonPlan
+from knowledge_base import Knowledge
+
+SCALES = (1, 10, 100)
+
+
+def plans(scale):
+    yield 'wide', PylonPlan(branches=2 * scale, depth=10)
+    yield 'deep', PylonPlan(branches=2, depth=10 * scale)
+
+
+def bench_file(plan, directory):
+    path = os.path.join(directory, 'plan.json')
+    start = time.perf_counter()
+    with open(path, 'w') as f:
+        plan.write_json(f)
+    write_time = time.perf_counter() - start
+
+    params = {'minerals': [0]}
+    start = time.perf_counter()
+    try:
+        load_goal(path, params)
+    except RecursionError:
+        # Too deep for the json and pickle modules, the nodes stream still compiles it.
+        return write_time, None, None
+    cold_time = time.perf_counter() - start
+    start = time.perf_counter()
+    load_goal(path, params)
+    warm_time = time.perf_counter() - start
+    return write_time, cold_time, warm_time
+
+
+def bench_agent(template, plan):
+    tracemalloc.start()
+    root = template.instantiate()
+    knowledge = Knowledge(plan.initial_knowledge())
+    root.apply_knowledge_delta(knowledge, knowledge.take_changed())
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    tasks = list(template.task_names)
+    random.Random(0).shuffle(tasks)
+    start = time.perf_counter()
+    for name in tasks:
+        knowledge[name]['is'] = 'Done'
+        root.apply_knowledge_delta(knowledge, knowledge.take_changed())
+        root.refresh_achieved()
+    assert root.is_achieved()
+    return size, (time.perf_counter() - start) / len(tasks)
+
+
+if __name__ == '__main__':
+    scales = [int(n) for n in sys.argv[1:]] or SCALES
+    directory = tempfile.mkdtemp()
+
+    print('%6s %5s %7s %8s %10s %10s %10s %10s %10s %10s' %
+          ('scale', 'shape', 'pylons', 'nodes', 'write', 'cold', 'cached', 'compile', 'agent', 'per task'))
+    try:
+        for scale in scales:
+            for shape, plan in plans(scale):
+                write_time, cold_time, warm_time = bench_file(plan, directory)
+
+                start = time.perf_counter()
+                template = GoalTemplate.from_nodes(plan.nodes())
+                compile_time = time.perf_counter() - start
+
+                size, task_time = bench_agent(template, plan)
+                load_times = ['%8.1fms' % (t * 1e3) if t is not None else '%10s' % '-' for t in (cold_time, warm_time)]
+                print('%5dx %5s %7d %8d %8.1fms %s %s %8.1fms %9.1fK %8.1fus' %
+                      (scale, shape, len(plan), len(template), write_time * 1e3, load_times[0], load_times[1],
+                       compile_time * 1e3, size / 1e3, task_time * 1e6))
+    finally:
+        shutil.rmtree(directory)
@@ -31,10 +31,15 @@ logger = logging.getLogger(__name__)
 
 TEST_NUM=1
 SLEEP_TIME=1.0 #if SLEEP_TIME is zero, it means random.
+TRANSPORT='tcp' #'inproc' keeps all msgs in this process.
+HWM=None #high water mark of the queues, None means the zmq default(1000).
 
 count_dummy=3
 total_msg=10
 recv_msg=0
+dropped_msg=0
+# Released when every dummy has done its handshake
+ready=None
 
 class DummyThread(threading.Thread):
     def __init__(self, name, counter,core=False):
@@ -44,13 +49,16 @@ class DummyThread(threading.Thread):
         self.threadID = counter
         self.name = name
         self.who=Dummy(self.name)
-        self.who.init_comm_agents(core)
+        self.who.init_comm_agents()
 
         logging.info(self.name+' is Initialzied')
 
     def run(self):
 
         logging.info(self.name+' is started to run')
+        # Wait until every dummy can hear the others, instead of sleeping.
+        self.who.comm_agents.handshake()
+        ready.wait()
         cnt = 1
         wordorg="HI"
         while True:
@@ -86,15 +94,16 @@ class Dummy(object):
         self.file_sent=open(self.filename_sent,'w')
         self.file_recv=open(self.filename_recv,'w')
 
-    def init_comm_agents(self,core=False):
-        self.comm_agents = Communicator(core)
+    def init_comm_agents(self):
+        self.comm_agents = Communicator(sender=self.name, transport=TRANSPORT, sndhwm=HWM, rcvhwm=HWM)
 
     def deinit_comm_agents(self):
         self.comm_agents.close()
 
     def perceive(self):
-        message = self.comm_agents.read()
-        if message:
+        received = self.comm_agents.read()
+        if received is not None:
+            topic, sender, message = received
             t=datetime.now()
             print("Got message / Got Time: "+str(t)+" From\t" + message,file=self.file_recv)
             idx=''.join(x for x in message.split('/')[0] if x.isdigit())
@@ -107,15 +116,18 @@ class Dummy(object):
         print(self.name+"\tis telling to everyone "+msg,file=self.file_sent)
         for i in range(count_dummy):
             self.count_sent[i]+=1
-        self.comm_agents.send(msg)
+        self.comm_agents.send(msg, broadcast=True)
 
     def print_res(self):
-        global recv_msg
+        global recv_msg, dropped_msg
         print(self.name)
         for i in range(count_dummy):
             print('\t'+self.name+' sent msg to \t\t%5d #: %d'%(i+1,self.count_sent[i]))
             print('\t'+self.name+' recv msg from \t%5d #: %d'%(i+1,self.count_recv[i]))
             recv_msg+=self.count_recv[i]
+        # Counted by the communicator from the sequence numbers
+        print('\t'+self.name+' stats %s, dropped from %s'%(self.comm_agents.stats,self.comm_agents.dropped_from))
+        dropped_msg+=self.comm_agents.stats['dropped']
         self.file_sent.close()
         self.file_recv.close()
 
@@ -137,7 +149,7 @@ if __name__ == '__main__':
     start_time=time.time()
     threads=[]
 
-    proxy_thread = threading.Thread(target=proxy)
+    proxy_thread = threading.Thread(target=proxy, args=((TRANSPORT,),))
 
     based_name='dummy'
     counter=1
@@ -150,13 +162,10 @@ if __name__ == '__main__':
     name=based_name+'core3'
     threads.append(DummyThread(name,counter,core=True))
 
-    # Wait for thread initialization
-    time.sleep(1)
+    ready = threading.Barrier(len(threads))
 
     proxy_thread.start()
 
-    time.sleep(1) # wait for turn on proxy
-
     # Start all threads
     for thread in threads:
         thread.start()
@@ -170,6 +179,8 @@ if __name__ == '__main__':
     print("Execution Time : %s seconds"%(execution_time))
 
     value_dict['recvmsg#']=recv_msg
+    value_dict['droppedmsg#']=dropped_msg
+    print("Dropped # : %d"%dropped_msg)
     print("Received # : %d"%recv_msg)
 
     if RECORD_TEST==True:
@@ -6,15 +6,46 @@
         - Using ZeroMQ to connect, especially using PUB/SUB method.
         - Our Communicator model uses one Brocker intermediate.
         - Assume that all agents always 'broadcasting' their msg to everyone.
+        - Every msg is a multipart msg of three frames,
+            topic:   what subscribers filter on, e.g., 'broadcasting'
+            header:  codec id, sequence number and the sender
+            payload: the msg encoded by the codec (utils.codec), sent without copy
+        - recv() returns a Message with the payload as memoryview, read() returns
+          (topic, sender, message) with the decoded message.
+        - PUB/SUB drops msgs silently when a queue reaches its high water mark,
+          receivers find the gaps in the sequence numbers of each (topic, sender) and count them in 'stats'.
+        - handshake() returns when msgs go through the broker and back, instead of sleeping
+          for the slow joiner. Msgs received meanwhile are kept for the next recv().
+    Class RequestClient / RequestServer
+    This is a reliable request channel from agents to the core, next to the PUB/SUB bus.
+        - Agents have a DEALER socket, the core has a ROUTER socket, msgs are not dropped.
+        - Every request has a correlation id (the sequence number in the header) and is acknowledged.
+        - Requests not acknowledged in time are sent again with the same id,
+          the core acknowledges duplicates again without performing them twice.
     Func proxy
     This describes our intermediate broker.
         - Using ZeroMQ to receive and send msg, sockets are consist of XPUB/XSUB.
         - Before start connection, proxy() must be called first.
+        - It can listen on several transports at once, e.g., 'inproc' for agent threads
+          of the core process and 'tcp' for other processes.
+        - With stats_file or stats_topic, a capture socket feeds BrokerStats, which reports msgs/s
+          and bytes/s per topic and per sender, and a histogram of payload sizes.
+    Func wait_any
+    This waits on several communicators (or request channels) at once.
+        - Using zmq.Poller, it wakes up as soon as any of them has a msg.
 """
 
 import zmq
+import json
 import time
+import random
+import socket
+import struct
 import logging
+import threading
+from collections import namedtuple, deque
+
+from utils.codec import get_codec, decode_payload
 
 FORMAT = '%(asctime)s %(module)s %(levelname)s %(message)s'
 logging.basicConfig(level=logging.INFO, format=FORMAT)
@@ -25,65 +56,587 @@ logger = logging.getLogger(__name__)
 proxy_addr_in = 'tcp://127.0.0.1:5555'
 proxy_addr_out = 'tcp://127.0.0.1:5556'
 
+# Broker's addresses (in, out) of each transport.
+#   - tcp: multi-process and multi-host runs
+#   - ipc: multi-process runs on one host (not on Windows)
+#   - inproc: threads in the same process as the broker, no kernel and no copy between them
+transports = {
+    'tcp': (proxy_addr_in, proxy_addr_out),
+    'ipc': ('ipc:///tmp/goras_proxy_in', 'ipc:///tmp/goras_proxy_out'),
+    'inproc': ('inproc://goras_proxy_in', 'inproc://goras_proxy_out'),
+}
+default_transport = 'tcp'
+
+# Addresses of the request channel (agents -> core) of each transport.
+request_addrs = {
+    'tcp': 'tcp://127.0.0.1:5557',
+    'ipc': 'ipc:///tmp/goras_request',
+    'inproc': 'inproc://goras_request',
+}
+
+
+def _to_msec(timeout):
+    # Our timeouts are in seconds like the rest of the project, zmq wants msec.
+    # None means waiting forever.
+    if timeout is None:
+        return None
+    return max(0, int(timeout * 1000))
+
+# Header frame: codec id, sequence number, followed by the sender in utf-8
+_header = struct.Struct('>cQ')
+
+# A received msg, payload is a memoryview on the frame.
+Message = namedtuple('Message', ['topic', 'sender', 'seq', 'codec', 'payload'])
+
+
+def _parse_frames(frames):
+    topic, header, payload = frames
+    codec, seq, sender = _unpack_header(header)
+    return Message(topic.bytes.decode('utf-8'), sender, seq, codec, payload.buffer)
+
+
+# Decode the payload of a Message, returns (topic, sender, message).
+# ValueError if it is broken, see utils.codec.
+def decode(message):
+    return message.topic, message.sender, decode_payload(message.codec, message.payload)
+
+
+def _pack_header(codec, seq, sender):
+    return _header.pack(codec.id, seq) + sender
+
+
+def _unpack_header(header):
+    codec, seq = _header.unpack_from(header.buffer)
+    return codec, seq, bytes(header.buffer[_header.size:]).decode('utf-8')
+
+
+# A request received by the core, 'identity' is the routing id of the DEALER.
+Request = namedtuple('Request', ['identity', 'sender', 'id', 'message'])
+
 class Communicator(object):
-    def __init__(self,topic='broadcasting'):
-        self.context = zmq.Context.instance()
+    def __init__(self, topic='broadcasting', sender='anonymous', codec=None, transport=None,
+                 sndhwm=None, rcvhwm=None, context=None):
+        # inproc needs the same context with the broker, so always use the shared one.
+        # A zmq.asyncio context shadowing it gives awaitable sockets (agent.runtime).
+        self.context = context or zmq.Context.instance()
+        addr_in, addr_out = transports[transport or default_transport]
+
+        # Who sends msgs from this communicator.
+        self.sender = str(sender)
+        self._sender = self.sender.encode('utf-8')
+
+        # Sequence number of the next msg for each topic
+        self._seq = {}
+
+        # How to encode msgs to send, any registered codec can be read.
+        self.codec = get_codec(codec)
+
+        # The number of msgs drained by the last read_all().
+        self.backlog = 0
+
+        # Counters of msgs, 'dropped' are the gaps in sequence numbers.
+        self.stats = {'sent': 0, 'received': 0, 'dropped': 0, 'out_of_order': 0, 'broken': 0}
+        self.dropped_from = {}
+        # The last sequence number received from each (topic, sender)
+        self._last_seq = {}
+        # Msgs received during handshake()
+        self._early = deque()
 
         # connect subscriber to broker's XPUB socket
         self.subscriber = self.context.socket(zmq.SUB)
+        if rcvhwm is not None:
+            self.subscriber.setsockopt(zmq.RCVHWM, rcvhwm)
         
         self.subscriber.setsockopt(zmq.SUBSCRIBE, topic.encode())
 
-        self.subscriber.connect(proxy_addr_out)
+        self.subscriber.connect(addr_out)
 
         # connect publisher to broker's XSUB socket
         self.publisher = self.context.socket(zmq.PUB)
-        self.publisher.connect(proxy_addr_in)
+        if sndhwm is not None:
+            self.publisher.setsockopt(zmq.SNDHWM, sndhwm)
+        self.publisher.connect(addr_in)
 
         # time.sleep(0.5)
 
-    def read(self):
-        message = ''
+        # The poller lets the reader sleep until a msg arrives instead of spinning.
+        self.poller = zmq.Poller()
+        self.poller.register(self.subscriber, zmq.POLLIN)
+        self.pollable = self.subscriber
+
+    def poll(self, timeout=0):
+        # Wait up to 'timeout' seconds for a msg. 0 returns at once, None waits forever.
+        if self._early:
+            return True
+        events = dict(self.poller.poll(_to_msec(timeout)))
+        return self.subscriber in events
+
+    def handshake(self, timeout=10.0):
+        # Publish hellos on our own topic until one comes back through the broker.
+        # Then the broker is up, and it knows our subscription. Returns False on timeout.
+        topic = '_hello.%s.%x' % (self.sender, id(self))
+        self.subscriber.setsockopt(zmq.SUBSCRIBE, topic.encode('utf-8'))
         try:
-            # zmq.NOBLOCK makes the process not wait for msg.
-            # When it is waiting for msg, if there is no msg, just continue the process.
-            message = self.subscriber.recv_string(flags=zmq.NOBLOCK)
+            deadline = time.time() + timeout
+            interval = 0.01
+            while time.time() < deadline:
+                self._publish(topic, None)
+                end = min(deadline, time.time() + interval)
+                while True:
+                    events = dict(self.poller.poll(_to_msec(end - time.time())))
+                    if self.subscriber not in events:
+                        break
+                    message = _parse_frames(self.subscriber.recv_multipart(copy=False))
+                    if message.topic == topic:
+                        return True
+                    self._early.append(self._account(message))
+                interval = min(interval * 2, 0.5)
+            logger.warning('%s could not reach the broker in %s sec' % (self.sender, timeout))
+            return False
+        finally:
+            self.subscriber.setsockopt(zmq.UNSUBSCRIBE, topic.encode('utf-8'))
+            self._seq.pop(topic, None)
+
+    def recv(self, timeout=0):
+        # With the default timeout of 0 it does not wait for msg.
+        # If there is no msg until the timeout, returns None and just continue the process.
+        if self._early:
+            return self._early.popleft()
+        if not self.poll(timeout):
+            return None
+        try:
+            frames = self.subscriber.recv_multipart(flags=zmq.NOBLOCK, copy=False)
 
         except zmq.error.Again:
-            pass
+            return None
+        return self._account(_parse_frames(frames))
+
+    def recv_all(self, timeout=0, limit=None):
+        # Wait up to 'timeout' seconds for the first msg, then drain every queued msg.
+        # 'limit' bounds the number of msgs taken at once.
+        messages = []
+        while self._early and (limit is None or len(messages) < limit):
+            messages.append(self._early.popleft())
+        if self.poll(timeout):
+            while limit is None or len(messages) < limit:
+                try:
+                    frames = self.subscriber.recv_multipart(flags=zmq.NOBLOCK, copy=False)
+                except zmq.error.Again:
+                    break
+                messages.append(self._account(_parse_frames(frames)))
+        self.backlog = len(messages)
+        return messages
+
+    def _account(self, message):
+        self.stats['received'] += 1
+
+        key = (message.topic, message.sender)
+        last = self._last_seq.get(key)
+        if last is None or message.seq == 0:
+            # The first msg from the sender, or the sender has restarted.
+            self._last_seq[key] = message.seq
+        elif message.seq > last:
+            dropped = message.seq - last - 1
+            if dropped:
+                self.stats['dropped'] += dropped
+                self.dropped_from[message.sender] = self.dropped_from.get(message.sender, 0) + dropped
+            self._last_seq[key] = message.seq
+        else:
+            self.stats['out_of_order'] += 1
         return message
 
-    def send(self, message, broadcast=False, who=''):
+    # Ratio of dropped msgs to the msgs that should have been received
+    def loss_rate(self):
+        expected = self.stats['received'] + self.stats['dropped']
+        if expected == 0:
+            return 0.0
+        return self.stats['dropped'] / expected
+
+    # A broken msg is counted and dropped, returns None for it.
+    def _decode(self, message):
+        try:
+            return decode(message)
+        except ValueError as e:
+            self.stats['broken'] += 1
+            logger.warning('%s dropped a broken msg of %s on %s: %s' % (self.sender, message.sender, message.topic, e))
+            return None
+
+    def read(self, timeout=0):
+        message = self.recv(timeout)
+        if message is None:
+            return None
+        return self._decode(message)
+
+    def read_all(self, timeout=0, limit=None):
+        decoded = (self._decode(message) for message in self.recv_all(timeout, limit))
+        return [message for message in decoded if message is not None]
+
+    # 'sender' sends on behalf of another, e.g., agents sharing the communicator of a runtime.
+    def _publish(self, topic, message, sender=None):
+        if sender is None:
+            key, sender = topic, self._sender
+        else:
+            sender = str(sender)
+            key, sender = (topic, sender), sender.encode('utf-8')
+        seq = self._seq.get(key, 0)
+        self._seq[key] = seq + 1
+
+        header = _pack_header(self.codec, seq, sender)
+        payload = self.codec.encode(message)
+        self.publisher.send_multipart([topic.encode('utf-8'), header, payload], copy=False)
+        self.stats['sent'] += 1
+
+    def send(self, message, broadcast=False, who='', sender=None):
 
         if broadcast is True: # broadcast to all agents, must be include logging module.
-            self.publisher.send_string("%s %s"%('broadcasting',message))
+            self._publish('broadcasting', message, sender)
         elif who != '': # Unicast to special agent, usually use to request action to core.
-            self.publisher.send_string("%s %s"%(who,message))
+            self._publish(who, message, sender)
         else:
             logging.error("Doesn't set the target to send msg!")
 
     def log(self, message, send_from):
-        self.publisher.send_string('%s %s' % ('logging', send_from + ':' + message))
+        self._publish('logging', send_from + ':' + message)
 
     def close(self):
         self.publisher.close()
         self.subscriber.close()
 
-# Proxy server acts Broker to transfer msg from all agents to all agents.
-def proxy():
-    addr_in = proxy_addr_in
-    addr_out = proxy_addr_out
 
+# Agent side of the request channel
+class RequestClient(object):
+    def __init__(self, sender='anonymous', codec=None, transport=None, retry_timeout=1.0, max_retries=5):
+        self.context = zmq.Context.instance()
+        self.sender = str(sender)
+        self._sender = self.sender.encode('utf-8')
+        self.codec = get_codec(codec)
+
+        # Resend a request when it is not acknowledged in 'retry_timeout' seconds, 'max_retries' times.
+        self.retry_timeout = retry_timeout
+        self.max_retries = max_retries
+
+        self.socket = self.context.socket(zmq.DEALER)
+        self.socket.setsockopt(zmq.LINGER, 0)
+        self.socket.connect(request_addrs[transport or default_transport])
+        self.pollable = self.socket
+
+        # The core dedups requests by the sender and the id, an agent restarted under the same
+        # name must not reuse the ids of its former run. A random start makes it unlikely.
+        self._next_id = random.getrandbits(48)
+        # Requests waiting for acks, id -> [message, sent time, retries]
+        self.pending = {}
+        self.stats = {'requested': 0, 'acked': 0, 'retried': 0, 'failed': 0, 'broken': 0}
+
+    def _send(self, request_id, message):
+        header = _pack_header(self.codec, request_id, self._sender)
+        self.socket.send_multipart([header, self.codec.encode(message)], copy=False)
+
+    # An ack has arrived, returns [(id, status)] or [] if it is not ours (any more).
+    def _acked(self, request_id, status):
+        if self.pending.pop(request_id, None) is None:
+            return []
+        self.stats['acked'] += 1
+        return [(request_id, status)]
+
+    # Send a request to the core, returns its correlation id.
+    def request(self, message):
+        request_id = self._next_id
+        self._next_id += 1
+
+        self._send(request_id, message)
+        self.pending[request_id] = [message, time.time(), 0]
+        self.stats['requested'] += 1
+        return request_id
+
+    # Take acks, resend the requests waiting too long. Returns [(id, status)] of acked requests.
+    def poll_acks(self, timeout=0):
+        acks = []
+        if self.socket.poll(_to_msec(timeout), zmq.POLLIN):
+            while True:
+                try:
+                    header, payload = self.socket.recv_multipart(flags=zmq.NOBLOCK, copy=False)
+                except zmq.error.Again:
+                    break
+                codec, request_id, sender = _unpack_header(header)
+                try:
+                    status = decode_payload(codec, payload.buffer)
+                except ValueError as e:
+                    # Dropped, the request is sent again.
+                    self.stats['broken'] += 1
+                    logger.warning('%s dropped a broken ack: %s' % (self.sender, e))
+                    continue
+                acks.extend(self._acked(request_id, status))
+
+        self._retry()
+        return acks
+
+    # When the oldest pending request is due to be resent, None without pending requests.
+    def next_retry(self):
+        if not self.pending:
+            return None
+        return min(pending[1] for pending in self.pending.values()) + self.retry_timeout
+
+    # Resend the requests waiting too long, give up after max_retries.
+    def _retry(self):
+        now = time.time()
+        for request_id, pending in list(self.pending.items()):
+            message, sent, retries = pending
+            if now - sent < self.retry_timeout:
+                continue
+            if retries >= self.max_retries:
+                del self.pending[request_id]
+                self.stats['failed'] += 1
+                logger.warning('%s gave up the request %d to the core' % (self.sender, request_id))
+                continue
+            self._send(request_id, message)
+            pending[1] = now
+            pending[2] = retries + 1
+            self.stats['retried'] += 1
+
+    def close(self):
+        self.socket.close()
+
+
+# Core side of the request channel
+class RequestServer(object):
+    def __init__(self, listen=(default_transport,), codec=None, sender='core', history=1024):
+        self.context = zmq.Context.instance()
+        self._sender = str(sender).encode('utf-8')
+        self.codec = get_codec(codec)
+
+        self.socket = self.context.socket(zmq.ROUTER)
+        self.socket.setsockopt(zmq.LINGER, 0)
+        self.endpoints = []
+        for transport in listen:
+            self.socket.bind(request_addrs[transport])
+            self.endpoints.append(self.socket.getsockopt_string(zmq.LAST_ENDPOINT))
+        self.pollable = self.socket
+
+        # Status of the last 'history' requests of each sender, to acknowledge duplicates again.
+        self.history = history
+        self._handled = {}
+        self.stats = {'received': 0, 'duplicated': 0, 'broken': 0}
+
+    # Wait up to 'timeout' seconds for the first request, then drain every queued request.
+    def recv_all(self, timeout=0, limit=None):
+        requests = []
+        if not self.socket.poll(_to_msec(timeout), zmq.POLLIN):
+            return requests
+
+        while limit is None or len(requests) < limit:
+            try:
+                identity, header, payload = self.socket.recv_multipart(flags=zmq.NOBLOCK, copy=False)
+            except zmq.error.Again:
+                break
+            codec, request_id, sender = _unpack_header(header)
+            request = Request(identity.bytes, sender, request_id, None)
+
+            handled = self._handled.setdefault(sender, {})
+            if request_id in handled:
+                # A resent request which is already performed.
+                self.stats['duplicated'] += 1
+                self.ack(request, handled[request_id])
+                continue
+
+            try:
+                message = decode_payload(codec, payload.buffer)
+            except ValueError as e:
+                # Not acked, as it was never received.
+                self.stats['broken'] += 1
+                logger.warning('Dropped a broken request of %s: %s' % (sender, e))
+                continue
+            self.stats['received'] += 1
+            requests.append(request._replace(message=message))
+        return requests
+
+    def ack(self, request, status=True):
+        handled = self._handled.setdefault(request.sender, {})
+        handled[request.id] = status
+        if len(handled) > self.history:
+            del handled[next(iter(handled))]
+
+        # The ack names the sender of the request, a DEALER shared by agents routes it by the name.
+        header = _pack_header(self.codec, request.id, request.sender.encode('utf-8'))
+        self.socket.send_multipart([request.identity, header, self.codec.encode(status)])
+
+    # The endpoints are unbound first, close() frees them later and the next server could not bind them.
+    def close(self):
+        for endpoint in self.endpoints:
+            try:
+                self.socket.unbind(endpoint)
+            except zmq.ZMQError:
+                pass
+        self.socket.close()
+
+
+# Wakes up wait_any() in another thread, e.g., to stop an agent at once.
+# A socket pair is safe to write from any thread, zmq sockets are not.
+class Waker(object):
+    def __init__(self):
+        self._read, self._write = socket.socketpair()
+        self._read.setblocking(False)
+        self._write.setblocking(False)
+        self.pollable = self._read.fileno()
+
+    def wake(self):
+        try:
+            self._write.send(b'\0')
+        except OSError:
+            # Full of wake-ups already, or closed.
+            pass
+
+    def clear(self):
+        try:
+            while self._read.recv(4096):
+                pass
+        except OSError:
+            pass
+
+    def close(self):
+        self._read.close()
+        self._write.close()
+
+
+# Wait until at least one of the communicators has a msg, returns the ready ones.
+def wait_any(communicators, timeout=None):
+    # Msgs kept by handshake() are ready already.
+    ready = [comm for comm in communicators if getattr(comm, '_early', None)]
+    if ready:
+        return ready
+
+    poller = zmq.Poller()
+    for comm in communicators:
+        poller.register(comm.pollable, zmq.POLLIN)
+
+    events = dict(poller.poll(_to_msec(timeout)))
+    return [comm for comm in communicators if comm.pollable in events]
+
+# Counts what goes through the broker, fed by the capture socket of proxy().
+class BrokerStats(object):
+    def __init__(self):
+        self.started = time.time()
+        # Since the last snapshot
+        self._window_start = self.started
+        self._topics = {}
+        self._senders = {}
+        # Payload sizes since the proxy started, bucketed by the next power of two.
+        self.sizes = {}
+        self.total = {'messages': 0, 'bytes': 0}
+
+    def add(self, frames):
+        # Subscriptions going upstream are single frames, only count published msgs.
+        if len(frames) != 3:
+            return
+        topic, header, payload = frames
+        size = len(topic) + len(header) + len(payload)
+        codec, seq = _header.unpack_from(header)
+        sender = header[_header.size:]
+
+        for counts, key in ((self._topics, topic), (self._senders, sender)):
+            count = counts.get(key)
+            if count is None:
+                count = counts[key] = [0, 0]
+            count[0] += 1
+            count[1] += size
+
+        bucket = 1 << max(len(payload) - 1, 0).bit_length()
+        self.sizes[bucket] = self.sizes.get(bucket, 0) + 1
+        self.total['messages'] += 1
+        self.total['bytes'] += size
+
+    # Rates since the last snapshot, then starts a new window.
+    def snapshot(self):
+        now = time.time()
+        elapsed = max(now - self._window_start, 1e-9)
+
+        def rates(counts):
+            return dict((key.decode('utf-8', 'replace'),
+                         {'msgs/s': count[0] / elapsed, 'bytes/s': count[1] / elapsed})
+                        for key, count in counts.items())
+
+        snapshot = {'time': now,
+                    'window': elapsed,
+                    'topics': rates(self._topics),
+                    'senders': rates(self._senders),
+                    'payload_sizes': dict(('<=%d' % bucket, count) for bucket, count in sorted(self.sizes.items())),
+                    'total': dict(self.total)}
+        self._window_start = now
+        self._topics = {}
+        self._senders = {}
+        return snapshot
+
+
+def _broker_stats(capture_addr, stats, interval, stats_file, stats_topic, transport):
+    context = zmq.Context.instance()
+    capture = context.socket(zmq.SUB)
+    capture.setsockopt(zmq.SUBSCRIBE, b'')
+    capture.connect(capture_addr)
+
+    publisher = None
+    if stats_topic is not None:
+        codec = get_codec()
+        publisher = context.socket(zmq.PUB)
+        publisher.setsockopt(zmq.LINGER, 0)
+        publisher.connect(transports[transport][0])
+        seq = 0
+
+    try:
+        next_snapshot = time.time() + interval
+        while True:
+            if capture.poll(_to_msec(max(next_snapshot - time.time(), 0)), zmq.POLLIN):
+                while True:
+                    try:
+                        stats.add(capture.recv_multipart(flags=zmq.NOBLOCK))
+                    except zmq.error.Again:
+                        break
+            if time.time() < next_snapshot:
+                continue
+            next_snapshot += interval
+
+            snapshot = stats.snapshot()
+            if stats_file is not None:
+                with open(stats_file, 'a') as f:
+                    f.write(json.dumps(snapshot) + '\n')
+            if publisher is not None:
+                header = _pack_header(codec, seq, b'proxy')
+                publisher.send_multipart([stats_topic.encode('utf-8'), header, codec.encode(snapshot)])
+                seq += 1
+    except zmq.ContextTerminated:
+        capture.close()
+        if publisher is not None:
+            publisher.close()
+
+
+# Proxy server acts Broker to transfer msg from all agents to all agents.
+# With 'stats_file' or 'stats_topic', it counts every msg through a capture socket and
+# writes a snapshot each 'stats_interval' seconds as a json line, or publishes it on the topic.
+def proxy(listen=(default_transport,), stats_file=None, stats_topic=None, stats_interval=5.0):
     context = zmq.Context.instance()
     socket_in = context.socket(zmq.XSUB)
-    socket_in.bind(addr_in)
     socket_out = context.socket(zmq.XPUB)
-    socket_out.bind(addr_out)
+    for transport in listen:
+        addr_in, addr_out = transports[transport]
+        socket_in.bind(addr_in)
+        socket_out.bind(addr_out)
+
+    capture = None
+    if stats_file is not None or stats_topic is not None:
+        capture_addr = 'inproc://goras_capture_%x' % id(socket_in)
+        # PUB never blocks the broker, a slow stats thread loses samples instead.
+        capture = context.socket(zmq.PUB)
+        capture.bind(capture_addr)
+        stats_thread = threading.Thread(target=_broker_stats, name='broker_stats',
+                                        args=(capture_addr, BrokerStats(), stats_interval,
+                                              stats_file, stats_topic, listen[0]))
+        stats_thread.daemon = True
+        stats_thread.start()
 
     try:
         logger.info("proxy is started.")
-        zmq.proxy(socket_in, socket_out)
+        zmq.proxy(socket_in, socket_out, capture)
     except zmq.ContextTerminated:
         print("proxy terminated")
         socket_in.close()
         socket_out.close()
+        if capture is not None:
+            capture.close()
@@ -0,0 +1,79 @@
+"""
+    Tests of agent.agent
+    Batches of General tasks, and a pylon plan run by agent threads against the simulated core
+    of examples/bench_allocation.py.
+"""
+
+import os
+import sys
+import logging
+import unittest
+import threading
+from types import SimpleNamespace
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.append(os.path.join(ROOT, 'src'))
+sys.path.append(os.path.join(ROOT, 'src/agent'))
+sys.path.append(os.path.join(ROOT, 'src/examples'))
+from utils import communicator
+from utils.communicator import proxy
+from goal_generator import PylonPlan
+
+# The agents need the SC2 protocol and PyYAML of Documents/howtostart.md.
+try:
+    from agent import Agent
+    from bench_allocation import bench
+except (ImportError, TypeError):
+    Agent = None
+
+# A broker of its own, other tests bind the inproc addresses of the module.
+TRANSPORT = 'test_agent'
+
+
+def setUpModule():
+    if Agent is None:
+        return
+    communicator.transports[TRANSPORT] = ('inproc://test_agent_in', 'inproc://test_agent_out')
+    communicator.request_addrs[TRANSPORT] = 'inproc://test_agent_request'
+    threading.Thread(target=proxy, args=((TRANSPORT,),), daemon=True).start()
+
+
+def task(name, **arguments):
+    return SimpleNamespace(__name__=name, arguments=arguments)
+
+
+@unittest.skipIf(Agent is None, 'the agents cannot be imported')
+class ConflictTest(unittest.TestCase):
+    def test_one_command_on_units(self):
+        selected = [(None, task('gather 1', target='unit', unit_tag=1))]
+        self.assertTrue(Agent._conflicts(task('gather 2', target='unit', unit_tag=1), selected))
+        self.assertTrue(Agent._conflicts(task('gather 3', target='unit', unit_tag=2), selected))
+        self.assertFalse(Agent._conflicts(task('build_pylon 1', target='point', pos_x=1, pos_y=2), selected))
+
+    def test_points(self):
+        selected = [(None, task('build_pylon 1', target='point', pos_x=1, pos_y=2))]
+        self.assertTrue(Agent._conflicts(task('build_pylon 2', target='point', pos_x=1, pos_y=2), selected))
+        self.assertFalse(Agent._conflicts(task('build_pylon 3', target='point', pos_x=3, pos_y=2), selected))
+        self.assertFalse(Agent._conflicts(task('gather 1', target='unit', unit_tag=1), selected))
+
+
+@unittest.skipIf(Agent is None, 'the agents cannot be imported')
+class BatchRunTest(unittest.TestCase):
+    def setUp(self):
+        self.level = logging.getLogger().level
+        logging.getLogger().setLevel(logging.WARNING)
+
+    def tearDown(self):
+        logging.getLogger().setLevel(self.level)
+
+    # Fewer agents than the gathers of a pylon, each takes the next gathers of its leaf after its acks.
+    def test_rendezvous_batch_completes(self):
+        plan = PylonPlan(branches=1, depth=3, mineral=1)
+        stats = bench('rendezvous', 2, plan, 3000, batch_size=4, tick=0.1, timeout=15.0, transport=TRANSPORT)
+        self.assertTrue(stats['done'], stats)
+        # Every gather is performed by the core, none is lost in a queue.
+        self.assertGreaterEqual(stats['actions'], stats['general'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,239 @@
+"""
+    Tests of agent.allocation
+    Owners of RendezvousAllocator, awards of AuctionAllocator and leases of claimed tasks,
+    without the broker.
+"""
+
+import os
+import sys
+import time
+import unittest
+from types import SimpleNamespace
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../src'))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../src/agent'))
+from allocation import RendezvousAllocator, PingAllocator, AuctionAllocator, Membership, TAKE, WAIT, SKIP
+from knowledge_base import Knowledge
+
+
+def make_allocator(num_agents, task_names):
+    agent = SimpleNamespace(spawn_id=1, knowledge=dict((name, {'is': 'Ready'}) for name in task_names),
+                            snapshot_period=10.0, discrete_time_step=0.5, batch_size=4)
+    allocator = RendezvousAllocator(agent)
+    for spawn_id in range(2, num_agents + 1):
+        allocator.members.heard(str(spawn_id), {}, time.time())
+    return allocator
+
+
+def make_tasks(task_names, done=()):
+    return [SimpleNamespace(__name__=name, state='Done' if name in done else 'Ready') for name in task_names]
+
+
+def first_choice(allocator, task_name):
+    members = allocator.members.live(allocator.agent.spawn_id)
+    return max(members, key=lambda spawn_id: RendezvousAllocator.weight(task_name, spawn_id))
+
+
+class RendezvousOwnersTest(unittest.TestCase):
+    names = ['build_pylon %d' % i for i in range(1, 13)]
+
+    def test_done_tasks_are_not_owned(self):
+        allocator = make_allocator(4, self.names)
+        owners = allocator.owners(make_tasks(self.names, done=self.names[:5]))
+        self.assertEqual(sorted(owners), sorted(self.names[5:]))
+
+    def test_bounded_load(self):
+        allocator = make_allocator(5, self.names)
+        owners = allocator.owners(make_tasks(self.names))
+        loads = [list(owners.values()).count(spawn_id) for spawn_id in range(1, 6)]
+        self.assertLessEqual(max(loads), 3)
+        self.assertEqual(sum(loads), len(self.names))
+
+    def test_owner_does_not_depend_on_other_tasks(self):
+        allocator = make_allocator(16, self.names)
+        # Tasks whose first choices differ keep them, whatever the other tasks are.
+        distinct = {}
+        for name in self.names:
+            distinct.setdefault(first_choice(allocator, name), name)
+        names = sorted(distinct.values())
+        self.assertGreater(len(names), 1)
+        for count in range(1, len(names) + 1):
+            owners = allocator.owners(make_tasks(names[:count]))
+            for name in names[:count]:
+                self.assertEqual(owners[name], first_choice(allocator, name))
+
+    def test_order_of_tasks_does_not_matter(self):
+        allocator = make_allocator(3, self.names)
+        tasks = make_tasks(self.names)
+        self.assertEqual(allocator.owners(tasks), allocator.owners(tasks[::-1]))
+
+    def test_new_agent_moves_few_tasks(self):
+        names = ['gather %d' % i for i in range(1, 201)]
+        before = make_allocator(8, names).owners(make_tasks(names))
+        after = make_allocator(9, names).owners(make_tasks(names))
+        moved = [name for name in names if before[name] != after[name]]
+        # About a ninth goes to the new agent, the bound moves a few more.
+        self.assertLess(len(moved), len(names) // 4)
+
+
+class RendezvousClaimTest(unittest.TestCase):
+    def setUp(self):
+        self.allocator = make_allocator(2, ['build_pylon %d' % i for i in range(1, 13)])
+        self.allocator.warmup = 0.5
+        # A task of ours and one of the other agent, each the only task of its leaf
+        names = dict((first_choice(self.allocator, name), name) for name in self.allocator.knowledge)
+        self.ours = SimpleNamespace(__name__=names[1], state='Ready', parent=None)
+        self.theirs = SimpleNamespace(__name__=names[2], state='Ready', parent=None)
+
+    def test_warmup(self):
+        self.assertEqual(self.allocator._claim(self.ours, 100.0), WAIT)
+        self.assertEqual(self.allocator._claim(self.ours, 100.4), WAIT)
+        self.assertEqual(self.allocator._claim(self.ours, 100.5), TAKE)
+        self.assertEqual(self.allocator._claim(self.theirs, 100.5), SKIP)
+
+    def test_owner_is_expired_after_patience(self):
+        allocator = self.allocator
+        allocator._claim(self.theirs, 100.0)
+        self.assertEqual(allocator._claim(self.theirs, 100.5), SKIP)
+        patience = allocator.leases.lease_time + allocator.leases.grace
+        self.assertEqual(allocator._claim(self.theirs, 100.5 + patience - 0.1), SKIP)
+        self.assertEqual(allocator.knowledge[self.theirs.__name__], {'is': 'Ready'})
+
+        self.assertEqual(allocator._claim(self.theirs, 100.5 + patience), SKIP)
+        self.assertEqual(allocator.knowledge[self.theirs.__name__], {'is': 'Ready', 'epoch': 1})
+        self.assertEqual(allocator.leases.stats['expired'], 1)
+        # Not an owner until it is heard again, we own the task in its next epoch.
+        self.assertEqual(allocator.members.live(1), [1])
+        self.assertEqual(allocator._claim(self.theirs, 100.5 + patience), TAKE)
+
+    def test_tasks_not_ready_are_skipped(self):
+        self.allocator._claim(self.ours, 100.0)
+        self.ours.state = 'Active'
+        self.assertEqual(self.allocator._claim(self.ours, 101.0), SKIP)
+
+
+class MembershipTest(unittest.TestCase):
+    def test_join_and_destroyed(self):
+        members = Membership(timeout=5.0)
+        self.assertTrue(members.heard('2', {}, 100.0))
+        self.assertFalse(members.heard('2', {}, 101.0))
+        self.assertFalse(members.heard('core', {}, 101.0))
+        self.assertEqual(members.live(1), [1, 2])
+
+        version = members.version
+        self.assertFalse(members.heard('2', {'2': {'is': 'destroyed'}}, 102.0))
+        self.assertEqual(members.live(1), [1])
+        self.assertGreater(members.version, version)
+        # Late msgs of a destroyed agent do not bring it back.
+        self.assertFalse(members.heard('2', {}, 103.0))
+        self.assertEqual(members.live(1), [1])
+
+    def test_silent_agents_are_gone(self):
+        members = Membership(timeout=5.0)
+        members.heard('2', {}, 100.0)
+        members.heard('3', {}, 102.0)
+        self.assertEqual(members.next_expiry(), 105.0)
+        self.assertFalse(members.expire(104.0))
+        self.assertTrue(members.expire(105.0))
+        self.assertEqual(members.live(1), [1, 3])
+        # Heard again, it is back.
+        self.assertTrue(members.heard('2', {}, 106.0))
+
+
+class AuctionTest(unittest.TestCase):
+    def setUp(self):
+        names = ['gather %d' % i for i in range(1, 4)]
+        # Agents 1 and 2 bid on the three tasks of the leaf at once, they take one task each.
+        knowledge = dict((name, {'is': 'Bid', 'bids': {'1': [1.0, 100.0, 0, 1], '2': [2.0, 100.0, 0, 1]}})
+                         for name in names)
+        agent = SimpleNamespace(spawn_id=1, knowledge=knowledge, batch_size=1)
+        self.allocator = AuctionAllocator(agent)
+        leaf = SimpleNamespace(tasks=[])
+        leaf.tasks = [SimpleNamespace(__name__=name, state='Bid', type='General', arguments={}, parent=leaf)
+                      for name in names]
+        self.tasks = leaf.tasks
+
+    def test_awards(self):
+        self.assertEqual(self.allocator.awards(self.tasks), {'gather 1': 1, 'gather 2': 2, 'gather 3': None})
+        self.assertEqual(self.allocator._claim(self.tasks[0], 101.0), TAKE)
+        self.assertEqual(self.allocator._claim(self.tasks[1], 101.0), SKIP)
+
+    def test_no_winner_goes_to_next_round(self):
+        self.assertEqual(self.allocator._claim(self.tasks[2], 101.0), WAIT)
+        self.assertEqual(self.allocator.knowledge['gather 3']['bids']['1'][2], 1)
+        self.assertEqual(self.allocator.next_deadline(), 101.0 + self.allocator.bid_window + self.allocator.settle_time)
+        # Alone in the new round
+        self.assertEqual(self.allocator._claim(self.tasks[2], 101.2), TAKE)
+
+
+class LeasesTest(unittest.TestCase):
+    def setUp(self):
+        agent = SimpleNamespace(spawn_id=1, knowledge=Knowledge(), snapshot_period=10.0,
+                                discrete_time_step=0.5, batch_size=4)
+        for name in ('build_pylon 1', 'build_pylon 2'):
+            agent.knowledge[name] = {'is': 'Ready'}
+        self.knowledge = agent.knowledge
+        self.leases = PingAllocator(agent).leases
+
+    def test_acked(self):
+        self.leases.take('build_pylon 1', 7, 100.0)
+        self.leases.take('build_pylon 2', 7, 100.0)
+        self.assertEqual(self.knowledge['build_pylon 1']['lease'], ['1', 102.0])
+        self.assertTrue(self.leases.holds('build_pylon 2'))
+        self.leases.acked([(7, True)])
+        self.assertEqual(self.knowledge['build_pylon 1']['is'], 'Done')
+        self.assertEqual(self.knowledge['build_pylon 2']['is'], 'Done')
+        self.assertFalse(self.leases.holds('build_pylon 2'))
+
+    def test_refused_is_ready_in_next_epoch(self):
+        self.leases.take('build_pylon 1', 7, 100.0)
+        self.leases.acked([(7, False)])
+        self.assertEqual(self.knowledge['build_pylon 1'], {'is': 'Ready', 'epoch': 1})
+        self.assertEqual(self.leases.stats['released'], 1)
+
+        # Taken again in that epoch, it is a reclaim.
+        self.leases.take('build_pylon 1', 8, 101.0)
+        self.assertEqual(self.leases.stats['reclaimed'], 1)
+
+    def test_renew(self):
+        self.leases.take('build_pylon 1', 7, 100.0)
+        # Renewed in the second half of the lease only
+        self.leases.renew({7}, 100.5)
+        self.assertEqual(self.knowledge['build_pylon 1']['lease'], ['1', 102.0])
+        self.leases.renew({7}, 101.5)
+        self.assertEqual(self.knowledge['build_pylon 1']['lease'], ['1', 103.5])
+        self.assertEqual(self.leases.stats['renewed'], 1)
+        self.assertEqual(self.leases.next_timer(), 102.5)
+
+    def test_given_up_request_is_released(self):
+        self.leases.take('build_pylon 1', 7, 100.0)
+        self.leases.renew(set(), 101.0)
+        self.assertEqual(self.knowledge['build_pylon 1'], {'is': 'Ready', 'epoch': 1})
+        self.assertEqual(self.leases.held, {})
+
+    def test_expire(self):
+        now = time.time()
+        self.knowledge.update({'build_pylon 1': {'is': 'Active', 'lease': ['2', now - 0.6]},
+                               'build_pylon 2': {'is': 'Active', 'lease': ['3', now + 10.0]}})
+        self.leases.watch(['build_pylon 1', 'build_pylon 2'])
+        self.assertTrue(self.leases.due())
+        self.assertEqual(self.leases.expire(now), ['build_pylon 1'])
+        self.assertEqual(self.knowledge['build_pylon 1'], {'is': 'Ready', 'epoch': 1})
+        self.assertEqual(self.leases.stats['expired'], 1)
+        self.assertFalse(self.leases.due())
+        self.assertEqual(self.leases.next_timer(), now + 10.0 + self.leases.grace)
+
+        # The holder tells its former epoch late, it changes nothing.
+        self.assertEqual(self.knowledge.update({'build_pylon 1': {'is': 'Active', 'lease': ['2', now + 2.0]}}), set())
+        self.assertEqual(self.knowledge['build_pylon 1'], {'is': 'Ready', 'epoch': 1})
+
+    def test_own_and_done_leases_are_not_watched(self):
+        now = time.time()
+        self.knowledge.update({'build_pylon 1': {'is': 'Active', 'lease': ['1', now - 10.0]},
+                               'build_pylon 2': {'is': 'Done', 'lease': ['3', now - 10.0]}})
+        self.leases.watch(['build_pylon 1', 'build_pylon 2'])
+        self.assertEqual(self.leases.expire(now), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
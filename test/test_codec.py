@@ -0,0 +1,112 @@
+"""
+    Tests of utils.codec
+    Round trip of every codec and refusal of what must not come from the bus.
+"""
+
+import os
+import sys
+import pickle
+import random
+import unittest
+from base64 import b64encode
+from json import dumps
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../src'))
+from utils.codec import get_codec, encode_message, decode_message, decode_payload
+
+
+def make_knowledge():
+    return {'I have pylon 1': {'is': 'Ready', 'epoch': 3},
+            'gather 1': {'is': 'Ping', 'ping': {3405691582, 12, 0}},
+            'minerals': {'gathered': '350', 'are': [(4294967295, (30.5, 33.5, 11.9))]},
+            'unit': {'tag': 1 << 63, 'neg': -(1 << 70), 'hp': -1, 'dead': None,
+                     'alive': True, 'raw': b'\x00\xff', 'name': 'x' * 300}}
+
+
+class Unpicklable(object):
+    def __reduce__(self):
+        return (os.system, ('true',))
+
+
+class BinaryCodecTest(unittest.TestCase):
+    def test_round_trip(self):
+        knowledge = make_knowledge()
+        self.assertEqual(decode_message(encode_message(knowledge, 'binary')), knowledge)
+
+    def test_keeps_types(self):
+        obj = [(1, 2), {3}, frozenset((4,)), [5]]
+        decoded = decode_message(encode_message(obj, 'binary'))
+        self.assertEqual([type(item) for item in decoded], [tuple, set, frozenset, list])
+
+    def test_refuses_objects(self):
+        with self.assertRaises(TypeError):
+            encode_message({'obj': Unpicklable()}, 'binary')
+
+    def test_refuses_unknown_tag(self):
+        with self.assertRaises(ValueError):
+            decode_message(b'b\x3f')
+
+    def test_refuses_trailing_bytes(self):
+        with self.assertRaises(ValueError):
+            decode_message(encode_message(1, 'binary') + b'\x00')
+
+
+class JsonCodecTest(unittest.TestCase):
+    def test_round_trip(self):
+        knowledge = make_knowledge()
+        del knowledge['unit']['raw']
+        decoded = decode_message(encode_message(knowledge, 'json'))
+        self.assertEqual(set(decoded['gather 1']['ping']), knowledge['gather 1']['ping'])
+        self.assertEqual(decoded['I have pylon 1'], knowledge['I have pylon 1'])
+
+    def test_refuses_objects(self):
+        with self.assertRaises(TypeError):
+            encode_message({'obj': Unpicklable()}, 'json')
+
+    def test_never_unpickles(self):
+        # A frame as the former PythonObjectEncoder made it, with a pickle of anything.
+        crafted = dumps({'_python_object': b64encode(pickle.dumps(Unpicklable())).decode('utf-8')})
+        decoded = decode_message(b'j' + crafted.encode('utf-8'))
+        self.assertEqual(list(decoded), ['_python_object'])
+        self.assertIsInstance(decoded['_python_object'], str)
+
+
+class RegistryTest(unittest.TestCase):
+    def test_names_and_ids(self):
+        self.assertIs(get_codec('json'), get_codec(b'j'))
+        self.assertIs(get_codec('binary'), get_codec(b'b'))
+        self.assertIs(get_codec(), get_codec('binary'))
+
+    def test_unknown_codec(self):
+        with self.assertRaises(ValueError):
+            decode_message(b'p' + pickle.dumps(1))
+        with self.assertRaises(ValueError):
+            decode_payload('json', b'1')
+
+
+class BrokenMessageTest(unittest.TestCase):
+    def test_truncated(self):
+        for codec in ('binary', 'json'):
+            data = encode_message(make_knowledge() if codec == 'binary' else {'gather 1': {'is': 'Ready'}}, codec)
+            for end in range(1, len(data)):
+                with self.assertRaises(ValueError, msg='%s %d' % (codec, end)):
+                    decode_message(data[:end])
+
+    def test_random_bytes(self):
+        rng = random.Random(7)
+        for i in range(2000):
+            data = bytes(rng.getrandbits(8) for j in range(rng.randint(1, 24)))
+            try:
+                decode_message(b'b' + data)
+            except ValueError:
+                pass
+
+    def test_too_deep(self):
+        with self.assertRaises(ValueError):
+            decode_message(b'b' + bytes((0x07, 1)) * 100000 + b'\x00')
+        with self.assertRaises(ValueError):
+            decode_message(b'j' + b'[' * 100000 + b']' * 100000)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+"""
+    Tests of the Communicator of utils.communicator
+    Msgs through an inproc broker, and the accounting of lost msgs of each sender.
+"""
+
+import os
+import sys
+import time
+import unittest
+import threading
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../src'))
+from utils.communicator import Communicator, Message, proxy, _pack_header
+
+_broker = None
+
+
+# One broker for the module, it lives as long as the process.
+def setUpModule():
+    global _broker
+    if _broker is None:
+        _broker = threading.Thread(target=proxy, args=(('inproc',),), daemon=True)
+        _broker.start()
+
+
+def read_all(comm, count, timeout=2.0):
+    messages = []
+    deadline = time.time() + timeout
+    while len(messages) < count and time.time() < deadline:
+        messages.extend(comm.read_all(0.05))
+    return messages
+
+
+class BrokerTest(unittest.TestCase):
+    def setUp(self):
+        self.reader = Communicator(sender='reader', transport='inproc')
+        self.writer = Communicator(sender='writer', transport='inproc')
+        self.assertTrue(self.reader.handshake(5.0))
+        self.assertTrue(self.writer.handshake(5.0))
+
+    def tearDown(self):
+        self.reader.close()
+        self.writer.close()
+
+    def test_broadcast(self):
+        self.writer.send({'gather 1': {'is': 'Done'}}, broadcast=True)
+        self.assertEqual(read_all(self.reader, 1), [('broadcasting', 'writer', {'gather 1': {'is': 'Done'}})])
+
+    def test_broken_msg_is_dropped(self):
+        # A truncated binary dict, then a good msg
+        header = _pack_header(self.writer.codec, 100, b'writer')
+        self.writer.publisher.send_multipart([b'broadcasting', header, b'\x0b\x05'])
+        self.writer.send({'gather 2': {'is': 'Done'}}, broadcast=True)
+        self.assertEqual(read_all(self.reader, 1), [('broadcasting', 'writer', {'gather 2': {'is': 'Done'}})])
+        self.assertEqual(self.reader.stats['broken'], 1)
+
+
+def message(seq, sender='1', topic='broadcasting'):
+    return Message(topic, sender, seq, b'b', memoryview(b''))
+
+
+class AccountTest(unittest.TestCase):
+    def setUp(self):
+        self.comm = Communicator(sender='reader', transport='inproc')
+
+    def tearDown(self):
+        self.comm.close()
+
+    def account(self, *seqs, **kwargs):
+        for seq in seqs:
+            self.comm._account(message(seq, **kwargs))
+
+    def test_in_order(self):
+        self.account(0, 1, 2, 3)
+        self.account(5, 6, sender='2')
+        self.assertEqual(self.comm.stats['received'], 6)
+        self.assertEqual(self.comm.stats['dropped'], 0)
+        self.assertEqual(self.comm.stats['out_of_order'], 0)
+        self.assertEqual(self.comm.loss_rate(), 0.0)
+
+    def test_dropped(self):
+        self.account(0, 1, 4, 5, 9)
+        self.assertEqual(self.comm.stats['dropped'], 5)
+        self.assertEqual(self.comm.dropped_from, {'1': 5})
+        self.assertEqual(self.comm.loss_rate(), 0.5)
+
+    def test_topics_are_counted_apart(self):
+        self.account(0, 1)
+        self.account(0, 1, topic='core')
+        self.assertEqual(self.comm.stats['dropped'], 0)
+
+    def test_out_of_order(self):
+        self.account(0, 2, 1)
+        self.assertEqual(self.comm.stats['dropped'], 1)
+        self.assertEqual(self.comm.stats['out_of_order'], 1)
+
+    def test_sender_restart(self):
+        # A sender counts from 0 again when it restarts, nothing is lost nor late.
+        self.account(0, 1, 2, 3, 0, 1, 2)
+        self.assertEqual(self.comm.stats['dropped'], 0)
+        self.assertEqual(self.comm.stats['out_of_order'], 0)
+        self.account(4)
+        self.assertEqual(self.comm.stats['dropped'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
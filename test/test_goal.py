@@ -0,0 +1,232 @@
+"""
+    Tests of the frontier of agent.goal
+    Actionable leaf goals of a root as tasks are done, with and without precedents,
+    for Goal trees and views of a GoalTemplate.
+"""
+
+import os
+import sys
+import io
+import json
+import random
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.append(os.path.join(ROOT, 'src/agent'))
+from goal import create_goal_set, GoalTemplate, GOAL_STATE_NOT_ASSIGNED, GOAL_STATE_ASSIGNED, \
+    GOAL_STATE_ACTIVE, GOAL_STATE_ACHIEVED, GOAL_STATE_FAILED
+from goal_generator import PylonPlan
+
+
+def pylon(number, precedent=None):
+    gathers = {'goal': 'gather 100 minerals %d' % number,
+               'require': [['gather %d' % number, {'target': 'unit', 'unit_tag': 0}, 'General'],
+                           ['check mineral %d' % number, {'target': 'minerals', 'amount': 100}, 'Query']]}
+    if precedent:
+        gathers['precedent'] = [precedent]
+    return {'goal': 'I have pylon %d' % number,
+            'require': [gathers, ['build_pylon %d' % number, {'target': 'point', 'pos_x': 0, 'pos_y': 0}, 'General']]}
+
+
+def two_pylons(precedent):
+    return {'goal': 'I have two Pylon', 'trigger': [], 'satisfy': [], 'precedent': [],
+            'require': [pylon(1), pylon(2, 'I have pylon 1' if precedent else None)]}
+
+
+# Names of the leaves of the frontier after each round of doing every task of the leaves.
+def rounds(root):
+    names = []
+    while True:
+        leaves = [goal for goal, tasks in root.get_available_goals_and_tasks()]
+        names.append([goal.name for goal in leaves])
+        if not leaves or leaves == [root]:
+            return names
+        for goal in leaves:
+            for task in goal.tasks:
+                task.state = 'Done'
+        root.refresh_achieved()
+
+
+class FrontierTest(unittest.TestCase):
+    def roots(self, description):
+        return [create_goal_set(description), GoalTemplate(description).instantiate()]
+
+    def test_independent_leaves(self):
+        for root in self.roots(two_pylons(precedent=False)):
+            self.assertEqual(rounds(root), [['gather 100 minerals 1', 'gather 100 minerals 2'],
+                                            ['I have pylon 1', 'I have pylon 2'],
+                                            ['I have two Pylon']])
+
+    def test_precedent_blocks_until_achieved(self):
+        for root in self.roots(two_pylons(precedent=True)):
+            self.assertEqual(rounds(root), [['gather 100 minerals 1'], ['I have pylon 1'],
+                                            ['gather 100 minerals 2'], ['I have pylon 2'],
+                                            ['I have two Pylon']])
+
+    def test_precedent_achieved_first(self):
+        description = two_pylons(precedent=True)
+        for root in self.roots(description):
+            for name in ('gather 1', 'check mineral 1', 'build_pylon 1'):
+                root.index().get(name)[0].state = 'Done'
+            root.refresh_achieved()
+            self.assertEqual([goal.name for goal, tasks in root.get_available_goals_and_tasks()],
+                             ['gather 100 minerals 2'])
+
+    def test_goal_files(self):
+        # Pylons are built one after another, each after the gathers of its minerals.
+        for file_name in ('two_pylons.json', 'gg_pylon.json'):
+            with open(os.path.join(ROOT, 'resource/goals', file_name)) as f:
+                description = json.load(f)
+            for root in self.roots(description):
+                for leaves in rounds(root):
+                    self.assertEqual(len(leaves), 1, '%s: %s' % (file_name, leaves))
+
+
+    def test_first_leaf(self):
+        for root in self.roots(two_pylons(precedent=False)):
+            goal, tasks = root.get_available_goal_and_tasks()
+            self.assertEqual(goal.name, 'gather 100 minerals 1')
+            self.assertEqual([task.__name__ for task in tasks], ['gather 1', 'check mineral 1'])
+
+    def test_every_leaf_blocked(self):
+        # Each pylon waits for the other, nothing can be worked on.
+        description = two_pylons(precedent=True)
+        description['require'][0]['precedent'] = ['I have pylon 2']
+        for root in self.roots(description):
+            self.assertEqual(root.get_available_goal_and_tasks(), (None, []))
+            self.assertEqual(root.get_available_goals_and_tasks(), [])
+
+    def test_precedent_no_longer_achieved(self):
+        for root in self.roots(two_pylons(precedent=True)):
+            for name in ('gather 1', 'check mineral 1', 'build_pylon 1'):
+                root.index().get(name)[0].state = 'Done'
+            root.refresh_achieved()
+            pylon = root.index().get('I have pylon 1')[0]
+            pylon.goal_state = 'assigned'
+            self.assertEqual([goal.name for goal, tasks in root.get_available_goals_and_tasks()], ['I have pylon 1'])
+
+    def test_tracking_matches_recompute(self):
+        # The frontier follows the goal_state setter, the walk from the root finds the same leaves.
+        states = (GOAL_STATE_NOT_ASSIGNED, GOAL_STATE_ASSIGNED, GOAL_STATE_ACTIVE,
+                  GOAL_STATE_ACHIEVED, GOAL_STATE_FAILED)
+        with open(os.path.join(ROOT, 'resource/goals/gg_pylon.json')) as f:
+            descriptions = [json.load(f), two_pylons(precedent=True)]
+        rng = random.Random(13)
+        for description in descriptions:
+            for root in self.roots(description):
+                goals = list(root._walk())[1:]
+                frontier = root.frontier()
+                self.assertEqual(frontier.leaves(), open_leaves(root))
+                for i in range(500):
+                    goal = rng.choice(goals)
+                    goal.goal_state = rng.choice(states)
+                    expected = open_leaves(root)
+                    self.assertEqual(frontier.leaves(), expected, '%s is %s' % (goal.name, goal.goal_state))
+                    self.assertEqual(frontier.first(), expected[0] if expected else None)
+
+
+# The leaves of the walk from the root down the open subgoals not blocked, in preorder.
+def open_leaves(root):
+    closed = (GOAL_STATE_ACHIEVED, GOAL_STATE_FAILED, GOAL_STATE_ACTIVE)
+    not_achieved = {goal.name for goal in root._walk() if goal.goal_state != GOAL_STATE_ACHIEVED}
+    leaves = []
+    stack = [root]
+    while stack:
+        goal = stack.pop()
+        subgoals = [subgoal for subgoal in goal.subgoals if subgoal.goal_state not in closed]
+        if not subgoals:
+            leaves.append(goal)
+        for subgoal in reversed(subgoals):
+            if not any(name in not_achieved for name in subgoal.precedents):
+                stack.append(subgoal)
+    return leaves
+
+
+class PylonPlanTest(unittest.TestCase):
+    def test_gathers_after_the_pylon_before(self):
+        plan = PylonPlan(branches=2, depth=3, gathers=1)
+        expected = [['gather 100 minerals 3'], ['I have pylon 3'], ['gather 100 minerals 2'], ['I have pylon 2'],
+                    ['gather 100 minerals 1'], ['I have G 1'],
+                    ['gather 100 minerals 6'], ['I have pylon 6'], ['gather 100 minerals 5'], ['I have pylon 5'],
+                    ['gather 100 minerals 4'], ['I have G 2'], ['I have GG Pylon']]
+        self.assertEqual(rounds(GoalTemplate(plan.description()).instantiate()), expected)
+        self.assertEqual(rounds(GoalTemplate.from_nodes(plan.nodes()).instantiate()), expected)
+
+    def test_sequential_branches(self):
+        # A branch waits for the whole branch before it, or for its first pylon built only.
+        for sequential, blocked in ((True, 'I have G 2'), (False, 'I have pylon 4')):
+            template = GoalTemplate(PylonPlan(branches=2, depth=2, gathers=1, sequential=sequential).description())
+            precedents = dict((name, precedents) for name, precedents in
+                              zip(template.goal_names, template.goal_precedents) if name.startswith('I have'))
+            self.assertEqual([name for name in precedents if precedents[name]], [blocked])
+            self.assertEqual(precedents[blocked], ('I have G 1',))
+            names = [leaves[0] for leaves in rounds(template.instantiate())]
+            self.assertLess(names.index('I have G 1'), names.index('gather 100 minerals 4'))
+
+    def test_game_plan(self):
+        with open(os.path.join(ROOT, 'resource/goals/gg_pylon.json')) as f:
+            self.assertEqual(PylonPlan().description(), json.load(f))
+
+    def test_streamed_json(self):
+        for plan in (PylonPlan(), PylonPlan(branches=3, pylons=7, sequential=True)):
+            f = io.StringIO()
+            plan.write_json(f)
+            self.assertEqual(json.loads(f.getvalue()), plan.description())
+
+
+class ViewTest(unittest.TestCase):
+    # The nodes of a view and of a tree of the same description, side by side in preorder.
+    def assertSameNodes(self, view, root):
+        goals = list(zip(view._walk(), root._walk()))
+        self.assertEqual(len(goals), len(list(root._walk())))
+        for goal_view, goal in goals:
+            self.assertEqual(goal_view.name, goal.name)
+            self.assertEqual(list(goal_view.precedents), list(goal.precedents))
+            self.assertEqual(None if goal_view.parent is None else goal_view.parent.name,
+                             None if goal.parent is None else goal.parent.name)
+            self.assertEqual([subgoal.name for subgoal in goal_view.subgoals], [subgoal.name for subgoal in goal.subgoals])
+            self.assertEqual(goal_view.goal_state, goal.goal_state, goal.name)
+            self.assertEqual(goal_view._pending, goal._pending, goal.name)
+            self.assertEqual(goal_view._open_subgoals, goal._open_subgoals, goal.name)
+            self.assertEqual(len(goal_view.tasks), len(goal.tasks))
+            for task_view, task in zip(goal_view.tasks, goal.tasks):
+                self.assertEqual(task_view.__name__, task.__name__)
+                self.assertEqual(dict(task_view.arguments), task.arguments)
+                self.assertEqual(task_view.type, task.type)
+                self.assertEqual(task_view.state, task.state)
+                self.assertEqual(task_view.parent, goal_view)
+
+    def test_overlay_matches_tree(self):
+        with open(os.path.join(ROOT, 'resource/goals/gg_pylon.json')) as f:
+            description = json.load(f)
+        template = GoalTemplate(description)
+        root = create_goal_set(description)
+        view = template.instantiate()
+        self.assertSameNodes(view, root)
+
+        # The same tasks done in a random order, the overlay keeps only what changed.
+        tasks = sorted(set(template.task_names))
+        random.Random(5).shuffle(tasks)
+        for name in tasks[:len(tasks) // 2]:
+            for node in root.index().get(name) + view.index().get(name):
+                node.state = 'Done'
+            self.assertEqual([goal.name for goal in view.refresh_achieved()],
+                             [goal.name for goal in root.refresh_achieved()])
+        self.assertSameNodes(view, root)
+        self.assertTrue(view._plan.task_states)
+
+        # Another agent of the template sees none of it.
+        self.assertSameNodes(template.instantiate(), create_goal_set(description))
+
+    def test_set_arguments(self):
+        template = GoalTemplate(two_pylons(precedent=False))
+        view = template.instantiate()
+        task = view.index().get('build_pylon 1')[0]
+        task.set_arguments({'target': 'point', 'pos_x': 3, 'pos_y': 4, 'task_name': 'build_pylon 1'})
+        self.assertEqual(view.index().get('build_pylon 1')[0].arguments['pos_x'], 3)
+        self.assertEqual(template.instantiate().index().get('build_pylon 1')[0].arguments['pos_x'], 0)
+        self.assertEqual(template.task_arguments[template.task_names.index('build_pylon 1')]['pos_x'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+"""
+    Tests of agent.goal_array
+    GoalArray finds the same achieved goals as Goal.refresh_achieved() as tasks are done.
+"""
+
+import os
+import sys
+import json
+import random
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.append(os.path.join(ROOT, 'src/agent'))
+from goal import create_goal_set
+
+try:
+    from goal_array import GoalArray
+except ImportError:
+    GoalArray = None
+
+
+@unittest.skipIf(GoalArray is None, 'GoalArray needs NumPy')
+class GoalArrayTest(unittest.TestCase):
+    def setUp(self):
+        with open(os.path.join(ROOT, 'resource/goals/gg_pylon.json')) as f:
+            self.description = json.load(f)
+
+    def test_compiled_forms(self):
+        root = create_goal_set(self.description)
+        from_goal = GoalArray.from_goal(root)
+        from_description = GoalArray.from_description(self.description)
+        self.assertEqual(from_goal.goal_names, [goal.name for goal in root._walk()])
+        self.assertEqual(from_description.goal_names, from_goal.goal_names)
+        self.assertEqual(from_description.task_names, from_goal.task_names)
+        self.assertEqual(from_description.goal_end.tolist(), from_goal.goal_end.tolist())
+
+    def test_achieved_in_random_orders(self):
+        for seed in range(5):
+            root = create_goal_set(self.description)
+            compiled = GoalArray.from_description(self.description)
+            goals = list(root._walk())
+            index = root.index()
+            self.assertEqual(set(compiled.refresh_achieved()), {goal.name for goal in root.refresh_achieved()})
+
+            names = sorted(set(compiled.task_names))
+            random.Random(seed).shuffle(names)
+            for name in names:
+                for task in index.get(name):
+                    task.state = 'Done'
+                compiled.set_task_states([name], 'Done')
+
+                self.assertEqual(set(compiled.refresh_achieved()),
+                                 {goal.name for goal in root.refresh_achieved()}, name)
+                self.assertEqual(compiled.achieved().tolist(), [goal.is_achieved() for goal in goals])
+                leaves = [goal for goal in goals if not goal.subgoals and not goal.is_achieved()]
+                first = compiled.first_unachieved_leaf()
+                self.assertEqual(None if first is None else compiled.goal_names[first],
+                                 leaves[0].name if leaves else None)
+            self.assertTrue(compiled.all_done())
+
+
+if __name__ == '__main__':
+    unittest.main()
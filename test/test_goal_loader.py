@@ -0,0 +1,147 @@
+"""
+    Tests of agent.goal_loader
+    Loading goal files, placeholders and the compiled cache under __goalcache__.
+"""
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../src/agent'))
+import goal_loader
+from goal_loader import load_goal, CACHE_DIR
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+GOAL = {'goal': 'I have pylon 1', 'trigger': [], 'satisfy': [], 'precedent': [],
+        'knowledge': {'minerals': {'gathered': '0'}},
+        'require': [
+            {'goal': 'gather 100 minerals 1',
+             'require': [['gather 1', {'target': 'unit', 'unit_tag': '$minerals[1]'}, 'General']]},
+            {'goal': 'build 1', 'precedent': ['gather 100 minerals 1'],
+             'require': [['build_pylon 1', {'target': 'point', 'pos_x': 1, 'pos_y': 2}, 'General']]}]}
+
+
+class GoalLoaderTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'plan.json')
+        self.write(GOAL)
+        self.compile_goal = goal_loader.compile_goal
+        self.code_digest = goal_loader._code_digest()
+
+    def tearDown(self):
+        goal_loader.compile_goal = self.compile_goal
+        goal_loader._CODE_DIGEST = self.code_digest
+        shutil.rmtree(self.dir)
+
+    def write(self, description):
+        with open(self.path, 'w') as f:
+            json.dump(description, f)
+
+    def caches(self):
+        return sorted(os.listdir(os.path.join(self.dir, CACHE_DIR)))
+
+    def compiled_never(self):
+        def compile_goal(*args):
+            raise AssertionError('compiled again')
+        goal_loader.compile_goal = compile_goal
+
+    def test_load(self):
+        goal = load_goal(self.path, params={'minerals': [10, 11]})
+        self.assertEqual(goal.template.goal_names[0], 'I have pylon 1')
+        self.assertEqual(goal.initial_knowledge['gather 1'], {'is': 'Ready'})
+        self.assertEqual(goal.initial_knowledge['build 1'], {'is': 'Not Assigned'})
+        self.assertEqual(goal.initial_knowledge['minerals'], {'gathered': '0'})
+        task = goal.template.instantiate().index().get('gather 1')[0]
+        self.assertEqual(task.arguments['unit_tag'], 11)
+        self.assertEqual(goal.description['require'][0]['require'][0][1]['unit_tag'], 11)
+
+    def test_cache_is_used(self):
+        load_goal(self.path, params={'minerals': [10, 11]})
+        self.assertEqual(len(self.caches()), 1)
+
+        self.compiled_never()
+        goal = load_goal(self.path, params={'minerals': [20, 21]})
+        # Placeholders are filled for each load, the cache keeps them.
+        task = goal.template.instantiate().index().get('gather 1')[0]
+        self.assertEqual(task.arguments['unit_tag'], 21)
+        self.assertEqual(goal.template.goal_precedents[goal.template.goal_names.index('build 1')],
+                         ('gather 100 minerals 1',))
+
+    def test_changed_file_replaces_cache(self):
+        load_goal(self.path, params={'minerals': [10, 11]})
+        before = self.caches()
+
+        changed = json.loads(json.dumps(GOAL))
+        changed['require'][1]['goal'] = 'build pylon 1'
+        self.write(changed)
+        goal = load_goal(self.path, params={'minerals': [10, 11]})
+        self.assertIn('build pylon 1', goal.template.goal_names)
+        after = self.caches()
+        self.assertEqual(len(after), 1)
+        self.assertNotEqual(before, after)
+
+    def test_changed_code_replaces_cache(self):
+        load_goal(self.path, params={'minerals': [10, 11]})
+        before = self.caches()
+
+        # A cache of another goal.py is not used.
+        goal_loader._CODE_DIGEST = b'another goal.py'
+        load_goal(self.path, params={'minerals': [10, 11]})
+        after = self.caches()
+        self.assertEqual(len(after), 1)
+        self.assertNotEqual(before, after)
+
+    def test_broken_cache_is_ignored(self):
+        load_goal(self.path, params={'minerals': [10, 11]})
+        cache_path = os.path.join(self.dir, CACHE_DIR, self.caches()[0])
+        with open(cache_path, 'wb') as f:
+            f.write(b'not a pickle')
+
+        goal = load_goal(self.path, params={'minerals': [10, 11]})
+        self.assertEqual(goal.template.goal_names[0], 'I have pylon 1')
+        # Written again
+        self.compiled_never()
+        load_goal(self.path, params={'minerals': [10, 11]})
+
+    def test_unknown_precedent(self):
+        broken = json.loads(json.dumps(GOAL))
+        broken['require'][1]['precedent'] = ['gather 200 minerals']
+        self.write(broken)
+        with self.assertRaises(ValueError):
+            load_goal(self.path, params={'minerals': [10, 11]})
+
+    @unittest.skipIf(yaml is None, 'YAML files need PyYAML')
+    def test_yaml(self):
+        path = os.path.join(self.dir, 'plan.yaml')
+        with open(path, 'w') as f:
+            yaml.safe_dump(GOAL, f)
+        goal = load_goal(path, params={'minerals': [10, 11]})
+        self.assertEqual(goal.template.goal_names[0], 'I have pylon 1')
+        self.assertEqual(goal.template.instantiate().index().get('gather 1')[0].arguments['unit_tag'], 11)
+
+        with open(path, 'w') as f:
+            f.write('goal: [I have pylon 1\n')
+        with self.assertRaises(ValueError):
+            load_goal(path)
+
+    def test_broken_json(self):
+        with open(self.path, 'w') as f:
+            f.write('{"goal": ')
+        with self.assertRaises(ValueError):
+            load_goal(self.path)
+
+    def test_missing_placeholder(self):
+        with self.assertRaises(ValueError):
+            load_goal(self.path, params={'minerals': [10]})
+
+
+if __name__ == '__main__':
+    unittest.main()
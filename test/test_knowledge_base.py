@@ -0,0 +1,107 @@
+"""
+    Tests of agent.knowledge_base
+    How Knowledge.update() merges the statements of others: epochs, leases, task states and pings.
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../src/agent'))
+from knowledge_base import Knowledge
+
+
+class EpochTest(unittest.TestCase):
+    def test_later_epoch_replaces(self):
+        knowledge = Knowledge({'build_pylon 1': {'is': 'Active', 'lease': ['3', 10.0]}})
+        knowledge.update({'build_pylon 1': {'is': 'Ready', 'epoch': 1}})
+        self.assertEqual(knowledge['build_pylon 1'], {'is': 'Ready', 'epoch': 1})
+
+    def test_former_epoch_is_ignored(self):
+        knowledge = Knowledge({'build_pylon 1': {'is': 'Ready', 'epoch': 2}})
+        self.assertEqual(knowledge.update({'build_pylon 1': {'is': 'Active', 'epoch': 1}}), set())
+        self.assertEqual(knowledge['build_pylon 1'], {'is': 'Ready', 'epoch': 2})
+
+    def test_former_epoch_done_counts(self):
+        knowledge = Knowledge({'build_pylon 1': {'is': 'Ready', 'epoch': 2}})
+        knowledge.update({'build_pylon 1': {'is': 'Done', 'epoch': 1}})
+        self.assertEqual(knowledge['build_pylon 1']['is'], 'Done')
+
+    def test_done_is_kept_over_later_epoch(self):
+        for state in ('Ready', 'Ping', 'Active'):
+            knowledge = Knowledge({'build_pylon 1': {'is': 'Done', 'epoch': 1}})
+            knowledge.update({'build_pylon 1': {'is': state, 'epoch': 2}})
+            self.assertEqual(knowledge['build_pylon 1'], {'is': 'Done', 'epoch': 2})
+
+    def test_done_is_kept_over_former_epoch(self):
+        knowledge = Knowledge({'build_pylon 1': {'is': 'Done', 'epoch': 2}})
+        knowledge.update({'build_pylon 1': {'is': 'Active', 'epoch': 1}})
+        self.assertEqual(knowledge['build_pylon 1'], {'is': 'Done', 'epoch': 2})
+
+
+class LeaseTest(unittest.TestCase):
+    def test_holder_is_kept_over_claim(self):
+        knowledge = Knowledge({'gather 1': {'is': 'Active', 'lease': ['2', 10.0]}})
+        self.assertEqual(knowledge.update({'gather 1': {'is': 'Ping', 'lease': [None, 20.0]}}), set())
+        self.assertEqual(knowledge['gather 1']['lease'], ['2', 10.0])
+
+    def test_holder_replaces_claim(self):
+        knowledge = Knowledge({'gather 1': {'is': 'Ping', 'lease': [None, 20.0]}})
+        knowledge.update({'gather 1': {'is': 'Active', 'lease': ['2', 10.0]}})
+        self.assertEqual(knowledge['gather 1'], {'is': 'Active', 'lease': ['2', 10.0]})
+
+    def test_renewed_lease_replaces(self):
+        knowledge = Knowledge({'gather 1': {'is': 'Active', 'lease': ['2', 10.0]}})
+        self.assertEqual(knowledge.update({'gather 1': {'lease': ['2', 12.0]}}), {'gather 1'})
+        self.assertEqual(knowledge['gather 1']['lease'], ['2', 12.0])
+        # A renewal arriving late
+        self.assertEqual(knowledge.update({'gather 1': {'lease': ['2', 11.0]}}), set())
+        self.assertEqual(knowledge['gather 1']['lease'], ['2', 12.0])
+
+    def test_former_epoch_lease_is_ignored(self):
+        knowledge = Knowledge({'gather 1': {'is': 'Ready', 'epoch': 1}})
+        self.assertEqual(knowledge.update({'gather 1': {'is': 'Active', 'lease': ['2', 99.0]}}), set())
+        self.assertNotIn('lease', knowledge['gather 1'])
+
+
+class StateTest(unittest.TestCase):
+    def test_state_never_goes_back(self):
+        knowledge = Knowledge({'gather 1': {'is': 'Active'}})
+        self.assertEqual(knowledge.update({'gather 1': {'is': 'Ping'}}), set())
+        self.assertEqual(knowledge.update({'gather 1': {'is': 'Done'}}), {'gather 1'})
+        self.assertEqual(knowledge['gather 1']['is'], 'Done')
+
+    def test_goal_state_never_goes_back(self):
+        knowledge = Knowledge({'I have pylon 1': {'is': 'achieved'}})
+        for state in ('Not Assigned', 'assigned', 'active'):
+            self.assertEqual(knowledge.update({'I have pylon 1': {'is': state}}), set())
+        self.assertEqual(knowledge['I have pylon 1']['is'], 'achieved')
+
+        knowledge = Knowledge({'I have pylon 2': {'is': 'Not Assigned'}})
+        knowledge.update({'I have pylon 2': {'is': 'assigned'}})
+        self.assertEqual(knowledge['I have pylon 2']['is'], 'assigned')
+
+    def test_not_a_statement_is_ignored(self):
+        knowledge = Knowledge({'gather 1': {'is': 'Ready'}})
+        changed = knowledge.update({'gather 1': 'Done', 'gather 2': None, 'gather 3': {'is': 'Ready'}})
+        self.assertEqual(changed, {'gather 3'})
+        self.assertEqual(knowledge['gather 1'], {'is': 'Ready'})
+        self.assertNotIn('gather 2', knowledge)
+
+    def test_pings_are_merged(self):
+        knowledge = Knowledge({'gather 1': {'is': 'Ping', 'ping': {1}}})
+        knowledge.update({'gather 1': {'ping': [2, 3]}})
+        self.assertEqual(knowledge['gather 1']['ping'], {1, 2, 3})
+        self.assertEqual(knowledge.update({'gather 1': {'ping': [3]}}), set())
+
+    def test_merged_statements_are_not_dirty(self):
+        knowledge = Knowledge({'gather 1': {'is': 'Ready'}})
+        knowledge.delta()
+        knowledge.take_changed()
+        knowledge.update({'gather 1': {'is': 'Done'}, 'minerals': {'gathered': '100'}})
+        self.assertEqual(knowledge.delta(), {})
+        self.assertEqual(knowledge.take_changed(), {'gather 1', 'minerals'})
+
+
+if __name__ == '__main__':
+    unittest.main()
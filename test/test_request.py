@@ -0,0 +1,140 @@
+"""
+    Tests of the request channel of utils.communicator
+    Acks, retries and dedup of requests between RequestClient and RequestServer over inproc.
+"""
+
+import os
+import sys
+import time
+import unittest
+import itertools
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../src'))
+from utils import communicator
+from utils.communicator import RequestClient, RequestServer
+
+# zmq releases an inproc address after close() returns, every test binds its own.
+_addrs = itertools.count()
+
+
+class RequestTest(unittest.TestCase):
+    def setUp(self):
+        self.addr = communicator.request_addrs['inproc']
+        communicator.request_addrs['inproc'] = 'inproc://test_request_%d' % next(_addrs)
+        self.server = RequestServer(listen=('inproc',))
+        self.clients = []
+
+    def tearDown(self):
+        for client in self.clients:
+            client.close()
+        self.server.close()
+        communicator.request_addrs['inproc'] = self.addr
+
+    def client(self, sender='1', **kwargs):
+        client = RequestClient(sender=sender, transport='inproc', **kwargs)
+        self.clients.append(client)
+        return client
+
+    def poll_acks(self, client, timeout=1.0):
+        deadline = time.time() + timeout
+        acks = []
+        while not acks and time.time() < deadline:
+            acks = client.poll_acks(0.05)
+        return acks
+
+    def test_request_and_ack(self):
+        client = self.client()
+        request_id = client.request({'action': 'build'})
+        requests = self.server.recv_all(1.0)
+        self.assertEqual([(request.sender, request.id, request.message) for request in requests],
+                         [('1', request_id, {'action': 'build'})])
+
+        self.server.ack(requests[0], False)
+        self.assertEqual(self.poll_acks(client), [(request_id, False)])
+        self.assertEqual(client.pending, {})
+
+    def test_resent_request_is_acked_not_performed_again(self):
+        client = self.client(retry_timeout=0.0)
+        request_id = client.request({'action': 'build'})
+        self.server.ack(self.server.recv_all(1.0)[0], True)
+
+        # The ack is not taken yet, so the client resends the request.
+        client._retry()
+        self.assertEqual(self.server.recv_all(0.2), [])
+        self.assertEqual(self.server.stats['duplicated'], 1)
+        self.assertEqual(self.poll_acks(client), [(request_id, True)])
+
+    def test_restarted_sender_is_not_deduped(self):
+        first = self.client()
+        first.request({'action': 'build'})
+        self.server.ack(self.server.recv_all(1.0)[0], True)
+        first.close()
+        self.clients.remove(first)
+
+        # A new run of the same agent name starts from another id.
+        second = self.client()
+        second.request({'action': 'gather'})
+        requests = self.server.recv_all(1.0)
+        self.assertEqual([request.message for request in requests], [{'action': 'gather'}])
+
+    def test_broken_request_is_dropped(self):
+        client = self.client()
+        header = communicator._pack_header(client.codec, 7, b'1')
+        client.socket.send_multipart([header, b'\x0b\x05'])
+        request_id = client.request({'action': 'build'})
+        # The broken one comes first on the same connection.
+        requests = []
+        deadline = time.time() + 1.0
+        while not requests and time.time() < deadline:
+            requests = self.server.recv_all(0.05)
+        self.assertEqual([request.id for request in requests], [request_id])
+        self.assertEqual(self.server.stats['broken'], 1)
+
+    def test_history_of_each_sender(self):
+        self.server.history = 2
+        client = self.client()
+        other = self.client(sender='2')
+        first = client.request({'n': 0})
+        for i in range(1, 3):
+            client.request({'n': i})
+        other.request({'n': 0})
+        requests = []
+        deadline = time.time() + 1.0
+        while len(requests) < 4 and time.time() < deadline:
+            requests += self.server.recv_all(0.05)
+        for request in requests:
+            self.server.ack(request, True)
+        # The first request of '1' is forgotten, the one of '2' is not.
+        self.assertEqual(sorted(self.server._handled['1']), [first + 1, first + 2])
+        self.assertEqual(len(self.server._handled['2']), 1)
+
+    def test_next_retry(self):
+        client = self.client(retry_timeout=1.0)
+        self.assertIsNone(client.next_retry())
+        before = time.time()
+        client.request({'action': 'build'})
+        self.assertTrue(before + 1.0 <= client.next_retry() <= time.time() + 1.0)
+
+    def test_address_is_free_after_close(self):
+        # Servers one after another on the same address, like the runs of bench_allocation
+        self.server.close()
+        for i in range(1000):
+            self.server = RequestServer(listen=('inproc',))
+            self.server.close()
+        self.server = RequestServer(listen=('inproc',))
+        client = self.client()
+        client.request({'action': 'build'})
+        self.assertEqual(len(self.server.recv_all(1.0)), 1)
+
+    def test_gives_up_after_max_retries(self):
+        client = self.client(retry_timeout=0.0, max_retries=2)
+        client.request({'action': 'build'})
+        for i in range(3):
+            client._retry()
+        self.assertEqual(client.pending, {})
+        self.assertEqual(client.stats['retried'], 2)
+        self.assertEqual(client.stats['failed'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+"""
+    Tests of agent.runtime
+    The shared request channel of AgentRuntime: acks go back to the agent which sent the request.
+"""
+
+import os
+import sys
+import asyncio
+import unittest
+import itertools
+from types import SimpleNamespace
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.append(os.path.join(ROOT, 'src'))
+sys.path.append(os.path.join(ROOT, 'src/agent'))
+from utils import communicator
+from utils.communicator import RequestServer
+from runtime import AgentRuntime
+
+# zmq releases an inproc address after close() returns, every test binds its own.
+_addrs = itertools.count()
+
+
+class RuntimeRequestTest(unittest.TestCase):
+    def setUp(self):
+        self.addr = communicator.request_addrs['inproc']
+        communicator.request_addrs['inproc'] = 'inproc://test_runtime_%d' % next(_addrs)
+        self.server = RequestServer(listen=('inproc',))
+        self.runtime = AgentRuntime(transport='inproc')
+        self.agents = [SimpleNamespace(spawn_id=spawn_id) for spawn_id in (1, 2)]
+        for agent in self.agents:
+            self.runtime.add(agent)
+
+    def tearDown(self):
+        self.runtime.close()
+        self.server.close()
+        communicator.request_addrs['inproc'] = self.addr
+
+    def recv_all(self, count, timeout=1.0):
+        requests = []
+        for i in range(int(timeout / 0.05)):
+            requests += self.server.recv_all(0.05)
+            if len(requests) >= count:
+                break
+        return requests
+
+    def test_flush_waits_for_sends(self):
+        async def run():
+            requests = self.agents[0].comm_core
+            requests.request({'action': 'build'})
+            requests.request({'action': 'gather'})
+            sending = list(requests._sending)
+            self.assertEqual(len(sending), 2)
+            await requests.flush()
+            self.assertFalse(requests._sending)
+            self.assertTrue(all(future.done() for future in sending))
+        asyncio.run(run())
+        self.assertEqual([request.message for request in self.recv_all(2)],
+                         [{'action': 'build'}, {'action': 'gather'}])
+
+    def test_acks_are_routed_to_the_requester(self):
+        async def run():
+            first, second = [agent.comm_core for agent in self.agents]
+            first_id = first.request({'action': 'build'})
+            second_id = second.request({'action': 'gather'})
+            await first.flush()
+            await second.flush()
+
+            requests = {request.sender: request for request in self.recv_all(2)}
+            self.assertEqual(sorted(requests), ['1', '2'])
+            self.server.ack(requests['2'], False)
+            self.server.ack(requests['1'], True)
+            # An ack of an agent the runtime does not host is ignored.
+            self.server.ack(requests['1']._replace(sender='3'), True)
+
+            routing = asyncio.ensure_future(self.runtime._route_acks())
+            try:
+                for i in range(100):
+                    if first._acks and second._acks:
+                        break
+                    await asyncio.sleep(0.01)
+            finally:
+                routing.cancel()
+                await asyncio.gather(routing, return_exceptions=True)
+            self.assertEqual(first.poll_acks(), [(first_id, True)])
+            self.assertEqual(second.poll_acks(), [(second_id, False)])
+            self.assertEqual(first.pending, {})
+            self.assertEqual(second.pending, {})
+        asyncio.run(run())
+
+
+if __name__ == '__main__':
+    unittest.main()